@@ -0,0 +1,166 @@
+"""Admin read APIs: complaint search, kitchen manifest, exports and live events.
+
+Loaded by create_app() rather than when app.py is imported; the bulk status
+and stats APIs the dashboard itself needs stay in app.py.
+"""
+from datetime import datetime
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+import exports
+import search
+from app import (
+    AdminEvent, Complaint, Customer, Order, admin_required, config, date_range_conditions, db,
+    kitchen_manifest, latest_admin_event_id, parse_date_arg, parse_manifest_date,
+)
+
+SEARCH_PAGE_SIZE = 20
+
+bp = Blueprint("admin_api", __name__)
+
+
+@bp.route("/admin/api/complaints/search")
+@admin_required
+def search_complaints():
+    """Ranked full-text search: ?q=words&page=1&per_page=20&status="""
+    q = request.args.get("q", "").strip()
+    if not search.query_terms(q):
+        return jsonify({"error": "q is required"}), 400
+    try:
+        page = max(int(request.args.get("page", 1)), 1)
+        per_page = min(max(int(request.args.get("per_page", SEARCH_PAGE_SIZE)), 1), 100)
+    except ValueError:
+        return jsonify({"error": "page and per_page must be integers"}), 400
+    # One extra row tells us whether another page exists without a COUNT
+    rows = search.search(db.session.connection(), q, limit=per_page + 1,
+                         offset=(page - 1) * per_page, status=request.args.get("status") or None)
+    results = [dict(row, created_at=row["created_at"].isoformat() if row["created_at"] else None)
+               for row in rows[:per_page]]
+    return jsonify({"query": q, "page": page, "per_page": per_page,
+                    "has_more": len(rows) > per_page, "results": results})
+
+
+@bp.route("/admin/api/manifest")
+@admin_required
+def manifest_api():
+    """Meals to prepare and deliver on ?date=YYYY-MM-DD (default today, UTC)."""
+    day = parse_manifest_date(request.args.get("date"))
+    if day is None:
+        return jsonify({"error": "date must be YYYY-MM-DD"}), 400
+    return jsonify(kitchen_manifest.day(day))
+
+
+# -----------------------
+# Exports
+# -----------------------
+def export_query(table):
+    """(model, select statement) for an export; orders carry their customer."""
+    if table == "orders":
+        return Order, db.select(
+            Order.id, Order.created_at, Order.updated_at, Order.status, Order.plan_id,
+            Order.description, Order.amount, Order.currency, Order.stripe_payment_intent_id,
+            Order.stripe_charge_id, Order.customer_id,
+            Customer.name.label("customer_name"), Customer.email.label("customer_email"),
+            Customer.phone.label("customer_phone"),
+        ).outerjoin(Customer, Order.customer_id == Customer.id)
+    if table == "complaints":
+        return Complaint, db.select(
+            Complaint.id, Complaint.created_at, Complaint.updated_at, Complaint.status,
+            Complaint.name, Complaint.phone, Complaint.place, Complaint.category,
+            Complaint.complaint_type, Complaint.description, Complaint.customer_id,
+        )
+    if table == "customers":
+        return Customer, db.select(
+            Customer.id, Customer.created_at, Customer.name, Customer.email, Customer.phone,
+            Customer.stripe_customer_id,
+        )
+    return None, None
+
+
+def export_fetcher(model, stmt, date_from=None, date_to=None, status=None):
+    """fetch(after_id, limit) for exports.keyset_batches."""
+    stmt = stmt.where(*date_range_conditions(model, date_from, date_to))
+    if status and hasattr(model, "status"):
+        stmt = stmt.where(model.status == status)
+
+    def fetch(after_id, limit):
+        rows = db.session.execute(
+            stmt.where(model.id > after_id).order_by(model.id).limit(limit)
+        ).all()
+        # End the read transaction between batches so writers are never held up
+        db.session.rollback()
+        return rows
+    return fetch
+
+
+@bp.route("/admin/api/export/<table>")
+@admin_required
+def export_table(table):
+    """Stream orders, complaints or customers as CSV/JSONL.
+
+    ?format=csv|jsonl&gzip=1&from=&to=&status=&after_id=
+    """
+    model, stmt = export_query(table)
+    fmt = request.args.get("format", "csv")
+    if model is None or fmt not in exports.FORMATS:
+        return jsonify({"error": "Unknown table or format"}), 400
+    try:
+        after_id = int(request.args.get("after_id", 0))
+    except ValueError:
+        return jsonify({"error": "after_id must be an integer"}), 400
+    compress = request.args.get("gzip") in ("1", "true", "yes")
+    fetch = export_fetcher(model, stmt, parse_date_arg("from"), parse_date_arg("to"),
+                           request.args.get("status"))
+    columns = list(stmt.selected_columns.keys())
+    body = exports.stream(columns, exports.keyset_batches(fetch, after_id, config["EXPORT_BATCH_SIZE"]),
+                          fmt, compress)
+
+    mimetype, extension = exports.FORMATS[fmt]
+    filename = f"{table}-{datetime.utcnow():%Y%m%d-%H%M%S}.{extension}" + (".gz" if compress else "")
+    response = Response(stream_with_context(body),
+                        mimetype="application/gzip" if compress else mimetype)
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+# -----------------------
+# Live Dashboard Events
+# -----------------------
+def sse_message(event_id, data):
+    return f"id: {event_id}\ndata: {data}\n\n"
+
+
+@bp.route("/admin/api/events")
+@admin_required
+def admin_events():
+    """Server-sent events: the changes after Last-Event-ID, then close.
+
+    Each response carries what is already there and ends, and the `retry`
+    field tells EventSource when to reconnect (sending the last id it saw),
+    so no worker is held open per connected admin. Without an id the stream
+    starts at the current position instead of replaying history.
+    """
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_id = int(last_id) if last_id not in (None, "") else None
+    except ValueError:
+        return jsonify({"error": "Last-Event-ID must be an integer"}), 400
+
+    batch = config["ADMIN_EVENTS_BATCH"]
+    lines = [f"retry: {config['ADMIN_EVENTS_RETRY_MS']}\n\n"]
+    if last_id is None:
+        lines.append(f"id: {latest_admin_event_id()}\n\n")
+    else:
+        rows = db.session.execute(
+            db.select(AdminEvent.id, AdminEvent.payload)
+            .where(AdminEvent.id > last_id).order_by(AdminEvent.id).limit(batch)
+        ).all()
+        lines.extend(sse_message(row.id, row.payload) for row in rows)
+        if len(rows) == batch:
+            # More waiting: come straight back for the rest
+            lines[0] = "retry: 0\n\n"
+    response = Response("".join(lines), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-store"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
@@ -1,55 +1,65 @@
 import os
+import sys
 import json
-from datetime import datetime
+import logging
+import time
+from functools import wraps
+import base64
+import hmac
+from datetime import datetime, timedelta
 from flask import (
-    Flask, request, jsonify, render_template, redirect,
-    url_for, session, flash, send_from_directory
+    Blueprint, Flask, request, jsonify, render_template, redirect, current_app,
+    url_for, session, flash, g, has_app_context, has_request_context, Response
 )
 from flask_sqlalchemy import SQLAlchemy
-import smtplib
-from email.message import EmailMessage
-import stripe
-from dotenv import load_dotenv
-load_dotenv()
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from werkzeug.local import LocalProxy
+import random
+import uuid
+from stripe_gateway import InvalidSignature, StripeGateway
+import db_engine
+import settings
+from workers import PollingWorker, WorkerPool
+from caching import LRUTTLCache, PageCache, SingleFlight
+from catalog import (
+    CUSTOM_DURATIONS, CUSTOM_MEAL_PRICES, DEFAULT_PLANS, PlanCatalog, custom_plan_price
+)
+from identity import normalize_email, normalize_phone
+from metrics import Registry
+import kitchen
+import rollups
+import ratelimit
 
 # -----------------------
 # Configuration
 # -----------------------
-# -----------------------
-# Configuration
-# -----------------------
-app = Flask(__name__, static_folder='static', template_folder='templates')
-
-# Use a writable local folder instead of OneDrive
-local_instance = os.path.join(os.environ["LOCALAPPDATA"], "mini_project_instance")
-os.makedirs(local_instance, exist_ok=True)
-
-db_path = os.path.join(local_instance, "app.db")
-print(f"🔥 Using database at: {db_path}")
+# Importing this module only defines things: the app, its settings and the
+# clients it talks to are built by create_app() (bottom of the file), which
+# also loads the CLI commands (commands.py) and the optional features
+# (admin_api.py, request_profiling.py, static_assets.py).
+db = SQLAlchemy()
 
-app.config['TEMPLATES_AUTO_RELOAD'] = True
-app.secret_key = os.environ.get("SECRET_KEY", "your-secret-key-here-change-in-production")
-app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# Settings of the current app (see settings.py for names and defaults)
+config = LocalProxy(lambda: current_app.config)
 
-db = SQLAlchemy(app)
+def service(name):
+    """A per-app client or cache built by create_app()."""
+    return current_app.extensions["tiffin"][name]
 
+payments = LocalProxy(lambda: service("payments"))
+customer_cache = LocalProxy(lambda: service("customer_cache"))
+plan_catalog = LocalProxy(lambda: service("plan_catalog"))
+page_cache = LocalProxy(lambda: service("page_cache"))
+kitchen_manifest = LocalProxy(lambda: service("kitchen_manifest"))
+confirm_flights = LocalProxy(lambda: service("confirm_flights"))
 
-# Stripe Configuration
-STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY", "sk_test_xxxxxxxxxxxxx")
-STRIPE_PUBLISHABLE_KEY = os.environ.get("STRIPE_PUBLISHABLE_KEY", "pk_test_xxxxxxxxxxxxx")
-stripe.api_key = STRIPE_SECRET_KEY
-
-# Admin credentials
-ADMIN_USERNAME = os.environ.get("ADMIN_USERNAME", "admin")
-ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "secure_admin_password_123")
-
-# SMTP Configuration (optional)
-SMTP_HOST = os.environ.get("SMTP_HOST")
-SMTP_PORT = int(os.environ.get("SMTP_PORT", "587"))
-SMTP_USER = os.environ.get("SMTP_USER")
-SMTP_PASS = os.environ.get("SMTP_PASS")
-ADMIN_EMAIL = os.environ.get("ADMIN_EMAIL")
+public = Blueprint("public", __name__)
+api = Blueprint("api", __name__)
+webhooks = Blueprint("webhooks", __name__)
+admin = Blueprint("admin", __name__)
 
 # -----------------------
 # Database Models
@@ -60,11 +70,52 @@ class Customer(db.Model):
     name = db.Column(db.String(180), nullable=True)
     email = db.Column(db.String(180), nullable=True)
     phone = db.Column(db.String(50), nullable=True)
+    # Normalized identity keys (see identity.py); unique so upserts can target them
+    phone_key = db.Column(db.String(180), nullable=True)
+    email_key = db.Column(db.String(180), nullable=True)
     stripe_customer_id = db.Column(db.String(120), nullable=True, unique=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     orders = db.relationship("Order", backref="customer", lazy=True)
     complaints = db.relationship("Complaint", backref="customer", lazy=True)
 
+    __table_args__ = (
+        db.Index("ix_customers_phone", "phone"),
+        db.Index("ix_customers_email", "email"),
+        db.Index("uq_customers_phone_key", "phone_key", unique=True),
+        db.Index("uq_customers_email_key", "email_key", unique=True),
+    )
+
+class Plan(db.Model):
+    __tablename__ = "plans"
+    id = db.Column(db.String(80), primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    price = db.Column(db.Integer, nullable=False)  # paise
+    currency = db.Column(db.String(10), nullable=False, default="INR")
+    duration_days = db.Column(db.Integer, nullable=False)
+    meal_type = db.Column(db.String(20), nullable=False)
+    description = db.Column(db.String(255), nullable=True)
+    features = db.Column(db.Text, nullable=True)  # JSON list
+    badge = db.Column(db.String(40), nullable=True)
+    badge_style = db.Column(db.String(20), nullable=True)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    active = db.Column(db.Boolean, nullable=False, default=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "price": self.price,
+            "currency": self.currency,
+            "duration_days": self.duration_days,
+            "meal_type": self.meal_type,
+            "description": self.description,
+            "features": json.loads(self.features) if self.features else [],
+            "badge": self.badge,
+            "badge_style": self.badge_style,
+            "position": self.position,
+        }
+
 class Order(db.Model):
     __tablename__ = "orders"
     id = db.Column(db.Integer, primary_key=True)
@@ -74,10 +125,25 @@ class Order(db.Model):
     currency = db.Column(db.String(10), nullable=False, default="INR")
     stripe_payment_intent_id = db.Column(db.String(120), nullable=True, unique=True)
     stripe_charge_id = db.Column(db.String(120), nullable=True)
-    status = db.Column(db.String(40), nullable=False, default="created")
+    # active_history: the rollups need the old status even when the row was expired
+    status = db.column_property(db.Column(db.String(40), nullable=False, default="created"),
+                                active_history=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     customer_id = db.Column(db.Integer, db.ForeignKey("customers.id"), nullable=True)
+    # Delivery area given at checkout (see kitchen.normalize_area)
+    area = db.Column(db.String(80), nullable=True)
+
+    __table_args__ = (
+        # Dashboard keyset pages, unfiltered and filtered by status
+        db.Index("ix_orders_created_at_id", "created_at", "id"),
+        db.Index("ix_orders_status_created_at_id", "status", "created_at", "id"),
+        # Covers COUNT/SUM(amount) GROUP BY status without touching the table
+        db.Index("ix_orders_status_amount", "status", "amount"),
+        db.Index("ix_orders_customer_id", "customer_id"),
+        # Covers the kitchen manifest's GROUP BY over active orders
+        db.Index("ix_orders_status_created_at_plan_area", "status", "created_at", "plan_id", "area"),
+    )
 
 class Complaint(db.Model):
     __tablename__ = "complaints"
@@ -88,169 +154,1469 @@ class Complaint(db.Model):
     category = db.Column(db.String(50), nullable=True)
     complaint_type = db.Column(db.String(50), nullable=True)
     description = db.Column(db.Text, nullable=True)
-    status = db.Column(db.String(40), nullable=False, default="New")
+    status = db.column_property(db.Column(db.String(40), nullable=False, default="New"),
+                                active_history=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     customer_id = db.Column(db.Integer, db.ForeignKey("customers.id"), nullable=True)
 
+    __table_args__ = (
+        db.Index("ix_complaints_created_at_id", "created_at", "id"),
+        db.Index("ix_complaints_status_created_at_id", "status", "created_at", "id"),
+        db.Index("ix_complaints_customer_id", "customer_id"),
+    )
+
+class OutboxMessage(db.Model):
+    """Admin notification waiting to be sent by an outbox worker.
+
+    Rows are added in the same transaction as the order or complaint that
+    triggered them, so a notification exists if and only if that commit did.
+    """
+    __tablename__ = "email_outbox"
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(180), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="pending")  # pending, sending, sent, dead
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    claim_token = db.Column(db.String(36), nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+class StripeEvent(db.Model):
+    """Append-only log of verified Stripe webhook deliveries, one row per event ID."""
+    __tablename__ = "stripe_events"
+    id = db.Column(db.String(80), primary_key=True)  # Stripe event ID (evt_...)
+    type = db.Column(db.String(80), nullable=False)
+    payment_intent_id = db.Column(db.String(120), nullable=True)
+    event_created = db.Column(db.Integer, nullable=False)  # Stripe's unix timestamp
+    payload = db.Column(db.Text, nullable=False)
+    received_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+    result = db.Column(db.String(40), nullable=True)  # applied, ignored, no_order, unhandled
+
+    __table_args__ = (
+        db.Index("ix_stripe_events_processed_at_created", "processed_at", "event_created", "id"),
+    )
+
+# The full-text index lives outside the ORM (see search.py)
+@event.listens_for(Complaint.__table__, "after_create")
+def _install_search(target, connection, **kw):
+    import search
+
+    search.install(connection)
+
+@event.listens_for(Complaint.__table__, "before_drop")
+def _uninstall_search(target, connection, **kw):
+    import search
+
+    search.uninstall(connection)
+
+class OrderDailyStat(db.Model):
+    """Rollup of orders per creation day, plan and status (see rollups.py)."""
+    __tablename__ = "order_daily_stats"
+    day = db.Column(db.Date, primary_key=True)
+    plan_id = db.Column(db.String(80), primary_key=True)
+    status = db.Column(db.String(40), primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    amount_total = db.Column(db.BigInteger, nullable=False, default=0)
+
+class ComplaintDailyStat(db.Model):
+    """Rollup of complaints per creation day, category and status."""
+    __tablename__ = "complaint_daily_stats"
+    day = db.Column(db.Date, primary_key=True)
+    category = db.Column(db.String(80), primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    complaint_count = db.Column(db.Integer, nullable=False, default=0)
+
+class JobCheckpoint(db.Model):
+    """Progress of a resumable job (e.g. reconciliation), as a JSON document."""
+    __tablename__ = "job_checkpoints"
+    name = db.Column(db.String(80), primary_key=True)
+    state = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class AdminEvent(db.Model):
+    """Change feed for the live admin dashboard (/admin/api/events)."""
+    __tablename__ = "admin_events"
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(40), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=True)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
 # -----------------------
 # Helper Functions
 # -----------------------
-def send_admin_email(subject: str, content: str):
-    """Send email to ADMIN_EMAIL if SMTP settings provided."""
-    if not ADMIN_EMAIL or not SMTP_HOST or not SMTP_USER or not SMTP_PASS:
-        app.logger.info("SMTP or ADMIN_EMAIL not configured — skipping email")
-        return False
-    try:
-        msg = EmailMessage()
-        msg["Subject"] = subject
-        msg["From"] = SMTP_USER
-        msg["To"] = ADMIN_EMAIL
-        msg.set_content(content)
-
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USER, SMTP_PASS)
-            server.send_message(msg)
-        app.logger.info("Admin email sent successfully")
-        return True
-    except Exception as e:
-        app.logger.exception("Failed to send admin email: %s", e)
+def dialect_insert(model):
+    """INSERT construct with ON CONFLICT support for the configured backend."""
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+def customer_cache_keys(phone_key, email_key):
+    return [key for key in (("phone", phone_key), ("email", email_key)) if key[1]]
+
+def invalidate_customer_cache(phone_key, email_key):
+    customer_cache.delete(*customer_cache_keys(phone_key, email_key))
+
+def stage_customer_cache(session, phone_key, email_key, result):
+    """Cache a customer lookup once the session's transaction commits.
+
+    Until then the row may still be rolled back, and caching it early would
+    hand out ids that do not exist.
+    """
+    staged = session.info.setdefault("customer_cache", {})
+    for key in customer_cache_keys(phone_key, email_key):
+        staged[key] = result
+
+@event.listens_for(Session, "after_commit")
+def _apply_customer_cache(session):
+    staged = session.info.pop("customer_cache", None)
+    if staged and has_app_context():
+        for key, result in staged.items():
+            customer_cache.set(key, result)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_customer_cache(session):
+    session.info.pop("customer_cache", None)
+
+@event.listens_for(Customer, "after_update")
+@event.listens_for(Customer, "after_delete")
+def _customer_changed(mapper, connection, target):
+    if has_app_context():
+        invalidate_customer_cache(target.phone_key, target.email_key)
+
+def load_plans():
+    return [plan.to_dict() for plan in Plan.query.filter_by(active=True)]
+
+@event.listens_for(Plan, "after_insert")
+@event.listens_for(Plan, "after_update")
+@event.listens_for(Plan, "after_delete")
+def _plan_changed(mapper, connection, target):
+    if has_app_context():
+        plan_catalog.invalidate()
+
+def checkout_price(plan_id, plan_details):
+    """Server-side price (paise) for a plan id, or None if it is not sellable."""
+    if plan_id.startswith("custom_"):
+        return custom_plan_price(plan_details)
+    plan = plan_catalog.get(plan_id)
+    return plan["price"] if plan else None
+
+@public.app_template_filter("rupees")
+def rupees_filter(paise):
+    rupees, rem = divmod(int(paise), 100)
+    return f"₹{rupees:,}" + (f".{rem:02d}" if rem else "")
+
+@public.app_template_filter("plan_period")
+def plan_period_filter(days):
+    return {7: "Per Week", 14: "Per 2 Weeks", 30: "Per Month"}.get(days, f"Per {days} Days")
+
+def ensure_default_plans():
+    """Seed the catalog on a fresh database."""
+    if db.session.query(Plan.id).first() is None:
+        for plan in DEFAULT_PLANS:
+            db.session.add(Plan(**dict(plan, features=json.dumps(plan["features"]))))
+        db.session.commit()
+
+def upsert_customer(name, phone, email, session=None):
+    """Find or create a customer in one statement; returns (id, stripe_customer_id).
+
+    Repeat customers are answered from the identity cache without touching the
+    database; the cache learns a customer when the caller commits. Otherwise
+    a single INSERT ... ON CONFLICT on the normalized phone (or email) key
+    either creates the row or returns the existing one, so concurrent
+    checkouts from the same phone can't create duplicates.
+    """
+    if session is None:
+        session = db.session
+    phone_key, email_key = normalize_phone(phone), normalize_email(email)
+    # Customers are identified by phone when one is given, else by email
+    lookup_key = ("phone", phone_key) if phone_key else ("email", email_key)
+    if lookup_key[1]:
+        cached = customer_cache.get(lookup_key)
+        if cached is not None:
+            return cached
+    else:
+        customer = Customer(name=name, phone=phone, email=email)
+        session.add(customer)
+        session.flush()
+        return customer.id, None
+
+    conflict_column = "phone_key" if phone_key else "email_key"
+    values = dict(name=name, phone=phone, email=email, phone_key=phone_key,
+                  email_key=email_key, created_at=datetime.utcnow())
+    for attempt in range(2):
+        stmt = dialect_insert(Customer).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[conflict_column],
+            set_={
+                "name": db.func.coalesce(stmt.excluded.name, Customer.name),
+                "phone": db.func.coalesce(Customer.phone, stmt.excluded.phone),
+                "email": db.func.coalesce(Customer.email, stmt.excluded.email),
+            },
+        ).returning(Customer.id, Customer.stripe_customer_id,
+                    Customer.phone_key, Customer.email_key)
+        if not (phone_key and values["email_key"]):
+            row = session.execute(stmt).one()
+            break
+        try:
+            with session.begin_nested():
+                row = session.execute(stmt).one()
+            break
+        except IntegrityError:
+            # The email already belongs to a customer with a different phone;
+            # keep this customer keyed on phone only.
+            if attempt or conflict_column != "phone_key":
+                raise
+            values["email_key"] = None
+
+    result = (row.id, row.stripe_customer_id)
+    stage_customer_cache(session, row.phone_key, row.email_key, result)
+    return result
+
+def set_stripe_customer_id(customer_id, stripe_customer_id, session=None):
+    """Attach a Stripe customer unless a concurrent request already did."""
+    if session is None:
+        session = db.session
+    session.execute(
+        db.update(Customer)
+          .where(Customer.id == customer_id, Customer.stripe_customer_id.is_(None))
+          .values(stripe_customer_id=stripe_customer_id)
+          .execution_options(synchronize_session=False)
+    )
+    row = session.execute(
+        db.select(Customer.stripe_customer_id, Customer.phone_key, Customer.email_key)
+          .where(Customer.id == customer_id)
+    ).one()
+    stage_customer_cache(session, row.phone_key, row.email_key,
+                         (customer_id, row.stripe_customer_id))
+    return row.stripe_customer_id
+
+def smtp_configured():
+    return bool(config["ADMIN_EMAIL"] and config["SMTP_HOST"] and config["SMTP_FROM"])
+
+def send_admin_email(subject: str, content: str, session=None):
+    """Queue an email to ADMIN_EMAIL in the current transaction.
+
+    Nothing is sent here; the caller's commit makes the message visible to the
+    outbox workers, which deliver it over a reused SMTP connection.
+    """
+    if not smtp_configured():
+        current_app.logger.info("SMTP or ADMIN_EMAIL not configured — skipping email")
         return False
+    now = datetime.utcnow()
+    (session if session is not None else db.session).add(OutboxMessage(
+        recipient=config["ADMIN_EMAIL"],
+        subject=subject,
+        body=content,
+        next_attempt_at=now + timedelta(seconds=config["OUTBOX_DIGEST_SECONDS"]),
+        created_at=now,
+    ))
+    return True
+
+def claim_outbox_messages(limit):
+    """Atomically claim up to `limit` due messages for this worker.
+
+    Messages stuck in 'sending' past their lease (a worker died mid-send) are
+    picked up again. In digest mode, once a recipient's oldest message is
+    due, their other new messages are claimed with it and go out in the
+    same email.
+    """
+    now = datetime.utcnow()
+    token = str(uuid.uuid4())
+    pending_due = OutboxMessage.next_attempt_at <= now
+    if config["OUTBOX_DIGEST_SECONDS"] > 0:
+        due_recipients = (db.select(OutboxMessage.recipient)
+                            .where(OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= now))
+        # Messages backing off after a failure keep their own schedule
+        pending_due = db.or_(pending_due, db.and_(OutboxMessage.attempts == 0,
+                                                  OutboxMessage.recipient.in_(due_recipients)))
+    due = db.or_(
+        db.and_(OutboxMessage.status == "pending", pending_due),
+        db.and_(OutboxMessage.status == "sending", OutboxMessage.lease_expires_at < now),
+    )
+    candidates = (db.select(OutboxMessage.id)
+                    .where(due)
+                    .order_by(OutboxMessage.id)
+                    .limit(limit)
+                    .scalar_subquery())
+    db.session.execute(
+        db.update(OutboxMessage)
+          .where(OutboxMessage.id.in_(candidates), due)
+          .values(status="sending", claim_token=token,
+                  lease_expires_at=now + timedelta(seconds=config["OUTBOX_LEASE_SECONDS"]))
+          .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return (OutboxMessage.query
+            .filter_by(claim_token=token, status="sending")
+            .order_by(OutboxMessage.id)
+            .all())
+
+def build_outbox_email(messages):
+    """Build one EmailMessage for a message, or a digest for a burst of them."""
+    from email.message import EmailMessage
+
+    msg = EmailMessage()
+    msg["From"] = config["SMTP_FROM"]
+    msg["To"] = messages[0].recipient
+    if len(messages) == 1:
+        msg["Subject"] = messages[0].subject
+        msg.set_content(messages[0].body)
+    else:
+        msg["Subject"] = f"{len(messages)} new notifications"
+        sections = [f"{m.subject}\n{'-' * len(m.subject)}\n{m.body.strip()}" for m in messages]
+        msg.set_content(("\n\n" + "=" * 60 + "\n\n").join(sections))
+    return msg
+
+def outbox_retry_delay(attempts):
+    """Exponential backoff with jitter, capped at OUTBOX_BACKOFF_MAX_SECONDS."""
+    delay = min(config["OUTBOX_BACKOFF_SECONDS"] * 2 ** (attempts - 1),
+                config["OUTBOX_BACKOFF_MAX_SECONDS"])
+    return delay * random.uniform(0.8, 1.2)
+
+def drain_outbox(mailer, limit=None):
+    """Send one batch of due outbox messages; returns how many were handled."""
+    messages = claim_outbox_messages(limit or config["OUTBOX_BATCH_SIZE"])
+    if not messages:
+        return 0
+
+    if config["OUTBOX_DIGEST_SECONDS"] > 0:
+        groups = {}
+        for message in messages:
+            groups.setdefault(message.recipient, []).append(message)
+        batches = list(groups.values())
+    else:
+        batches = [[message] for message in messages]
+
+    for batch in batches:
+        now = datetime.utcnow()
+        try:
+            mailer.send(build_outbox_email(batch))
+        except Exception as e:
+            current_app.logger.warning("Outbox delivery failed for %s: %s", [m.id for m in batch], e)
+            for message in batch:
+                message.attempts += 1
+                message.last_error = str(e)[:1000]
+                message.claim_token = None
+                message.lease_expires_at = None
+                if message.attempts >= config["OUTBOX_MAX_ATTEMPTS"]:
+                    message.status = "dead"
+                    current_app.logger.error("Outbox message %s dead-lettered after %d attempts",
+                                     message.id, message.attempts)
+                else:
+                    message.status = "pending"
+                    message.next_attempt_at = now + timedelta(seconds=outbox_retry_delay(message.attempts))
+        else:
+            for message in batch:
+                message.status = "sent"
+                message.attempts += 1
+                message.sent_at = now
+                message.claim_token = None
+                message.lease_expires_at = None
+        db.session.commit()
+    return len(messages)
+
+def new_mailer():
+    from mailer import SMTPMailer
+
+    return SMTPMailer(config["SMTP_HOST"], config["SMTP_PORT"], config["SMTP_USER"],
+                      config["SMTP_PASS"], starttls=config["SMTP_STARTTLS"],
+                      on_send=record_smtp_send)
+
+def outbox_worker_pool(size=None):
+    """Worker threads draining the outbox, each over its own long-lived connection."""
+    return WorkerPool(
+        PollingWorker(current_app._get_current_object(), f"outbox-{n}", drain_outbox,
+                      interval=config["OUTBOX_POLL_SECONDS"],
+                      setup=new_mailer, teardown=lambda mailer: mailer.close())
+        for n in range(config["OUTBOX_WORKERS"] if size is None else size)
+    )
+
+def is_admin():
+    return bool(session.get("admin_logged_in"))
 
 def admin_required(f):
     """Decorator to require admin login"""
-    from functools import wraps
     @wraps(f)
     def decorated(*args, **kwargs):
-        if not session.get("admin_logged_in"):
-            return redirect(url_for("admin_login"))
+        if not is_admin():
+            return redirect(url_for("admin.admin_login"))
         return f(*args, **kwargs)
     return decorated
 
+# -----------------------
+# Statistics Rollups
+# -----------------------
+def write_rollups(deltas, connection=None):
+    """Add a RollupDeltas batch to the rollup tables (one upsert per table)."""
+    target = connection if connection is not None else db.session
+    for model, rows, keys, counters in (
+        (OrderDailyStat, deltas.order_rows(), ["day", "plan_id", "status"],
+         ["order_count", "amount_total"]),
+        (ComplaintDailyStat, deltas.complaint_rows(), ["day", "category", "status"],
+         ["complaint_count"]),
+    ):
+        if not rows:
+            continue
+        stmt = dialect_insert(model)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={c: getattr(model.__table__.c, c) + getattr(stmt.excluded, c) for c in counters},
+        )
+        target.execute(stmt, rows)
+
+def order_event(kind, order_id, status, previous=None, plan_id=None, amount=None):
+    return {"kind": kind, "entity_id": order_id,
+            "payload": {"id": order_id, "status": status, "previous": previous,
+                        "plan_id": plan_id, "amount": amount}}
+
+def complaint_event(kind, complaint_id, status, previous=None, category=None, complaint_type=None):
+    return {"kind": kind, "entity_id": complaint_id,
+            "payload": {"id": complaint_id, "status": status, "previous": previous,
+                        "category": category, "complaint_type": complaint_type}}
+
+def publish_admin_events(events, connection=None):
+    """Append events to the admin change feed (one INSERT for the batch)."""
+    if not events:
+        return
+    now = datetime.utcnow()
+    rows = [{"kind": e["kind"], "entity_id": e["entity_id"],
+             "payload": json.dumps(dict(e["payload"], type=e["kind"])), "created_at": now}
+            for e in events]
+    (connection if connection is not None else db.session).execute(
+        db.insert(AdminEvent.__table__), rows)
+
+def prune_admin_events():
+    """Delete feed events older than ADMIN_EVENTS_KEEP_SECONDS; returns how many.
+
+    The newest event always stays: SQLite hands out ids after the highest
+    one left, so emptying the table would restart ids below the positions
+    connected dashboards are waiting at.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=config["ADMIN_EVENTS_KEEP_SECONDS"])
+    newest = db.select(db.func.max(AdminEvent.id)).scalar_subquery()
+    deleted = db.session.execute(
+        db.delete(AdminEvent)
+          .where(AdminEvent.created_at < cutoff, AdminEvent.id < newest)
+          .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return deleted
+
+# Registered on every Session, so the async sessions in asgi.py are covered too
+@event.listens_for(Session, "after_flush")
+def _track_flushed_changes(session, flush_context):
+    """Keep the rollups and the admin change feed in step with ORM writes."""
+    deltas = rollups.RollupDeltas()
+    events = []
+    for obj in session.new:
+        if isinstance(obj, Order):
+            deltas.order(obj.created_at, obj.plan_id, obj.amount, obj.status)
+            stage_manifest_change(session, obj, None, obj.status)
+            events.append(order_event("order.created", obj.id, obj.status,
+                                      plan_id=obj.plan_id, amount=obj.amount))
+        elif isinstance(obj, Complaint):
+            deltas.complaint(obj.created_at, obj.category, obj.status)
+            events.append(complaint_event("complaint.created", obj.id, obj.status,
+                                          category=obj.category, complaint_type=obj.complaint_type))
+    for obj in session.dirty:
+        if not isinstance(obj, (Order, Complaint)):
+            continue
+        history = sa_inspect(obj).attrs.status.history
+        if not history.has_changes() or not history.deleted:
+            continue
+        previous = history.deleted[0]
+        if isinstance(obj, Order):
+            deltas.order_transition(obj.created_at, obj.plan_id, obj.amount, previous, obj.status)
+            stage_manifest_change(session, obj, previous, obj.status)
+            events.append(order_event("order.status", obj.id, obj.status, previous,
+                                      obj.plan_id, obj.amount))
+        else:
+            deltas.complaint_transition(obj.created_at, obj.category, previous, obj.status)
+            events.append(complaint_event("complaint.status", obj.id, obj.status, previous,
+                                          obj.category, obj.complaint_type))
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            deltas.order(obj.created_at, obj.plan_id, obj.amount, obj.status, -1)
+            stage_manifest_change(session, obj, obj.status, None)
+        elif isinstance(obj, Complaint):
+            deltas.complaint(obj.created_at, obj.category, obj.status, -1)
+    if deltas:
+        write_rollups(deltas, session.connection())
+    publish_admin_events(events, session.connection())
+
+def rollup_totals(model, date_from, date_to, group_by, measures):
+    """Aggregate rollup rows between two days (inclusive), grouped by dimensions."""
+    columns = [getattr(model, name) for name in group_by]
+    query = db.session.query(*columns, *[db.func.sum(getattr(model, m)) for m in measures])
+    if date_from:
+        query = query.filter(model.day >= date_from.date())
+    if date_to:
+        query = query.filter(model.day <= date_to.date())
+    if columns:
+        query = query.group_by(*columns).order_by(*columns)
+    rows = []
+    for row in query:
+        item = {name: (value.isoformat() if name == "day" else value)
+                for name, value in zip(group_by, row)}
+        item.update({m: int(value or 0) for m, value in zip(measures, row[len(columns):])})
+        rows.append(item)
+    return rows
+
+# -----------------------
+# Kitchen Manifest
+# -----------------------
+# Meals to cook and deliver per day, meal type and area (see kitchen.py).
+# Orders entering or leaving delivery are staged on the session and applied
+# to this process's cached manifest once the transaction commits.
+def stage_manifest_change(session, order, previous, status):
+    """Queue +1/-1 for an order (or row) whose status change starts or stops delivery."""
+    sign = (status in kitchen.ACTIVE_STATUSES) - (previous in kitchen.ACTIVE_STATUSES)
+    if sign and order.created_at is not None:
+        session.info.setdefault("manifest_changes", []).append(
+            (order.created_at.date(), order.plan_id, order.area, sign))
+
+@event.listens_for(Session, "after_commit")
+def _apply_manifest_changes(session):
+    changes = session.info.pop("manifest_changes", None)
+    if changes and has_app_context():
+        kitchen_manifest.apply(changes)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_manifest_changes(session):
+    session.info.pop("manifest_changes", None)
+
+def manifest_groups(first_day, last_day):
+    """Active orders placed between two days, counted per (day, plan, area)."""
+    day = db.func.date(Order.created_at, type_=db.Date)
+    # Every custom plan id is unique; group them by their meal type and duration
+    plan = db.case(*[(Order.plan_id.startswith(f"{prefix}_", autoescape=True), prefix)
+                     for prefix in kitchen.custom_plan_prefixes()], else_=Order.plan_id)
+    return (db.session.query(day, plan, Order.area, db.func.count())
+            .filter(Order.status.in_(kitchen.ACTIVE_STATUSES),
+                    Order.created_at >= datetime.combine(first_day, datetime.min.time()),
+                    Order.created_at < datetime.combine(last_day + timedelta(days=1),
+                                                        datetime.min.time()))
+            .group_by(day, plan, Order.area)
+            .all())
+
+def manifest_plans():
+    """{plan id: (meal type, duration days)}, including retired plans."""
+    return {plan_id: (meal_type, duration) for plan_id, meal_type, duration in
+            db.session.query(Plan.id, Plan.meal_type, Plan.duration_days)}
+
+def parse_manifest_date(value):
+    """YYYY-MM-DD as a date, today (UTC) when absent; None when invalid."""
+    if not value:
+        return datetime.utcnow().date()
+    parsed = parse_date(value)
+    return parsed.date() if parsed else None
+
+# -----------------------
+# Webhook Pipeline
+# -----------------------
+# Statuses an order can reach after it has been paid. Payment lifecycle
+# events (which Stripe may redeliver late) never move an order out of these.
+POST_PAYMENT_STATUSES = {"paid", "fulfilled", "refunded", "partially_refunded",
+                         "disputed", "dispute_lost"}
+
+webhook_counters = {"batches": 0, "events": 0, "orders_updated": 0,
+                    "last_batch_at": None, "last_lag_seconds": 0.0}
+
+def event_payment_intent_id(event_type, obj):
+    """Payment intent an event refers to (charges and disputes point at one)."""
+    if event_type.startswith("payment_intent."):
+        return obj.get("id") if isinstance(obj, dict) else obj.id
+    value = obj.get("payment_intent") if isinstance(obj, dict) else getattr(obj, "payment_intent", None)
+    if value is not None and not isinstance(value, str):
+        value = value.get("id") if isinstance(value, dict) else value.id
+    return value
+
+def webhook_transition(event_type, obj, current):
+    """Return (new_status, charge_id) for an event, or None to leave the order alone."""
+    if event_type == "payment_intent.succeeded":
+        if current in POST_PAYMENT_STATUSES:
+            return None
+        charge = obj.get("latest_charge")
+        return "paid", charge.get("id") if isinstance(charge, dict) else charge
+    if event_type in ("payment_intent.payment_failed", "payment_intent.canceled",
+                      "payment_intent.processing"):
+        if current in POST_PAYMENT_STATUSES:
+            return None
+        return {"payment_intent.payment_failed": "failed",
+                "payment_intent.canceled": "canceled",
+                "payment_intent.processing": "processing"}[event_type], None
+    if event_type == "charge.refunded":
+        if obj.get("refunded"):
+            return "refunded", obj.get("id")
+        amount_refunded, amount = obj.get("amount_refunded"), obj.get("amount")
+        if amount_refunded is None or amount is None:
+            # Full or partial cannot be told apart: keep the status rather than guess
+            current_app.logger.warning("Refund of charge %s has no amounts; order left %s",
+                                       obj.get("id"), current)
+            return None
+        return ("refunded" if amount_refunded >= amount else "partially_refunded"), obj.get("id")
+    if event_type == "charge.dispute.created":
+        return "disputed", obj.get("charge")
+    if event_type == "charge.dispute.closed":
+        if obj.get("status") == "lost":
+            return "dispute_lost", obj.get("charge")
+        return ("paid", obj.get("charge")) if current == "disputed" else None
+    return None
+
+HANDLED_WEBHOOK_EVENTS = {
+    "payment_intent.succeeded", "payment_intent.payment_failed",
+    "payment_intent.canceled", "payment_intent.processing",
+    "charge.refunded", "charge.dispute.created", "charge.dispute.closed",
+}
+
+def apply_order_transitions(changes, expected, session=None):
+    """Apply {payment_intent_id: (status, charge_id)} in one UPDATE statement.
+
+    Only orders still in their `expected` status ({payment_intent_id:
+    status}) are changed, so a transition another worker or request made in
+    the meantime is never applied twice. Returns the intents updated.
+    """
+    if not changes:
+        return set()
+    intent_col = Order.stripe_payment_intent_id
+    status_case = db.case(
+        {pi: status for pi, (status, _) in changes.items()}, value=intent_col
+    )
+    charges = {pi: charge for pi, (_, charge) in changes.items() if charge}
+    values = {"status": status_case, "updated_at": datetime.utcnow()}
+    if charges:
+        values["stripe_charge_id"] = db.case(charges, value=intent_col,
+                                             else_=Order.stripe_charge_id)
+    rows = (session if session is not None else db.session).execute(
+        db.update(Order)
+          .where(intent_col.in_(list(changes)),
+                 Order.status == db.case({pi: expected[pi] for pi in changes}, value=intent_col))
+          .values(**values)
+          .returning(intent_col)
+          .execution_options(synchronize_session=False)
+    ).scalars().all()
+    return set(rows)
+
+def orders_by_intent(intent_ids, session=None):
+    """{payment intent id: order row, with its customer} for a batch of intents, in one query."""
+    if not intent_ids:
+        return {}
+    rows = (session if session is not None else db.session).execute(
+        db.select(Order.stripe_payment_intent_id, Order.id, Order.status, Order.plan_id,
+                  Order.amount, Order.currency, Order.created_at, Order.area,
+                  Customer.name.label("customer_name"), Customer.phone.label("customer_phone"),
+                  Customer.email.label("customer_email"))
+          .outerjoin(Customer, Order.customer_id == Customer.id)
+          .where(Order.stripe_payment_intent_id.in_(list(intent_ids)))
+    )
+    return {row.stripe_payment_intent_id: row for row in rows}
+
+def find_payment_order(session, payment_intent_id):
+    return orders_by_intent({payment_intent_id}, session).get(payment_intent_id)
+
+def queue_paid_notification(session, order):
+    """Queue the admin email for an order (row from orders_by_intent) that just became paid."""
+    subject = f"New subscription paid — {order.plan_id} — ₹{order.amount/100:.2f}"
+    content = f"""
+A new payment has been received.
+
+Order ID: {order.id}
+Plan: {order.plan_id}
+Amount: ₹{order.amount/100:.2f} {order.currency}
+Customer: {order.customer_name or 'N/A'} 
+Phone: {order.customer_phone or 'N/A'}
+Email: {order.customer_email or 'N/A'}
+Stripe Payment Intent: {order.stripe_payment_intent_id}
+
+Please check the admin dashboard: /admin
+"""
+    send_admin_email(subject, content, session=session)
+
+def apply_order_changes(changes, orders, session=None):
+    """Apply transitions to `orders` (rows from orders_by_intent).
+
+    Every order that actually moves gets its rollup, change feed and
+    manifest updates, and the admin is notified once when it becomes paid,
+    whichever path (confirmation, webhook, reconciliation) got there first.
+    Returns the number of orders updated.
+    """
+    session = session if session is not None else db.session
+    updated = apply_order_transitions(
+        changes, {pi: orders[pi].status for pi in changes}, session)
+    deltas = rollups.RollupDeltas()
+    admin_events = []
+    for pi in updated:
+        row, status = orders[pi], changes[pi][0]
+        deltas.order_transition(row.created_at, row.plan_id, row.amount, row.status, status)
+        stage_manifest_change(session, row, row.status, status)
+        admin_events.append(order_event("order.status", row.id, status, row.status,
+                                        row.plan_id, row.amount))
+        if status == "paid" and row.status not in POST_PAYMENT_STATUSES:
+            queue_paid_notification(session, row)
+    write_rollups(deltas, session.connection())
+    publish_admin_events(admin_events, session.connection())
+    return len(updated)
+
+def process_stripe_events(limit=None):
+    """Apply one batch of recorded webhook events in event-time order.
+
+    Costs one SELECT of events, one SELECT of the affected orders, one UPDATE
+    of orders and one UPDATE marking the events processed, however many
+    events the batch holds. Returns the number of events handled.
+    """
+    events = (StripeEvent.query
+              .filter(StripeEvent.processed_at.is_(None))
+              .order_by(StripeEvent.event_created, StripeEvent.id)
+              .limit(limit or config["WEBHOOK_BATCH_SIZE"])
+              .all())
+    if not events:
+        return 0
+
+    orders = orders_by_intent({e.payment_intent_id for e in events if e.payment_intent_id})
+    current = {pi: row.status for pi, row in orders.items()}
+
+    changes = {}
+    results = {}
+    for stripe_event in events:
+        if stripe_event.type not in HANDLED_WEBHOOK_EVENTS:
+            results[stripe_event.id] = "unhandled"
+            continue
+        pi = stripe_event.payment_intent_id
+        if pi not in current:
+            results[stripe_event.id] = "no_order"
+            continue
+        obj = json.loads(stripe_event.payload)["data"]["object"]
+        transition = webhook_transition(stripe_event.type, obj, current[pi])
+        if transition is None or transition[0] == current[pi]:
+            results[stripe_event.id] = "ignored"
+            continue
+        status, charge_id = transition
+        previous_charge = changes.get(pi, (None, None))[1]
+        changes[pi] = (status, charge_id or previous_charge)
+        current[pi] = status
+        results[stripe_event.id] = "applied"
+
+    updated = apply_order_changes(changes, orders)
+
+    now = datetime.utcnow()
+    for result in set(results.values()):
+        ids = [event_id for event_id, r in results.items() if r == result]
+        db.session.execute(
+            db.update(StripeEvent)
+              .where(StripeEvent.id.in_(ids))
+              .values(processed_at=now, result=result)
+              .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+
+    webhook_counters["batches"] += 1
+    webhook_counters["events"] += len(events)
+    webhook_counters["orders_updated"] += updated
+    webhook_counters["last_batch_at"] = now
+    webhook_counters["last_lag_seconds"] = max(
+        (now - e.received_at).total_seconds() for e in events
+    )
+    current_app.logger.info("Applied %d webhook event(s), %d order(s) updated", len(events), updated)
+    return len(events)
+
+def webhook_pipeline_stats():
+    """Backlog size and lag of the webhook pipeline."""
+    pending, oldest = (db.session.query(db.func.count(StripeEvent.id),
+                                        db.func.min(StripeEvent.received_at))
+                       .filter(StripeEvent.processed_at.is_(None))
+                       .one())
+    last_batch_at = webhook_counters["last_batch_at"]
+    return {
+        "backlog": pending,
+        "oldest_pending_age_seconds": (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0,
+        "batches": webhook_counters["batches"],
+        "events_processed": webhook_counters["events"],
+        "orders_updated": webhook_counters["orders_updated"],
+        "last_batch_at": last_batch_at.isoformat() if last_batch_at else None,
+        "last_batch_lag_seconds": webhook_counters["last_lag_seconds"],
+    }
+
+def webhook_job(state):
+    """Apply a batch of events, and prune the admin change feed now and then."""
+    handled = process_stripe_events()
+    now = time.monotonic()
+    if now - state["pruned_at"] >= config["ADMIN_EVENTS_PRUNE_SECONDS"]:
+        state["pruned_at"] = now
+        pruned = prune_admin_events()
+        if pruned:
+            current_app.logger.info("Pruned %d admin event(s)", pruned)
+    return handled
+
+def webhook_worker():
+    """Single worker, so events are always applied in event-time order."""
+    return PollingWorker(current_app._get_current_object(), "webhook", webhook_job,
+                         interval=config["WEBHOOK_POLL_SECONDS"],
+                         setup=lambda: {"pruned_at": float("-inf")})
+
+# -----------------------
+# Reconciliation
+# -----------------------
+# Orders whose webhook never arrived (and whose browser never called
+# confirm_payment) are caught up from Stripe's PaymentIntent list rather than
+# one retrieve per order: each page of up to 100 intents, charges expanded,
+# costs one list call, one IN query and one UPDATE. A run covers the intents
+# created since the last run's checkpoint and saves its cursor after every
+# page, so an interrupted run resumes where it stopped.
+RECONCILE_CHECKPOINT = "reconcile"
+# Intents a customer may still complete; recent ones hold the checkpoint back
+OPEN_INTENT_STATUSES = {"requires_payment_method", "requires_confirmation",
+                        "requires_action", "processing"}
+
+def load_checkpoint(name):
+    row = db.session.get(JobCheckpoint, name)
+    return json.loads(row.state) if row else None
+
+def save_checkpoint(name, state):
+    stmt = dialect_insert(JobCheckpoint).values(name=name, state=json.dumps(state),
+                                                updated_at=datetime.utcnow())
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=["name"],
+        set_={"state": stmt.excluded.state, "updated_at": stmt.excluded.updated_at}))
+
+def reconcile_transition(intent, current):
+    """Return (new_status, charge_id) for a listed PaymentIntent, or None if the order is right."""
+    charge = getattr(intent, "latest_charge", None)
+    charge_id = payments.charge_id(intent)
+    status = None
+    if intent.status == "succeeded":
+        if charge is not None and not isinstance(charge, str) and getattr(charge, "amount_refunded", 0):
+            status = "refunded" if getattr(charge, "refunded", False) else "partially_refunded"
+        elif current not in POST_PAYMENT_STATUSES:
+            status = "paid"
+    elif current not in POST_PAYMENT_STATUSES:
+        if intent.status in ("canceled", "processing"):
+            status = intent.status
+        elif getattr(intent, "last_payment_error", None):
+            status = "failed"
+    if status is None or status == current:
+        return None
+    return status, charge_id
+
+def new_reconcile_run(since, now=None):
+    now = int(now or time.time())
+    return {"since": int(since), "until": now, "starting_after": None, "hold": None,
+            "intents": 0, "corrected": 0, "no_order": 0}
+
+def reconcile_page(state, dry_run=False):
+    """Reconcile the next page of a run; returns (state, mismatches, done).
+
+    `state` comes from new_reconcile_run() or the checkpoint. Corrections
+    are applied with apply_order_changes() unless `dry_run`; the caller
+    commits and saves the returned state.
+    """
+    page = payments.list_payment_intents(
+        created_gte=state["since"], created_lt=state["until"],
+        starting_after=state["starting_after"], limit=config["RECONCILE_PAGE_SIZE"])
+    intents = list(page.data)
+    orders = orders_by_intent({intent.id for intent in intents})
+    hold_after = state["until"] - config["RECONCILE_OPEN_HOURS"] * 3600
+
+    changes, mismatches = {}, []
+    for intent in intents:
+        if intent.status in OPEN_INTENT_STATUSES and intent.created >= hold_after:
+            state["hold"] = min(state["hold"] or intent.created, intent.created)
+        row = orders.get(intent.id)
+        if row is None:
+            state["no_order"] += 1
+            continue
+        transition = reconcile_transition(intent, row.status)
+        if transition:
+            changes[intent.id] = transition
+            mismatches.append({"order_id": row.id, "payment_intent_id": intent.id,
+                               "stripe_status": intent.status, "from": row.status,
+                               "to": transition[0]})
+    if changes and not dry_run:
+        apply_order_changes(changes, orders)
+        for status, _ in changes.values():
+            reconcile_corrections.inc(status=status)
+
+    state["intents"] += len(intents)
+    state["corrected"] += len(changes)
+    state["starting_after"] = intents[-1].id if intents else state["starting_after"]
+    return state, mismatches, not (page.has_more and intents)
+
+def finish_reconcile_run(state):
+    """Checkpoint for the next run: where this one ended, or the oldest intent still open."""
+    since = min(state["hold"] or state["until"], state["until"])
+    return {"since": since, "until": None,
+            "last_run": {k: state[k] for k in ("since", "until", "intents", "corrected", "no_order")}}
+
+def current_reconcile_run():
+    """The run in progress, or a new one starting at the checkpoint."""
+    checkpoint = load_checkpoint(RECONCILE_CHECKPOINT) or {}
+    if checkpoint.get("until"):
+        return checkpoint
+    since = checkpoint.get("since") or time.time() - config["RECONCILE_LOOKBACK_HOURS"] * 3600
+    return new_reconcile_run(since)
+
+def reconcile_job():
+    """One page per call, for the PollingWorker; returns 0 once a run is complete."""
+    state = current_reconcile_run()
+    listed = state["intents"]
+    state, mismatches, done = reconcile_page(state)
+    for m in mismatches:
+        current_app.logger.warning("Reconciled order %s (%s): %s -> %s", m["order_id"],
+                                   m["payment_intent_id"], m["from"], m["to"])
+    save_checkpoint(RECONCILE_CHECKPOINT, finish_reconcile_run(state) if done else state)
+    db.session.commit()
+    if done:
+        current_app.logger.info("Reconciliation run complete: %d intent(s), %d correction(s)",
+                                state["intents"], state["corrected"])
+        return 0
+    return state["intents"] - listed
+
+def reconcile_worker():
+    return PollingWorker(current_app._get_current_object(), "reconcile", reconcile_job,
+                         interval=config["RECONCILE_INTERVAL_SECONDS"])
+
+# -----------------------
+# Observability
+# -----------------------
+metrics = Registry()
+http_requests = metrics.counter(
+    "http_requests_total", "HTTP requests by endpoint, method and status.",
+    ["endpoint", "method", "status"])
+http_latency = metrics.histogram(
+    "http_request_duration_seconds", "HTTP request latency by endpoint.",
+    ["endpoint", "method"])
+request_sql_queries = metrics.histogram(
+    "http_request_sql_queries", "SQL statements executed per request.",
+    ["endpoint"], buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50, 100))
+request_sql_seconds = metrics.histogram(
+    "http_request_sql_seconds", "Time spent in SQL per request.", ["endpoint"])
+sql_queries = metrics.counter("sql_queries_total", "SQL statements executed.")
+sql_seconds = metrics.counter("sql_query_seconds_total", "Time spent executing SQL.")
+stripe_latency = metrics.histogram(
+    "stripe_request_duration_seconds", "Stripe API call latency.", ["operation"])
+stripe_errors = metrics.counter(
+    "stripe_request_errors_total", "Failed Stripe API calls.", ["operation"])
+payment_confirmations = metrics.counter(
+    "payment_confirmations_total",
+    "confirm_payment answers: from the order row (local), a Stripe call, or a shared call.",
+    ["source"])
+reconcile_corrections = metrics.counter(
+    "reconcile_corrections_total", "Order statuses corrected by reconciliation.", ["status"])
+smtp_latency = metrics.histogram("smtp_send_duration_seconds", "SMTP send latency.")
+smtp_errors = metrics.counter("smtp_send_errors_total", "Failed SMTP sends.")
+
+def _outbox_backlog():
+    return {(status,): count for status, count in
+            db.session.query(OutboxMessage.status, db.func.count(OutboxMessage.id))
+                      .filter(OutboxMessage.status.in_(["pending", "sending", "dead"]))
+                      .group_by(OutboxMessage.status)}
+
+def _webhook_backlog():
+    stats = webhook_pipeline_stats()
+    return {("backlog",): stats["backlog"],
+            ("oldest_pending_age_seconds",): stats["oldest_pending_age_seconds"],
+            ("last_batch_lag_seconds",): stats["last_batch_lag_seconds"] or 0.0}
+
+metrics.gauge("email_outbox_messages", "Outbox messages not yet sent, by status.",
+              _outbox_backlog, ["status"])
+metrics.gauge("stripe_webhook_pipeline", "Webhook backlog and lag.",
+              _webhook_backlog, ["measure"])
+
+def _confirmation_hit_ratio():
+    local = payment_confirmations.value(source="local")
+    total = local + payment_confirmations.value(source="stripe") \
+        + payment_confirmations.value(source="coalesced")
+    return round(local / total, 4) if total else 0.0
+
+metrics.gauge("payment_confirmation_local_ratio",
+              "Share of confirm_payment calls answered without calling Stripe.",
+              _confirmation_hit_ratio)
+
+def record_stripe_call(operation, seconds, error):
+    stripe_latency.observe(seconds, operation=operation)
+    if error is not None:
+        stripe_errors.inc(operation=operation)
+    if has_request_context() and "profile" in g:
+        g.profile.call("stripe", operation, seconds, error)
+
+def record_smtp_send(seconds, error):
+    smtp_latency.observe(seconds)
+    if error is not None:
+        smtp_errors.inc()
+    if has_request_context() and "profile" in g:
+        g.profile.call("smtp", "send", seconds, error)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _sql_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _sql_finished(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    sql_queries.inc()
+    sql_seconds.inc(elapsed)
+    if has_request_context() and "sql_count" in g:
+        g.sql_count += 1
+        g.sql_seconds += elapsed
+        if "profile" in g:
+            g.profile.call("sql", statement, elapsed)
+
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    g.sql_count = 0
+    g.sql_seconds = 0.0
+
+def _record_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        # Route templates, not raw paths, keep label cardinality bounded
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        elapsed = time.perf_counter() - started
+        http_requests.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        http_latency.observe(elapsed, endpoint=endpoint, method=request.method)
+        request_sql_queries.observe(g.sql_count, endpoint=endpoint)
+        request_sql_seconds.observe(g.sql_seconds, endpoint=endpoint)
+        current_app.logger.debug("%s %s %s %.1fms sql=%d/%.1fms", request.method, request.path,
+                         response.status_code, elapsed * 1000, g.sql_count, g.sql_seconds * 1000)
+    return response
+
+@public.route("/metrics")
+def metrics_endpoint():
+    """Prometheus scrape endpoint: a bearer METRICS_TOKEN or an admin session"""
+    token = config["METRICS_TOKEN"]
+    authorization = request.headers.get("Authorization", "").encode()
+    if not (token and hmac.compare_digest(authorization, f"Bearer {token}".encode())) \
+            and not is_admin():
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# -----------------------
+# Rate Limiting
+# -----------------------
+rate_limited_requests = metrics.counter(
+    "rate_limited_requests_total", "Requests rejected by a rate limit.", ["rule"])
+
+def client_ip():
+    return ratelimit.client_address(request.remote_addr, request.headers.get("X-Forwarded-For"),
+                                    config["RATE_LIMIT_PROXIES"])
+
+def over_limit(limiter, rule_name, key):
+    """Take a token from key's bucket; seconds to wait if there was none."""
+    rule = config["RATE_LIMITS"].get(rule_name)
+    if rule is None or not key:
+        return 0
+    wait = limiter.hit(rule, key)
+    if wait:
+        rate_limited_requests.inc(rule=rule.name)
+    return wait
+
+def rate_limit_wait(ip, data, ip_rule, phone_rule=None, phone=None):
+    """Seconds until the client IP (then the body's phone) may try again; 0 if allowed.
+
+    Rules are named as in settings.RATE_LIMITS.
+    """
+    limiter = service("rate_limiter")
+    if limiter is None:
+        return 0
+    wait = over_limit(limiter, ip_rule, ip)
+    if not wait and phone_rule is not None:
+        wait = over_limit(limiter, phone_rule, normalize_phone(phone(data)))
+    return wait
+
+def too_many_requests(wait):
+    return {"error": "Too many requests, please try again later", "retry_after": wait}
+
+def rate_limited(ip_rule, phone_rule=None, phone=None):
+    """Answer 429 once the client IP, or the phone in the body, is over its limit.
+
+    `phone(data)` picks the phone number out of the JSON or form body.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if service("rate_limiter") is not None:
+                data = request.get_json(silent=True)
+                if not isinstance(data, dict):
+                    data = request.form
+                wait = rate_limit_wait(client_ip(), data, ip_rule, phone_rule, phone)
+                if wait:
+                    response = jsonify(too_many_requests(wait))
+                    response.headers["Retry-After"] = str(wait)
+                    return response, 429
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+def payment_phone(data):
+    customer = data.get("customer")
+    return customer.get("phone") if isinstance(customer, dict) else None
+
+# -----------------------
+# Page Cache
+# -----------------------
+template_versions = {}
+
+def page_version(template):
+    """DEPLOY_VERSION when set, else the template's mtime (re-checked only in debug)."""
+    if config["DEPLOY_VERSION"]:
+        return config["DEPLOY_VERSION"]
+    if template is None:
+        return "static"
+    if current_app.debug or template not in template_versions:
+        path = os.path.join(current_app.root_path, current_app.template_folder, template)
+        template_versions[template] = os.stat(path).st_mtime_ns
+    return template_versions[template]
+
+def cached_page(template=None, version=None):
+    """Serve a view's output from the page cache with ETag/304 and gzip.
+
+    Only for responses that are the same for every visitor; `version` adds
+    a data version (e.g. the plan catalog) to the cache key.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (request.endpoint, page_version(template), version() if version else None)
+            entry = page_cache.get(key)
+            if entry is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                entry = page_cache.store(key, response.get_data(), response.mimetype)
+            compressed = "gzip" in request.accept_encodings
+            # Distinct validators per encoding, as the bytes differ
+            etag = entry.etag + ("-gz" if compressed else "")
+            if etag in request.if_none_match:
+                page_cache.not_modified += 1
+                response = Response(status=304)
+            else:
+                response = Response(entry.body(compressed), mimetype=entry.mimetype)
+                if compressed:
+                    response.headers["Content-Encoding"] = "gzip"
+            response.set_etag(etag)
+            response.vary.add("Accept-Encoding")
+            response.cache_control.public = True
+            response.cache_control.max_age = config["PAGE_CACHE_MAX_AGE"]
+            return response
+        return wrapper
+    return decorator
+
+metrics.gauge("page_cache", "Page cache lookups and memory footprint.",
+              lambda: {(k,): v for k, v in page_cache.stats().items()}, ["measure"])
+
 # -----------------------
 # Frontend Routes
 # -----------------------
-@app.route("/")
+@public.route("/")
+@cached_page('index.html')
 def home():
     return render_template('index.html')
 
-@app.route("/plans")
+@public.route("/plans")
+@cached_page('plans.html', version=lambda: plan_catalog.version)
 def plans():
-    return render_template('plans.html')
+    plans = plan_catalog.plans()
+    return render_template('plans.html', plans=plans,
+                           plans_by_id={plan["id"]: plan for plan in plans},
+                           custom_meal_prices=CUSTOM_MEAL_PRICES,
+                           custom_durations=CUSTOM_DURATIONS)
 
-@app.route("/about")
+@public.route("/about")
+@cached_page('about.html')
 def about():
     return render_template('about.html')
 
-@app.route("/features")
+@public.route("/features")
+@cached_page('features.html')
 def features():
     return render_template('features.html')
 
+# -----------------------
+# Payment Steps
+# -----------------------
+# The payment endpoints are short database steps around Stripe calls. Each
+# step takes the session to use and commits its own work, so the sync views
+# below (db.session) and the async ones in asgi.py (AsyncSession.run_sync)
+# share them.
+def parse_checkout(data):
+    """(checkout, None) for a valid request, else (None, (error body, status))."""
+    plan_id = data.get("plan_id")
+    amount = data.get("amount")
+    currency = data.get("currency", "inr")
+    customer = data.get("customer", {})
+
+    if not plan_id or not amount:
+        return None, ({"error": "plan_id and amount are required"}, 400)
+    try:
+        # Whole paise, as a number or a numeric string: 1500.0 is 1500, 1500.5 is not
+        paise = int(amount)
+        if isinstance(amount, bool) or (isinstance(amount, float) and paise != amount):
+            raise ValueError(amount)
+    except (TypeError, ValueError, OverflowError):
+        return None, ({"error": "amount must be a whole number of paise"}, 400)
+
+    # Prices come from the catalog snapshot, never from the browser
+    price = checkout_price(str(plan_id), data.get("planDetails"))
+    if price is None:
+        return None, ({"error": "Unknown plan"}, 400)
+    if paise != price or str(currency).lower() != "inr":
+        return None, ({"error": "Plan price has changed, please refresh the page",
+                       "amount": price}, 409)
+    return {"plan_id": plan_id, "amount": paise, "currency": currency,
+            "description": data.get("description", ""), "customer": customer,
+            "area": kitchen.normalize_area(customer.get("area"))}, None
+
+def start_checkout(session, checkout):
+    """Find or create the customer; returns (customer id, stripe customer id)."""
+    customer = checkout["customer"]
+    result = upsert_customer(customer.get("name"), customer.get("phone"),
+                             customer.get("email"), session=session)
+    session.commit()
+    return result
+
+def stripe_customer_args(checkout, customer_id):
+    return {"metadata": {"plan_id": checkout["plan_id"], "customer_id": str(customer_id)},
+            "idempotency_key": f"customer-{customer_id}"}
+
+# Stripe keeps idempotency keys for 24 hours; reuse orders well inside that
+CHECKOUT_REUSE_WINDOW = timedelta(hours=23)
+
+def open_checkout_order(session, checkout, customer_id):
+    """The customer's unpaid order for the same checkout, which a retry reuses.
+
+    Its payment intent's idempotency key then matches the first attempt's,
+    so Stripe returns the same intent instead of creating another.
+    """
+    return session.execute(
+        db.select(Order)
+          .where(Order.customer_id == customer_id, Order.status == "created",
+                 Order.plan_id == checkout["plan_id"], Order.amount == checkout["amount"],
+                 Order.currency == checkout["currency"].upper(),
+                 Order.description == checkout["description"],
+                 Order.created_at >= datetime.utcnow() - CHECKOUT_REUSE_WINDOW)
+          .order_by(Order.id.desc())
+          .limit(1)
+    ).scalar()
+
+def create_checkout_order(session, checkout, customer_id, stripe_customer_id,
+                          new_stripe_customer_id=None):
+    """Record a new Stripe customer and the order; returns (order, id, stripe customer id).
+
+    A retried checkout gets back the order its first attempt created. That
+    attempt committed the Stripe customer id with its order, so a customer
+    still getting one has no order to reuse and skips the lookup.
+    """
+    order = None
+    if new_stripe_customer_id:
+        stripe_customer_id = set_stripe_customer_id(customer_id, new_stripe_customer_id,
+                                                    session=session)
+    else:
+        order = open_checkout_order(session, checkout, customer_id)
+    if order is None:
+        order = Order(
+            plan_id=checkout["plan_id"],
+            description=checkout["description"],
+            amount=checkout["amount"],
+            currency=checkout["currency"].upper(),
+            status="created",
+            customer_id=customer_id,
+            area=checkout["area"],
+        )
+        session.add(order)
+    # Read the id before committing: reading it afterwards would open a new
+    # transaction that stays open across the Stripe call that follows
+    session.flush()
+    order_id = order.id
+    session.commit()
+    return order, order_id, stripe_customer_id
+
+def payment_intent_args(checkout, customer_id, stripe_customer_id, order_id):
+    return {
+        "amount": checkout["amount"],
+        "currency": checkout["currency"].lower(),
+        "customer": stripe_customer_id,
+        "description": checkout["description"],
+        "metadata": {
+            "plan_id": checkout["plan_id"],
+            "customer_id": str(customer_id),
+            "order_id": str(order_id),
+        },
+        "idempotency_key": f"order-{order_id}-payment-intent",
+    }
+
+def attach_payment_intent(session, order, payment_intent_id):
+    order.stripe_payment_intent_id = payment_intent_id
+    session.commit()
+
+def fail_checkout_order(session, order):
+    order.status = "failed"
+    session.commit()
+
+def local_payment_result(order):
+    """(body, HTTP status) when the order row alone answers a confirmation, else None.
+
+    Paid orders (whether by an earlier confirmation, the webhook or
+    reconciliation) and canceled ones cannot change on Stripe's side, so
+    only orders still waiting for payment need a Stripe call.
+    """
+    if order is None:
+        return {"success": False, "error": "Order not found"}, 404
+    if order.status in POST_PAYMENT_STATUSES:
+        return {"success": True, "status": order.status}, 200
+    if order.status == "canceled":
+        return {"success": False, "status": order.status}, 400
+    return None
+
+def record_payment(session, payment_intent_id, payment_intent, order=None):
+    """Apply a retrieved PaymentIntent to its order; returns (body, HTTP status).
+
+    `order` is the row from find_payment_order() when the caller has it.
+    """
+    if order is None:
+        order = find_payment_order(session, payment_intent_id)
+    if order is None:
+        return {"success": False, "error": "Order not found"}, 404
+    if order.status in POST_PAYMENT_STATUSES:
+        return local_payment_result(order)
+
+    if payment_intent.status == "succeeded":
+        if apply_order_changes({payment_intent_id: ("paid", payments.charge_id(payment_intent))},
+                               {payment_intent_id: order}, session):
+            current_app.logger.info("Payment confirmed for order %s", order.id)
+        session.commit()
+        return {"success": True, "status": "paid"}, 200
+
+    if payment_intent.status != order.status:
+        apply_order_changes({payment_intent_id: (payment_intent.status, None)},
+                            {payment_intent_id: order}, session)
+        session.commit()
+    current_app.logger.info("Payment for order %s not succeeded, status: %s", order.id, payment_intent.status)
+    return {"success": False, "status": payment_intent.status}, 400
+
+def retrieve_for_confirmation(payment_intent_id):
+    """Retrieve an intent from Stripe, sharing the call with concurrent confirmations."""
+    payment_intent, shared = confirm_flights.do(
+        payment_intent_id, lambda: payments.retrieve_payment_intent(payment_intent_id))
+    payment_confirmations.inc(source="coalesced" if shared else "stripe")
+    return payment_intent
+
+def record_webhook_event(session, payload, sig_header):
+    """Verify a Stripe webhook and store it; returns (body, HTTP status)."""
+    secret = config["STRIPE_WEBHOOK_SECRET"]
+    if not secret:
+        current_app.logger.warning("Webhook secret not configured")
+        return {"status": "webhook secret not configured"}, 400
+
+    try:
+        stripe_event = payments.construct_event(payload, sig_header, secret)
+    except ValueError:
+        return {"error": "Invalid payload"}, 400
+    except InvalidSignature:
+        return {"error": "Invalid signature"}, 400
+
+    # Redeliveries hit the primary key and are dropped
+    result = session.execute(
+        dialect_insert(StripeEvent)
+        .values(
+            id=stripe_event.id,
+            type=stripe_event.type,
+            payment_intent_id=event_payment_intent_id(stripe_event.type,
+                                                      stripe_event.data.object),
+            event_created=stripe_event.created,
+            payload=payload.decode("utf-8"),
+            received_at=datetime.utcnow(),
+        )
+        .on_conflict_do_nothing(index_elements=["id"])
+    )
+    session.commit()
+    return {"status": "accepted" if result.rowcount else "duplicate"}, 200
+
 # -----------------------
 # API Routes - STRIPE
 # -----------------------
-@app.route("/api/get_stripe_config", methods=["GET"])
+@api.route("/api/get_stripe_config", methods=["GET"])
+@cached_page()
 def get_stripe_config():
     """Return Stripe publishable key for frontend"""
-    print("DEBUG: get_stripe_config called")
-    return jsonify({"publishableKey": STRIPE_PUBLISHABLE_KEY})
+    return jsonify({"publishableKey": config["STRIPE_PUBLISHABLE_KEY"]})
+
+@api.route("/api/plans")
+@cached_page(version=lambda: plan_catalog.version)
+def api_plans():
+    """Plan catalog for the frontend"""
+    return jsonify({
+        "version": plan_catalog.version,
+        "plans": plan_catalog.plans(),
+        "custom": {"meal_prices": CUSTOM_MEAL_PRICES,
+                   "duration_discounts": {str(k): v for k, v in CUSTOM_DURATIONS.items()}},
+    })
 
-@app.route("/api/create_payment_intent", methods=["POST"])
+@api.route("/api/create_payment_intent", methods=["POST"])
+@rate_limited("payment_ip", "payment_phone", phone=payment_phone)
 def create_payment_intent():
     """Create Stripe Payment Intent"""
-    print("DEBUG: create_payment_intent called")
     try:
-        data = request.get_json() or {}
-        print(f"DEBUG: Received data: {data}")
-        
-        plan_id = data.get("plan_id")
-        amount = data.get("amount")
-        currency = data.get("currency", "inr")
-        description = data.get("description", "")
-        customer_info = data.get("customer", {})
-
-        if not plan_id or not amount:
-            return jsonify({"error": "plan_id and amount are required"}), 400
-
-        # Find or create customer
-        phone = customer_info.get("phone")
-        email = customer_info.get("email")
-        cust = None
-        
-        if phone:
-            cust = Customer.query.filter_by(phone=phone).first()
-        if not cust and email:
-            cust = Customer.query.filter_by(email=email).first()
-        
-        # Create Stripe customer if needed
-        stripe_customer_id = None
-        if cust and cust.stripe_customer_id:
-            stripe_customer_id = cust.stripe_customer_id
-        else:
-            stripe_customer = stripe.Customer.create(
-                name=customer_info.get("name"),
-                email=email,
-                phone=phone,
-                metadata={"plan_id": plan_id}
-            )
-            stripe_customer_id = stripe_customer.id
-            
-            if not cust:
-                cust = Customer(
-                    name=customer_info.get("name"),
-                    email=email,
-                    phone=phone,
-                    stripe_customer_id=stripe_customer_id
-                )
-                db.session.add(cust)
-            else:
-                cust.stripe_customer_id = stripe_customer_id
-            
-            db.session.commit()
+        checkout, error = parse_checkout(request.get_json() or {})
+        if error:
+            return jsonify(error[0]), error[1]
+        customer = checkout["customer"]
+
+        # Find or create customer; committed before any Stripe call so the
+        # idempotency keys below always refer to durable rows
+        customer_id, stripe_customer_id = start_checkout(db.session, checkout)
+
+        # Create Stripe customer if needed; keyed on our row so a retried
+        # request reuses the same Stripe customer
+        new_stripe_customer_id = None
+        if not stripe_customer_id:
+            new_stripe_customer_id = payments.create_customer(
+                name=customer.get("name"),
+                email=customer.get("email"),
+                phone=customer.get("phone"),
+                **stripe_customer_args(checkout, customer_id),
+            ).id
+
+        # Save (or, on a retry, find) the order first: the payment intent's
+        # idempotency key derives from it
+        order, order_id, stripe_customer_id = create_checkout_order(
+            db.session, checkout, customer_id, stripe_customer_id, new_stripe_customer_id)
 
         # Create Stripe Payment Intent
-        payment_intent = stripe.PaymentIntent.create(
-            amount=int(amount),
-            currency=currency.lower(),
-            customer=stripe_customer_id,
-            description=description,
-            metadata={
-                "plan_id": plan_id,
-                "customer_id": str(cust.id)
-            }
-        )
+        try:
+            payment_intent = payments.create_payment_intent(
+                **payment_intent_args(checkout, customer_id, stripe_customer_id, order_id))
+        except Exception:
+            fail_checkout_order(db.session, order)
+            raise
+        attach_payment_intent(db.session, order, payment_intent.id)
 
-        # Save order
-        order_row = Order(
-            plan_id=plan_id,
-            description=description,
-            amount=int(amount),
-            currency=currency.upper(),
-            stripe_payment_intent_id=payment_intent.id,
-            status="created",
-            customer_id=cust.id
-        )
-        db.session.add(order_row)
-        db.session.commit()
+        current_app.logger.info("Payment intent %s created for order %s", payment_intent.id, order_id)
 
-        print(f"DEBUG: Payment intent created: {payment_intent.id}")
-        
         return jsonify({
             "clientSecret": payment_intent.client_secret,
             "paymentIntentId": payment_intent.id
         })
 
     except Exception as e:
-        print(f"DEBUG: Error in create_payment_intent: {str(e)}")
-        app.logger.error("Error creating payment intent: %s", str(e))
+        current_app.logger.error("Error creating payment intent: %s", str(e))
         db.session.rollback()
         return jsonify({"error": str(e)}), 500
 
-@app.route("/api/confirm_payment", methods=["POST"])
+@api.route("/api/confirm_payment", methods=["POST"])
 def confirm_payment():
     """Confirm payment success"""
-    print("DEBUG: confirm_payment called")
     try:
         data = request.get_json() or {}
         payment_intent_id = data.get("payment_intent_id")
@@ -258,73 +1624,28 @@ def confirm_payment():
         if not payment_intent_id:
             return jsonify({"success": False, "error": "Missing payment_intent_id"}), 400
 
-        # Retrieve payment intent from Stripe, expand charges safely
-        payment_intent = stripe.PaymentIntent.retrieve(
-            payment_intent_id,
-            expand=["latest_charge", "charges"]
-        )
-
-        # Find order in database
-        order = Order.query.filter_by(stripe_payment_intent_id=payment_intent_id).first()
-        if not order:
-            return jsonify({"success": False, "error": "Order not found"}), 404
-
-        # Update order status safely
-        if payment_intent.status == "succeeded":
-            # Safely handle charge ID
-            charge_id = None
-            try:
-                # Prefer latest_charge (new API field)
-                if getattr(payment_intent, "latest_charge", None):
-                    charge_id = payment_intent.latest_charge.id
-                # Fallback for older API structure
-                elif getattr(payment_intent, "charges", None):
-                    charges_data = payment_intent.charges.get("data", [])
-                    if charges_data:
-                        charge_id = charges_data[0].id
-            except Exception as e:
-                print(f"DEBUG: Couldn't extract charge ID safely: {e}")
-
-            order.status = "paid"
-            order.stripe_charge_id = charge_id
-            db.session.commit()
-
-            # Send admin notification
-            subject = f"New subscription paid — {order.plan_id} — ₹{order.amount/100:.2f}"
-            content = f"""
-A new payment has been received.
-
-Order ID: {order.id}
-Plan: {order.plan_id}
-Amount: ₹{order.amount/100:.2f} {order.currency}
-Customer: {order.customer.name if order.customer else 'N/A'} 
-Phone: {order.customer.phone if order.customer else 'N/A'}
-Email: {order.customer.email if order.customer else 'N/A'}
-Stripe Payment Intent: {payment_intent_id}
-
-Please check the admin dashboard: /admin
-"""
-            send_admin_email(subject, content)
+        # The order row answers most confirmations (reloads, webhook already in)
+        order = find_payment_order(db.session, payment_intent_id)
+        local = local_payment_result(order)
+        if local:
+            payment_confirmations.inc(source="local")
+            return jsonify(local[0]), local[1]
 
-            print(f"✅ Payment confirmed for order {order.id}")
-            return jsonify({"success": True, "status": "paid"}), 200
-
-        else:
-            order.status = payment_intent.status
-            db.session.commit()
-            print(f"⚠️ Payment not succeeded, status: {payment_intent.status}")
-            return jsonify({"success": False, "status": payment_intent.status}), 400
+        # Retrieve payment intent from Stripe with its latest charge
+        payment_intent = retrieve_for_confirmation(payment_intent_id)
+        body, status = record_payment(db.session, payment_intent_id, payment_intent, order)
+        return jsonify(body), status
 
     except Exception as e:
-        print(f"❌ DEBUG: Error in confirm_payment: {str(e)}")
-        app.logger.error("Error confirming payment: %s", str(e))
+        current_app.logger.error("Error confirming payment: %s", str(e))
         db.session.rollback()
         return jsonify({"success": False, "error": str(e)}), 500
 
 # -----------------------
 # API Routes - COMPLAINTS
 # -----------------------
-@app.route("/api/submit_complaint", methods=["POST"])
+@api.route("/api/submit_complaint", methods=["POST"])
+@rate_limited("complaint_ip", "complaint_phone", phone=lambda data: data.get("Phone"))
 def submit_complaint():
     """Handle complaint submission from the frontend form"""
     try:
@@ -340,13 +1661,8 @@ def submit_complaint():
         if not name or not phone:
             return jsonify({"error": "Name and phone are required"}), 400
         
-        # Find or create customer
-        customer = Customer.query.filter_by(phone=phone).first()
-        if not customer:
-            customer = Customer(name=name, phone=phone)
-            db.session.add(customer)
-            db.session.commit()
-        
+        customer_id, _ = upsert_customer(name, phone, None)
+
         # Create complaint
         complaint = Complaint(
             name=name,
@@ -355,13 +1671,13 @@ def submit_complaint():
             category=category,
             complaint_type=complaint_type,
             description=description,
-            customer_id=customer.id
+            customer_id=customer_id
         )
         
         db.session.add(complaint)
-        db.session.commit()
-        
-        # Send notification email
+        db.session.flush()
+
+        # Queue notification email with the complaint
         subject = f"New Complaint Received - {complaint_type}"
         content = f"""
 New complaint received:
@@ -379,145 +1695,398 @@ Time: {complaint.created_at}
 Please check the admin dashboard: /admin
 """
         send_admin_email(subject, content)
-        
+        db.session.commit()
+
         return jsonify({"success": True, "message": "Complaint registered successfully"})
     
     except Exception as e:
-        app.logger.error("Error submitting complaint: %s", str(e))
+        current_app.logger.error("Error submitting complaint: %s", str(e))
         db.session.rollback()
         return jsonify({"error": "Failed to submit complaint"}), 500
 
 # -----------------------
 # Stripe Webhook
 # -----------------------
-@app.route("/api/webhook", methods=["POST"])
+@webhooks.route("/api/webhook", methods=["POST"])
 def stripe_webhook():
-    """Handle Stripe webhook events"""
-    payload = request.data
-    sig_header = request.headers.get("Stripe-Signature")
-    webhook_secret = os.environ.get("STRIPE_WEBHOOK_SECRET")
-
-    if not webhook_secret:
-        app.logger.warning("Webhook secret not configured")
-        return jsonify({"status": "webhook secret not configured"}), 400
-
-    try:
-        event = stripe.Webhook.construct_event(
-            payload, sig_header, webhook_secret
-        )
-    except ValueError:
-        return jsonify({"error": "Invalid payload"}), 400
-    except stripe.SignatureVerificationError:
-        return jsonify({"error": "Invalid signature"}), 400
-
-    # Handle events
-    if event.type == "payment_intent.succeeded":
-        payment_intent = event.data.object
-        payment_intent_id = payment_intent.id
-        
-        order = Order.query.filter_by(stripe_payment_intent_id=payment_intent_id).first()
-        if order and order.status != "paid":
-            order.status = "paid"
-            order.stripe_charge_id = payment_intent.charges.data[0].id if payment_intent.charges.data else None
-            db.session.commit()
-            app.logger.info(f"Order {order.id} marked as paid via webhook")
-
-    elif event.type == "payment_intent.payment_failed":
-        payment_intent = event.data.object
-        payment_intent_id = payment_intent.id
-        
-        order = Order.query.filter_by(stripe_payment_intent_id=payment_intent_id).first()
-        if order:
-            order.status = "failed"
-            db.session.commit()
-            app.logger.info(f"Order {order.id} marked as failed via webhook")
-
-    return jsonify({"status": "success"})
+    """Verify a Stripe webhook and record it; a worker applies it later"""
+    body, status = record_webhook_event(db.session, request.data,
+                                        request.headers.get("Stripe-Signature"))
+    return jsonify(body), status
 
 # -----------------------
 # Admin Routes
 # -----------------------
-@app.route("/admin/login", methods=["GET", "POST"])
+@admin.route("/admin/login", methods=["GET", "POST"])
 def admin_login():
     if request.method == "POST":
         username = request.form.get("username")
         password = request.form.get("password")
-        if username == ADMIN_USERNAME and password == ADMIN_PASSWORD:
+        if username == config["ADMIN_USERNAME"] and password == config["ADMIN_PASSWORD"]:
             session["admin_logged_in"] = True
             flash("Login successful!", "success")
-            return redirect(url_for("admin_dashboard"))
+            return redirect(url_for("admin.admin_dashboard"))
         flash("Invalid credentials", "danger")
     return render_template("admin_login.html")
 
-@app.route("/admin/logout")
+@admin.route("/admin/logout")
 def admin_logout():
     session.pop("admin_logged_in", None)
     flash("Logged out successfully", "success")
-    return redirect(url_for("admin_login"))
+    return redirect(url_for("admin.admin_login"))
+
+def encode_cursor(created_at, row_id):
+    """Encode a (created_at, id) keyset position as an opaque URL-safe token."""
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token):
+    """Decode a cursor token; returns None for missing or malformed tokens."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def parse_date(value):
+    """Parse YYYY-MM-DD; returns None when absent or invalid."""
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        return None
+
+def parse_date_arg(name):
+    """Parse a YYYY-MM-DD query argument; returns None when absent or invalid."""
+    return parse_date(request.args.get(name))
+
+def date_range_conditions(model, date_from, date_to):
+    conditions = []
+    if date_from:
+        conditions.append(model.created_at >= date_from)
+    if date_to:
+        conditions.append(model.created_at < date_to + timedelta(days=1))
+    return conditions
+
+def apply_date_range(query, model, date_from, date_to):
+    return query.filter(*date_range_conditions(model, date_from, date_to))
+
+def keyset_page(query, model, cursor, limit):
+    """Return (rows, next_cursor) for the page after `cursor`, newest first.
 
-@app.route("/admin")
+    Ordering on (created_at, id) lets the database walk the index from the
+    cursor position instead of counting and skipping OFFSET rows.
+    """
+    position = decode_cursor(cursor)
+    if position:
+        created_at, row_id = position
+        query = query.filter(db.or_(
+            model.created_at < created_at,
+            db.and_(model.created_at == created_at, model.id < row_id),
+        ))
+    rows = (query.order_by(model.created_at.desc(), model.id.desc())
+                 .limit(limit + 1)
+                 .all())
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+def dashboard_url(**changes):
+    """Build an /admin URL that keeps the current filters and cursors."""
+    args = request.args.to_dict()
+    for key, value in changes.items():
+        if value:
+            args[key] = value
+        else:
+            args.pop(key, None)
+    return url_for("admin.admin_dashboard", **args)
+
+@admin.route("/admin")
 @admin_required
 def admin_dashboard():
-    orders = Order.query.order_by(Order.created_at.desc()).all()
-    complaints = Complaint.query.order_by(Complaint.created_at.desc()).all()
-    
-    # Calculate statistics
-    total_orders = len(orders)
-    paid_orders = len([o for o in orders if o.status == "paid"])
-    total_revenue = sum([o.amount for o in orders if o.status == "paid"])
-    pending_complaints = len([c for c in complaints if c.status == "New"])
-    
+    date_from = parse_date_arg("from")
+    date_to = parse_date_arg("to")
+    order_status = request.args.get("order_status")
+    order_status = order_status if order_status in ORDER_STATUSES else None
+    complaint_status = request.args.get("complaint_status")
+    complaint_status = complaint_status if complaint_status in COMPLAINT_STATUSES else None
+
+    # Statistics come from the daily rollups, not from scanning the tables
+    order_totals = rollup_totals(OrderDailyStat, date_from, date_to, ["status"],
+                                 ["order_count", "amount_total"])
+    complaint_totals = rollup_totals(ComplaintDailyStat, date_from, date_to, ["status"],
+                                     ["complaint_count"])
+
+    order_counts = {row["status"]: row["order_count"] for row in order_totals if row["order_count"]}
+    order_amounts = {row["status"]: row["amount_total"] for row in order_totals}
+    complaint_counts = {row["status"]: row["complaint_count"] for row in complaint_totals
+                        if row["complaint_count"]}
+
     stats = {
-        "total_orders": total_orders,
-        "paid_orders": paid_orders,
-        "total_revenue": total_revenue / 100,
-        "pending_complaints": pending_complaints
+        "total_orders": sum(order_counts.values()),
+        "paid_orders": order_counts.get("paid", 0),
+        "total_revenue": order_amounts.get("paid", 0) / 100,
+        "pending_complaints": complaint_counts.get("New", 0),
+        "order_statuses": order_counts,
+        "complaint_statuses": complaint_counts,
     }
-    
-    return render_template("admin_dashboard.html", 
-                         orders=orders, 
+
+    # One page of each table, customers joined in the same query
+    orders_query = apply_date_range(
+        Order.query.options(db.joinedload(Order.customer)), Order, date_from, date_to
+    )
+    if order_status:
+        orders_query = orders_query.filter(Order.status == order_status)
+    orders, next_orders_cursor = keyset_page(
+        orders_query, Order, request.args.get("orders_after"), config["DASHBOARD_PAGE_SIZE"]
+    )
+
+    complaints_query = apply_date_range(Complaint.query, Complaint, date_from, date_to)
+    if complaint_status:
+        complaints_query = complaints_query.filter(Complaint.status == complaint_status)
+    complaints, next_complaints_cursor = keyset_page(
+        complaints_query, Complaint, request.args.get("complaints_after"), config["DASHBOARD_PAGE_SIZE"]
+    )
+
+    pagination = {
+        "orders_next": dashboard_url(orders_after=next_orders_cursor, tab="orders")
+                       if next_orders_cursor else None,
+        "orders_first": dashboard_url(orders_after=None, tab="orders")
+                        if request.args.get("orders_after") else None,
+        "complaints_next": dashboard_url(complaints_after=next_complaints_cursor, tab="complaints")
+                           if next_complaints_cursor else None,
+        "complaints_first": dashboard_url(complaints_after=None, tab="complaints")
+                            if request.args.get("complaints_after") else None,
+    }
+    filters = {
+        "from": request.args.get("from", ""),
+        "to": request.args.get("to", ""),
+        "order_status": order_status or "",
+        "complaint_status": complaint_status or "",
+    }
+
+    return render_template("admin_dashboard.html",
+                         orders=orders,
                          complaints=complaints,
-                         stats=stats)
+                         stats=stats,
+                         filters=filters,
+                         statuses={"orders": ORDER_STATUSES, "complaints": COMPLAINT_STATUSES},
+                         transitions={
+                             "orders": {k: sorted(v) for k, v in ORDER_TRANSITIONS.items()},
+                             "complaints": {k: sorted(v) for k, v in COMPLAINT_TRANSITIONS.items()},
+                         },
+                         pagination=pagination,
+                         events_after=latest_admin_event_id(),
+                         active_tab=request.args.get("tab", "orders"))
 
-@app.route("/admin/order/<int:order_id>/fulfill", methods=["POST"])
+@admin.route("/admin/order/<int:order_id>/fulfill", methods=["POST"])
 @admin_required
 def fulfill_order(order_id):
     order = Order.query.get_or_404(order_id)
     order.status = "fulfilled"
     db.session.commit()
     flash("Order marked as fulfilled", "success")
-    return redirect(url_for("admin_dashboard"))
+    return redirect(url_for("admin.admin_dashboard"))
 
-@app.route("/admin/complaint/<int:complaint_id>/resolve", methods=["POST"])
+@admin.route("/admin/complaint/<int:complaint_id>/resolve", methods=["POST"])
 @admin_required
 def resolve_complaint(complaint_id):
     complaint = Complaint.query.get_or_404(complaint_id)
     complaint.status = "Resolved"
     db.session.commit()
     flash("Complaint marked as resolved", "success")
-    return redirect(url_for("admin_dashboard"))
+    return redirect(url_for("admin.admin_dashboard"))
 
-@app.route("/admin/complaint/<int:complaint_id>/progress", methods=["POST"])
+@admin.route("/admin/complaint/<int:complaint_id>/progress", methods=["POST"])
 @admin_required
 def progress_complaint(complaint_id):
     complaint = Complaint.query.get_or_404(complaint_id)
     complaint.status = "In Progress"
     db.session.commit()
     flash("Complaint marked as in progress", "success")
-    return redirect(url_for("admin_dashboard"))
+    return redirect(url_for("admin.admin_dashboard"))
+
+# Every status a row can hold, in the order the dashboard filters list them
+ORDER_STATUSES = ("created", "processing", "paid", "fulfilled", "failed", "canceled",
+                  "refunded", "partially_refunded", "disputed", "dispute_lost")
+COMPLAINT_STATUSES = ("New", "In Progress", "Resolved")
+
+# Bulk status changes: target status -> statuses it may be reached from
+ORDER_TRANSITIONS = {"fulfilled": {"paid"}}
+COMPLAINT_TRANSITIONS = {"In Progress": {"New"}, "Resolved": {"New", "In Progress"}}
+
+def bulk_update_status(model, statuses, transitions, payload, filter_fields):
+    """Apply one status change to many rows with set-based UPDATEs.
+
+    `payload` is {"status": ..., "ids": [...]} or {"status": ..., "filter":
+    {...}}; rows whose current status does not allow the transition are left
+    alone. A status filter must be one of `statuses`. There is one UPDATE per allowed source status, so the rollups know
+    which bucket each row left. Returns (body, http_status).
+    """
+    new_status = payload.get("status")
+    allowed = transitions.get(new_status)
+    if allowed is None:
+        return {"error": f"status must be one of: {', '.join(transitions)}"}, 400
+    ids, filters = payload.get("ids"), payload.get("filter")
+    if (ids is None) == (filters is None):
+        return {"error": "Provide either ids or filter"}, 400
+
+    conditions = []
+    if ids is not None:
+        max_ids = config["BULK_MAX_IDS"]
+        if (not isinstance(ids, list) or len(ids) > max_ids
+                or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids)):
+            return {"error": f"ids must be a list of at most {max_ids} integers"}, 400
+        ids = list(dict.fromkeys(ids))
+        conditions.append(model.id.in_(ids))
+    else:
+        if not isinstance(filters, dict) or set(filters) - {"from", "to", *filter_fields}:
+            return {"error": f"filter keys: from, to, {', '.join(filter_fields)}"}, 400
+        if filters.get("status") and filters["status"] not in statuses:
+            return {"error": f"filter status must be one of: {', '.join(statuses)}"}, 400
+        conditions.extend(date_range_conditions(
+            model, parse_date(filters.get("from")), parse_date(filters.get("to"))))
+        for field in filter_fields:
+            if filters.get(field):
+                conditions.append(getattr(model, field) == filters[field])
+
+    updated = []
+    deltas = rollups.RollupDeltas()
+    events = []
+    now = datetime.utcnow()
+    for source in sorted(allowed):
+        if model is Order:
+            returning = (Order.id, Order.created_at, Order.plan_id, Order.amount, Order.area)
+        else:
+            returning = (Complaint.id, Complaint.created_at, Complaint.category)
+        rows = db.session.execute(
+            db.update(model)
+              .where(model.status == source, *conditions)
+              .values(status=new_status, updated_at=now)
+              .returning(*returning)
+              .execution_options(synchronize_session=False)
+        ).all()
+        for row in rows:
+            updated.append(row.id)
+            if model is Order:
+                deltas.order_transition(row.created_at, row.plan_id, row.amount, source, new_status)
+                stage_manifest_change(db.session, row, source, new_status)
+                events.append(order_event("order.status", row.id, new_status, source,
+                                          row.plan_id, row.amount))
+            else:
+                deltas.complaint_transition(row.created_at, row.category, source, new_status)
+                events.append(complaint_event("complaint.status", row.id, new_status, source,
+                                              row.category))
+    write_rollups(deltas)
+    publish_admin_events(events)
+    db.session.commit()
+    body = {"status": new_status, "updated": len(updated)}
+    if ids is None:
+        body["ids"] = updated
+        return body, 200
+
+    # Explain the rows that were not changed in one extra query
+    done = set(updated)
+    missing = [i for i in ids if i not in done]
+    current = dict(db.session.query(model.id, model.status).filter(model.id.in_(missing))) \
+        if missing else {}
+    results = []
+    for row_id in ids:
+        if row_id in done:
+            results.append({"id": row_id, "result": "updated"})
+        elif row_id in current:
+            results.append({"id": row_id, "result": "invalid_transition", "current": current[row_id]})
+        else:
+            results.append({"id": row_id, "result": "not_found"})
+    body["results"] = results
+    return body, 200
+
+@admin.route("/admin/api/orders/status", methods=["POST"])
+@admin_required
+def bulk_order_status():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"error": "JSON body required"}), 400
+    body, status = bulk_update_status(Order, ORDER_STATUSES, ORDER_TRANSITIONS, payload,
+                                      ("status", "plan_id"))
+    return jsonify(body), status
+
+@admin.route("/admin/api/complaints/status", methods=["POST"])
+@admin_required
+def bulk_complaint_status():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"error": "JSON body required"}), 400
+    body, status = bulk_update_status(Complaint, COMPLAINT_STATUSES, COMPLAINT_TRANSITIONS,
+                                      payload, ("status", "category", "complaint_type"))
+    return jsonify(body), status
+
+STATS_ORDER_GROUPS = {"day": "day", "plan": "plan_id", "status": "status"}
+STATS_COMPLAINT_GROUPS = {"day": "day", "category": "category", "status": "status"}
+
+@admin.route("/admin/api/stats")
+@admin_required
+def stats_api():
+    """Order and complaint totals from the rollups.
+
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD&group=day,plan,status (orders) and
+    day,category,status (complaints); dimensions that do not apply to a
+    table are ignored.
+    """
+    date_from, date_to = parse_date_arg("from"), parse_date_arg("to")
+    groups = [g.strip() for g in request.args.get("group", "").split(",") if g.strip()]
+    unknown = set(groups) - set(STATS_ORDER_GROUPS) - set(STATS_COMPLAINT_GROUPS)
+    if unknown:
+        return jsonify({"error": f"Unknown group: {', '.join(sorted(unknown))}"}), 400
+    order_groups = [STATS_ORDER_GROUPS[g] for g in groups if g in STATS_ORDER_GROUPS]
+    complaint_groups = [STATS_COMPLAINT_GROUPS[g] for g in groups if g in STATS_COMPLAINT_GROUPS]
+    return jsonify({
+        "from": date_from.date().isoformat() if date_from else None,
+        "to": date_to.date().isoformat() if date_to else None,
+        "group": groups,
+        "orders": rollup_totals(OrderDailyStat, date_from, date_to, order_groups,
+                                ["order_count", "amount_total"]),
+        "complaints": rollup_totals(ComplaintDailyStat, date_from, date_to, complaint_groups,
+                                    ["complaint_count"]),
+    })
+
+def latest_admin_event_id():
+    """Where the dashboard's live updates (/admin/api/events) start."""
+    return db.session.query(db.func.max(AdminEvent.id)).scalar() or 0
+
+@admin.route("/admin/api/webhooks/stats")
+@admin_required
+def webhook_stats():
+    return jsonify(webhook_pipeline_stats())
+
+@admin.route("/admin/api/cache/stats")
+@admin_required
+def cache_stats():
+    return jsonify({
+        "pages": page_cache.stats(),
+        "customers": {"entries": len(customer_cache), "hits": customer_cache.hits,
+                      "misses": customer_cache.misses},
+        "manifest": kitchen_manifest.stats(),
+        "confirmations": dict(confirm_flights.stats(),
+                              local_ratio=_confirmation_hit_ratio()),
+    })
 
 # -----------------------
 # Error Handlers
 # -----------------------
-@app.errorhandler(404)
 def not_found(e):
     if request.path.startswith('/api/'):
         return jsonify({"error": f"Endpoint {request.path} not found"}), 404
     return render_template('404.html'), 404
 
-@app.errorhandler(500)
 def server_error(e):
-    app.logger.error(f"Server error: {str(e)}")
+    current_app.logger.error(f"Server error: {str(e)}")
     if request.path.startswith('/api/'):
         return jsonify({"error": "Internal server error"}), 500
     return render_template('500.html'), 500
@@ -525,55 +2094,114 @@ def server_error(e):
 # -----------------------
 # Debug Route (Remove in production)
 # -----------------------
-@app.route("/api/test")
+@api.route("/api/test")
 def test_api():
     """Test route to verify API is working"""
     return jsonify({
         "status": "success",
         "message": "API is working!",
-        "routes": [str(rule) for rule in app.url_map.iter_rules() if rule.rule.startswith('/api')]
+        "routes": [str(rule) for rule in current_app.url_map.iter_rules() if rule.rule.startswith('/api')]
     })
 
 # -----------------------
-# CLI Commands
+# Application Factory
 # -----------------------
-@app.cli.command("initdb")
-def initdb_cmd():
-    """Initialize the database."""
-    with app.app_context():
-        db.create_all()
-    print("✓ Database initialized successfully!")
+def configure_logging(app):
+    # Structured, level-controlled logging (LOG_LEVEL=DEBUG for request detail)
+    logging.basicConfig(
+        level=app.config["LOG_LEVEL"],
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+    )
+    logging.getLogger("stripe").setLevel(app.config["STRIPE_LOG_LEVEL"])
 
-@app.cli.command("resetdb")
-def resetdb_cmd():
-    """Reset the database (drop all tables and recreate)."""
+def create_services(app):
+    """The clients and caches reached through payments, plan_catalog & co."""
+    cfg = app.config
+    # Constructing the gateway imports nothing; stripe loads on the first call
+    return {
+        "payments": StripeGateway(
+            cfg["STRIPE_SECRET_KEY"],
+            api_base=cfg["STRIPE_API_BASE"],
+            max_retries=cfg["STRIPE_MAX_RETRIES"],
+            pool_size=cfg["STRIPE_POOL_SIZE"],
+            on_call=record_stripe_call,
+        ),
+        "customer_cache": LRUTTLCache(maxsize=cfg["CUSTOMER_CACHE_SIZE"],
+                                      ttl=cfg["CUSTOMER_CACHE_TTL"]),
+        "plan_catalog": PlanCatalog(load_plans, ttl=cfg["PLAN_CACHE_TTL"]),
+        "page_cache": PageCache(),
+        # Concurrent confirm_payment calls for one intent share a Stripe call
+        "confirm_flights": SingleFlight(),
+        "kitchen_manifest": kitchen.KitchenManifest(manifest_groups, manifest_plans,
+                                                    days=cfg["MANIFEST_DAYS"],
+                                                    ttl=cfg["MANIFEST_CACHE_TTL"]),
+        "rate_limiter": ratelimit.new_backend(cfg["RATE_LIMIT_BACKEND"], cfg["RATE_LIMIT_PATH"]),
+    }
+
+def create_app(config=None):
+    """Build the Flask app.
+
+    `config` overrides settings from the environment (same names, e.g.
+    {"RATE_LIMIT_BACKEND": "off"}) and may set any other Flask config key.
+    Without it, .env is loaded into the environment first. Raises
+    settings.ConfigError listing every invalid setting.
+    """
+    if config is None:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+    app = Flask(__name__, static_folder='static', template_folder='templates')
+    app.config.update(settings.load(os.environ, config, root_path=app.root_path,
+                                    instance_path=app.instance_path))
+    configure_logging(app)
+
+    # DATABASE_URL overrides the SQLite file (see db_engine.py)
+    os.makedirs(app.config["LOCAL_INSTANCE"], exist_ok=True)
+    database_uri = app.config.setdefault("SQLALCHEMY_DATABASE_URI", db_engine.database_url(
+        app.config["DATABASE_URL"], os.path.join(app.config["LOCAL_INSTANCE"], "app.db")))
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS",
+                          db_engine.engine_options(database_uri, app.config))
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.logger.info("Using database at %s",
+                    make_url(database_uri).render_as_string(hide_password=True))
+    db.init_app(app)
     with app.app_context():
-        db.drop_all()
-        db.create_all()
-    print("✓ Database reset successfully!")
+        db_engine.configure_sqlite(db.engine, app.config)
+
+    # Commands and optional features load with the first app, not with app.py
+    import admin_api
+    import commands
+    import request_profiling
+    import static_assets
 
-@app.cli.command("routes")
-def routes_cmd():
-    """List all registered routes."""
-    print("\nRegistered Routes:")
-    for rule in app.url_map.iter_rules():
-        methods = ','.join(sorted(rule.methods - {'HEAD', 'OPTIONS'}))
-        print(f"  {rule.rule:50s} {methods:20s} {rule.endpoint}")
-    print()
+    app.extensions["tiffin"] = create_services(app)
+    for blueprint in (public, api, webhooks, admin, admin_api.bp, commands.cli):
+        app.register_blueprint(blueprint)
+    app.before_request(_start_request_timer)
+    request_profiling.init_app(app)
+    app.after_request(_record_request)
+    static_assets.init_app(app)
+    app.register_error_handler(404, not_found)
+    app.register_error_handler(500, server_error)
+    return app
 
 # -----------------------
 # Application Entry Point
 # -----------------------
 if __name__ == "__main__":
+    # The feature modules import this file as `app`: let them share this copy
+    sys.modules.setdefault("app", sys.modules[__name__])
+    app = create_app()
     # Initialize database
     with app.app_context():
         db.create_all()
+        ensure_default_plans()
         print("=" * 60)
         print("✓ Database initialized!")
         print(f"✓ Server starting on http://localhost:5000")
         print(f"✓ Admin login: http://localhost:5000/admin/login")
-        print(f"  Username: {ADMIN_USERNAME}")
-        print(f"  Password: {ADMIN_PASSWORD}")
+        print(f"  Username: {app.config['ADMIN_USERNAME']}")
+        print(f"  Password: {app.config['ADMIN_PASSWORD']}")
         print("=" * 60)
         
         # List API routes
@@ -583,6 +2211,14 @@ if __name__ == "__main__":
                 methods = ','.join(sorted(rule.methods - {'HEAD', 'OPTIONS'}))
                 print(f"  {rule.rule:40s} [{methods}]")
         print("=" * 60)
-    
+
+        # Run background workers in the dev server process; in production run
+        # `flask outbox-worker`, `flask webhook-worker` and `flask reconcile-worker`
+        # alongside the web workers.
+        if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            webhook_worker().start()
+            if smtp_configured():
+                outbox_worker_pool().start()
+
     # Run application
-    app.run(debug=True, host="0.0.0.0", port=5000)
\ No newline at end of file
+    app.run(debug=True, host="0.0.0.0", port=5000)
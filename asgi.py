@@ -0,0 +1,210 @@
+"""ASGI entry point: async payment and webhook endpoints.
+
+    uvicorn asgi:app --workers 2
+
+A sync worker is busy for the whole of a checkout, most of which is spent
+waiting on Stripe, so throughput is capped at workers / Stripe latency. Here
+the Stripe calls go through StripeGateway's ``*_async`` operations (httpx)
+and the database steps through an ``AsyncSession`` (aiosqlite or asyncpg),
+so one process keeps hundreds of checkouts in flight.
+
+Only these routes are served natively:
+
+    POST /api/create_payment_intent
+    POST /api/confirm_payment
+    POST /api/webhook
+
+They run the same payment steps as the Flask views (``parse_checkout``,
+``start_checkout``, ``record_payment`` ...) inside ``AsyncSession.run_sync``,
+with the same rate limits. Every other request goes to the Flask app, which
+runs on a thread pool through asgiref, so the sync deployment (``python
+app.py``, or ``"app:create_app()"`` under any WSGI server) keeps working
+unchanged.
+
+Needs: uvicorn (or another ASGI server), asgiref, httpx, greenlet and
+aiosqlite (SQLite) or asyncpg (PostgreSQL).
+"""
+import json
+import logging
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import app as tiffin
+import db_engine
+import ratelimit
+
+logger = logging.getLogger(__name__)
+
+application = tiffin.create_app()
+database_uri = application.config["SQLALCHEMY_DATABASE_URI"]
+engine = create_async_engine(db_engine.async_database_url(database_uri),
+                             **db_engine.async_engine_options(database_uri, application.config))
+db_engine.configure_sqlite(engine, application.config)
+AsyncSession = async_sessionmaker(engine)
+payments = application.extensions["tiffin"]["payments"]
+flights = application.extensions["tiffin"]["confirm_flights"]
+flask_app = WsgiToAsgi(application)
+
+
+class Request:
+    def __init__(self, scope, body):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1")
+                        for k, v in scope.get("headers", [])}
+        self.client = (scope.get("client") or (None, None))[0]
+        self.body = body
+
+    def json(self):
+        try:
+            data = json.loads(self.body or b"null")
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+    def rate_limit_wait(self, ip_rule, phone_rule=None, phone=None):
+        ip = ratelimit.client_address(self.client, self.headers.get("x-forwarded-for"),
+                                      application.config["RATE_LIMIT_PROXIES"])
+        return tiffin.rate_limit_wait(ip, self.json() or {}, ip_rule, phone_rule, phone)
+
+
+def too_many_requests(wait):
+    return tiffin.too_many_requests(wait), 429, [(b"retry-after", str(wait).encode())]
+
+
+# -----------------------
+# Endpoints
+# -----------------------
+async def create_payment_intent(request):
+    wait = request.rate_limit_wait("payment_ip", "payment_phone", tiffin.payment_phone)
+    if wait:
+        return too_many_requests(wait)
+    checkout, error = tiffin.parse_checkout(request.json() or {})
+    if error:
+        return error
+    customer = checkout["customer"]
+
+    async with AsyncSession() as session:
+        try:
+            customer_id, stripe_customer_id = await session.run_sync(
+                tiffin.start_checkout, checkout)
+            new_stripe_customer_id = None
+            if not stripe_customer_id:
+                new_stripe_customer_id = (await payments.create_customer_async(
+                    name=customer.get("name"),
+                    email=customer.get("email"),
+                    phone=customer.get("phone"),
+                    **tiffin.stripe_customer_args(checkout, customer_id),
+                )).id
+            order, order_id, stripe_customer_id = await session.run_sync(
+                tiffin.create_checkout_order, checkout, customer_id, stripe_customer_id,
+                new_stripe_customer_id)
+            try:
+                payment_intent = await payments.create_payment_intent_async(
+                    **tiffin.payment_intent_args(checkout, customer_id, stripe_customer_id,
+                                                 order_id))
+            except Exception:
+                await session.run_sync(tiffin.fail_checkout_order, order)
+                raise
+            await session.run_sync(tiffin.attach_payment_intent, order, payment_intent.id)
+        except Exception as e:
+            logger.error("Error creating payment intent: %s", str(e))
+            await session.rollback()
+            return {"error": str(e)}, 500
+
+    logger.info("Payment intent %s created for order %s", payment_intent.id, order_id)
+    return {"clientSecret": payment_intent.client_secret,
+            "paymentIntentId": payment_intent.id}, 200
+
+
+async def confirm_payment(request):
+    payment_intent_id = (request.json() or {}).get("payment_intent_id")
+    if not payment_intent_id:
+        return {"success": False, "error": "Missing payment_intent_id"}, 400
+
+    async with AsyncSession() as session:
+        try:
+            order = await session.run_sync(tiffin.find_payment_order, payment_intent_id)
+            local = tiffin.local_payment_result(order)
+            if local:
+                tiffin.payment_confirmations.inc(source="local")
+                return local
+            payment_intent, shared = await flights.do_async(
+                payment_intent_id,
+                lambda: payments.retrieve_payment_intent_async(payment_intent_id))
+            tiffin.payment_confirmations.inc(source="coalesced" if shared else "stripe")
+            return await session.run_sync(tiffin.record_payment, payment_intent_id,
+                                          payment_intent, order)
+        except Exception as e:
+            logger.error("Error confirming payment: %s", str(e))
+            await session.rollback()
+            return {"success": False, "error": str(e)}, 500
+
+
+async def stripe_webhook(request):
+    async with AsyncSession() as session:
+        return await session.run_sync(tiffin.record_webhook_event, request.body,
+                                      request.headers.get("stripe-signature"))
+
+
+ROUTES = {
+    ("POST", "/api/create_payment_intent"): create_payment_intent,
+    ("POST", "/api/confirm_payment"): confirm_payment,
+    ("POST", "/api/webhook"): stripe_webhook,
+}
+
+
+# -----------------------
+# ASGI Plumbing
+# -----------------------
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def send_json(send, body, status, headers=()):
+    data = json.dumps(body).encode("utf-8")
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(data)).encode()),
+        *headers,
+    ]})
+    await send({"type": "http.response.body", "body": data})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            with application.app_context():
+                tiffin.plan_catalog.plans()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await payments.aclose()
+            await engine.dispose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    handler = ROUTES.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+    if handler is None:
+        return await flask_app(scope, receive, send)
+
+    started = time.perf_counter()
+    request = Request(scope, await read_body(receive))
+    # The steps use the Flask app's config, catalog and engine dialect
+    with application.app_context():
+        body, status, *headers = await handler(request)
+    await send_json(send, body, status, headers[0] if headers else ())
+    tiffin.http_requests.inc(endpoint=request.path, method=request.method, status=status)
+    tiffin.http_latency.observe(time.perf_counter() - started, endpoint=request.path,
+                                method=request.method)
@@ -0,0 +1,222 @@
+"""Static asset build: fingerprinted, precompressed, long-cache files.
+
+``flask build-assets`` copies every file under ``static/`` into the build
+directory under a content-hashed name (``css/style.3f2a9c1b7d4e.css``), so the
+files can be cached by browsers and CDNs forever. Identical files are stored
+once. CSS is minified and its ``url()`` references rewritten to the hashed
+names. Text assets get ``.gz`` (and ``.br`` when the ``brotli`` package is
+installed) siblings. With Pillow installed, raster images also get WebP
+variants at a few widths for ``srcset``.
+
+Only ``static/`` is built. ``features/`` and ``about us/`` hold the static
+site the /features and /about templates were exported from; the app serves
+neither directory (the pages' leftover relative links into them do not
+resolve today), so the files there have no URL for a manifest entry to
+replace and are left out.
+
+Everything the app needs at request time is in ``manifest.json``, loaded once
+at startup:
+
+    {"files": {"css/style.css": {"path": "css/style.3f2a9c1b7d4e.css",
+                                 "encodings": ["br", "gzip"],
+                                 "variants": [{"path": ..., "width": 480,
+                                               "type": "image/webp"}]}}}
+"""
+import gzip
+import hashlib
+import importlib
+import json
+import os
+import posixpath
+import re
+import shutil
+
+
+def _optional(name):
+    """Import an optional build dependency on first use; None if missing.
+
+    The app imports this module at startup only to read the manifest, so
+    the encoders are not loaded until a build needs them.
+    """
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
+MANIFEST_NAME = "manifest.json"
+COMPRESSIBLE = {".css", ".js", ".svg", ".ico", ".ttf", ".otf", ".json", ".txt", ".html", ".map"}
+RASTER = {".png", ".jpg", ".jpeg"}
+VARIANT_WIDTHS = (480, 960, 1440)
+WEBP_QUALITY = 80
+HASH_LENGTH = 12
+
+_CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_SPACE = re.compile(r"\s*([{};,>])\s*")
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(logical, digest, suffix=""):
+    stem, ext = posixpath.splitext(logical)
+    return f"{stem}.{digest}{suffix}{ext}"
+
+
+def minify_css(text):
+    """Conservative minifier: comments, indentation and blank lines only."""
+    text = _CSS_COMMENT.sub("", text)
+    text = _CSS_SPACE.sub(r"\1", text)
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+
+def rewrite_css_urls(text, css_logical, manifest_files):
+    """Point relative url() references at the fingerprinted files."""
+    base = posixpath.dirname(css_logical)
+
+    def replace(match):
+        quote, ref = match.groups()
+        if ref.startswith(("data:", "http:", "https:", "//", "#")):
+            return match.group(0)
+        path, sep, tail = ref.partition("?")
+        if not sep:
+            path, sep, tail = ref.partition("#")
+        target = posixpath.normpath(posixpath.join(base, path)) if not path.startswith("/") \
+            else path.lstrip("/").removeprefix("static/")
+        entry = manifest_files.get(target)
+        if entry is None:
+            return match.group(0)
+        new_ref = posixpath.relpath(entry["path"], base or ".") + (sep + tail if sep else "")
+        return f"url({quote}{new_ref}{quote})"
+
+    return _CSS_URL.sub(replace, text)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fh:
+        fh.write(data)
+
+
+def _precompress(out_path, data):
+    """Write .gz/.br siblings when they are actually smaller."""
+    encodings = []
+    brotli = _optional("brotli")
+    if brotli is not None:
+        compressed = brotli.compress(data, quality=11)
+        if len(compressed) < len(data):
+            _write(out_path + ".br", compressed)
+            encodings.append("br")
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) < len(data):
+        _write(out_path + ".gz", compressed)
+        encodings.append("gzip")
+    return encodings
+
+
+def _image_variants(out_dir, logical, digest, source_path):
+    Image = _optional("PIL.Image")
+    if Image is None:
+        return []
+    variants = []
+    with Image.open(source_path) as image:
+        image.load()
+        width, height = image.size
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        widths = [w for w in VARIANT_WIDTHS if w < width] + [width]
+        for w in widths:
+            resized = image if w == width else image.resize(
+                (w, max(1, round(height * w / width))), Image.LANCZOS)
+            rel = hashed_name(posixpath.splitext(logical)[0] + ".webp", digest, f".w{w}")
+            path = os.path.join(out_dir, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            resized.save(path, "WEBP", quality=WEBP_QUALITY, method=6)
+            variants.append({"path": rel, "width": w, "type": "image/webp",
+                             "size": os.path.getsize(path)})
+    return variants
+
+
+def build(source_dir, out_dir, log=print):
+    """Build fingerprinted assets from source_dir into out_dir; returns the manifest."""
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+
+    logical_paths = []
+    for root, _dirs, names in os.walk(source_dir):
+        for name in sorted(names):
+            full = os.path.join(root, name)
+            logical_paths.append(os.path.relpath(full, source_dir).replace(os.sep, "/"))
+    # CSS last, so url() rewriting can see the hashed names of everything else
+    logical_paths.sort(key=lambda p: (p.endswith(".css"), p))
+
+    files = {}
+    by_digest = {}
+    stats = {"files": 0, "duplicates": 0, "source_bytes": 0, "output_bytes": 0}
+    for logical in logical_paths:
+        source_path = os.path.join(source_dir, logical)
+        with open(source_path, "rb") as fh:
+            data = fh.read()
+        stats["files"] += 1
+        stats["source_bytes"] += len(data)
+        ext = posixpath.splitext(logical)[1].lower()
+        if ext == ".css":
+            text = data.decode("utf-8")
+            if not logical.endswith(".min.css"):
+                text = minify_css(text)
+            data = rewrite_css_urls(text, logical, files).encode("utf-8")
+
+        digest = content_hash(data)
+        if digest in by_digest:
+            # Same bytes under another name: point at the stored copy
+            files[logical] = by_digest[digest]
+            stats["duplicates"] += 1
+            continue
+
+        rel = hashed_name(logical, digest)
+        out_path = os.path.join(out_dir, rel)
+        _write(out_path, data)
+        entry = {"path": rel, "size": len(data), "encodings": [], "variants": []}
+        if ext in COMPRESSIBLE:
+            entry["encodings"] = _precompress(out_path, data)
+        if ext in RASTER:
+            entry["variants"] = _image_variants(out_dir, logical, digest, source_path)
+        stats["output_bytes"] += len(data)
+        files[logical] = by_digest[digest] = entry
+
+    brotli, Image = _optional("brotli"), _optional("PIL.Image")
+    manifest = {"files": files, "stats": stats,
+                "features": {"brotli": brotli is not None, "webp": Image is not None}}
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w") as fh:
+        json.dump(manifest, fh, indent=1, sort_keys=True)
+    log(f"✓ Built {stats['files']} assets ({stats['duplicates']} duplicates) into {out_dir}")
+    if brotli is None:
+        log("   brotli not installed: only gzip variants written")
+    if Image is None:
+        log("   Pillow not installed: no WebP/resized image variants")
+    return manifest
+
+
+def load_manifest(out_dir):
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def negotiate_encoding(accept_encoding, available):
+    """Pick the best precompressed encoding the client accepts, or None."""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(token.strip().lower())
+    for encoding in ("br", "gzip"):
+        if encoding in available and encoding in accepted:
+            return encoding
+    return None
@@ -0,0 +1,193 @@
+"""Sync (WSGI) vs async (ASGI) checkout throughput against a slow Stripe.
+
+Serves the app twice, as a WSGI server with a fixed number of worker threads
+(what a sync deployment has) and through asgi.py on uvicorn in one process,
+with fake_stripe.py adding latency to every Stripe call. Then drives the
+same burst of concurrent checkouts (create_payment_intent, then
+confirm_payment for the intents it created) at each and reports latency and
+throughput.
+
+    python bench/async_compare.py --stripe-latency 0.2 --checkouts 400 --concurrency 200
+
+Needs uvicorn, httpx, asgiref, greenlet and aiosqlite.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from run import checkout_payload, configure_environment
+from support import SMTPSink, summarize
+
+
+class PooledWSGIServer:
+    """WSGI server with `workers` threads: requests beyond that wait in line."""
+
+    def __init__(self, app, workers):
+        from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        pool = ThreadPoolExecutor(workers)
+
+        class Server(BaseWSGIServer):
+            request_queue_size = 1024
+
+            def process_request(self, request, client_address):
+                pool.submit(self._handle, request, client_address)
+
+            def _handle(self, request, client_address):
+                try:
+                    self.finish_request(request, client_address)
+                except Exception:
+                    self.handle_error(request, client_address)
+                finally:
+                    self.shutdown_request(request)
+
+        self.pool = pool
+        self.server = Server("127.0.0.1", 0, app, handler=QuietHandler)
+        self.url = f"http://127.0.0.1:{self.server.port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.pool.shutdown(wait=False)
+
+
+class UvicornServer:
+    def __init__(self, app):
+        import uvicorn
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                backlog=2048, limit_concurrency=None)
+        self.server = uvicorn.Server(config)
+        self.url = f"http://127.0.0.1:{port}"
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+async def burst(url, requests_list, concurrency):
+    """POST every (path, body) with at most `concurrency` in flight."""
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, responses = [], []
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        async def one(path, body):
+            async with semaphore:
+                t0 = time.perf_counter()
+                try:
+                    response = await client.post(path, json=body)
+                    status, data = response.status_code, response.json()
+                except Exception as e:
+                    status, data = 599, {"error": repr(e)}
+                latencies.append(time.perf_counter() - t0)
+                responses.append((status, data))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(path, body) for path, body in requests_list))
+        elapsed = time.perf_counter() - start
+    return latencies, responses, elapsed
+
+
+def run_mode(name, url, args, offset):
+    checkouts = [("/api/create_payment_intent", checkout_payload(offset + n, repeat_customers=10 ** 6))
+                 for n in range(args.checkouts)]
+    rows = []
+    latencies, responses, elapsed = asyncio.run(burst(url, checkouts, args.concurrency))
+    rows.append(report(name, "/api/create_payment_intent", latencies, responses, elapsed))
+    intents = [data["paymentIntentId"] for status, data in responses if status == 200]
+    confirms = [("/api/confirm_payment", {"payment_intent_id": pi}) for pi in intents]
+    latencies, responses, elapsed = asyncio.run(burst(url, confirms, args.concurrency))
+    rows.append(report(name, "/api/confirm_payment", latencies, responses, elapsed))
+    return rows
+
+
+def report(mode, endpoint, latencies, responses, elapsed):
+    errors = [data for status, data in responses if status >= 400]
+    row = {"mode": mode, "endpoint": endpoint, **summarize(latencies, elapsed),
+           "errors": len(errors)}
+    print(f"{mode:6s} {endpoint:28s} p50={row['p50_ms']:8.1f}ms p95={row['p95_ms']:8.1f}ms "
+          f"{row['throughput_rps']:8.1f} rps errors={len(errors)}")
+    if errors:
+        print(f"       first error: {errors[0]}")
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stripe-latency", type=float, default=0.2,
+                        help="Seconds the fake Stripe waits before every response")
+    parser.add_argument("--checkouts", type=int, default=400, help="Checkouts per mode")
+    parser.add_argument("--concurrency", type=int, default=200, help="Requests in flight")
+    parser.add_argument("--workers", type=int, default=8, help="Threads of the sync server")
+    parser.add_argument("--output", help="Write results JSON here")
+    args = parser.parse_args()
+
+    from fake_stripe import FakeStripeServer
+
+    tmpdir = tempfile.mkdtemp(prefix="tiffin-async-bench-")
+    stripe_server = FakeStripeServer(latency=args.stripe_latency).start()
+    stripe_server._server.socket.listen(2048)
+    smtp = SMTPSink().start()
+    configure_environment(tmpdir, stripe_server.url, smtp.port)
+    os.environ["STRIPE_POOL_SIZE"] = str(args.concurrency)
+
+    import app as tiffin
+    import asgi
+
+    with asgi.application.app_context():
+        tiffin.db.drop_all()
+        tiffin.db.create_all()
+        tiffin.ensure_default_plans()
+        tiffin.plan_catalog.plans()
+
+    print(f"Stripe latency {args.stripe_latency * 1000:.0f}ms, {args.checkouts} checkouts, "
+          f"{args.concurrency} in flight, sync server with {args.workers} threads")
+    results = []
+    server = PooledWSGIServer(asgi.application, args.workers).start()
+    try:
+        results += run_mode("wsgi", server.url, args, 0)
+    finally:
+        server.stop()
+    server = UvicornServer(asgi.app).start()
+    try:
+        results += run_mode("asgi", server.url, args, args.checkouts)
+    finally:
+        server.stop()
+
+    stripe_server.stop()
+    smtp.stop()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"stripe_latency": args.stripe_latency, "workers": args.workers,
+                       "concurrency": args.concurrency, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
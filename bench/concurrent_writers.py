@@ -0,0 +1,101 @@
+"""Run N parallel writer processes against the configured database.
+
+Each writer repeatedly does what a checkout does to the database: upsert a
+customer, insert an order, commit, then mark it paid. The run fails if any
+write errors out (e.g. "database is locked").
+
+    python bench/concurrent_writers.py --writers 8 --writes 200
+    python bench/concurrent_writers.py --database-url postgresql://postgres@localhost/tiffin_bench
+
+Without --database-url a throwaway SQLite file is used.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def writer(worker_id, writes, results):
+    sys.path.insert(0, ROOT)
+    import app as tiffin
+
+    ok = errors = 0
+    messages = set()
+    with tiffin.create_app().app_context():
+        for n in range(writes):
+            try:
+                customer_id, _ = tiffin.upsert_customer(
+                    f"Writer {worker_id}", f"9{worker_id:03d}{n % 50:06d}", None
+                )
+                order = tiffin.Order(plan_id="veg_week", amount=99900, currency="INR",
+                                     status="created", customer_id=customer_id)
+                tiffin.db.session.add(order)
+                tiffin.db.session.commit()
+                order.status = "paid"
+                tiffin.db.session.commit()
+                ok += 1
+            except Exception as e:
+                tiffin.db.session.rollback()
+                errors += 1
+                messages.add(str(e).splitlines()[0][:200])
+        journal_mode = None
+        if tiffin.db.engine.dialect.name == "sqlite":
+            journal_mode = tiffin.db.session.execute(tiffin.db.text("PRAGMA journal_mode")).scalar()
+    results.put((ok, errors, sorted(messages), journal_mode))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=200, help="Transactions per writer")
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    tmpdir = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        tmpdir = tempfile.mkdtemp(prefix="tiffin-writers-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'app.db')}"
+
+    sys.path.insert(0, ROOT)
+    import app as tiffin
+    with tiffin.create_app().app_context():
+        tiffin.db.drop_all()
+        tiffin.db.create_all()
+        backend = tiffin.db.engine.url.get_backend_name()
+        tiffin.db.engine.dispose()
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    processes = [ctx.Process(target=writer, args=(i, args.writes, results))
+                 for i in range(args.writers)]
+    start = time.perf_counter()
+    for p in processes:
+        p.start()
+    collected = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+    elapsed = time.perf_counter() - start
+
+    ok = sum(r[0] for r in collected)
+    errors = sum(r[1] for r in collected)
+    messages = sorted({m for r in collected for m in r[2]})
+    print(f"backend:      {backend}"
+          + (f" (journal_mode={collected[0][3]})" if collected[0][3] else ""))
+    print(f"writers:      {args.writers} x {args.writes}")
+    print(f"committed:    {ok}")
+    print(f"errors:       {errors}")
+    for message in messages:
+        print(f"  - {message}")
+    print(f"elapsed:      {elapsed:.2f}s ({ok * 2 / elapsed:.0f} commits/s)")
+    if errors:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Kitchen manifest build time with many active subscriptions.
+
+Fills a throwaway SQLite database with paid orders placed over the last
+month (catalog and custom plans, several delivery areas), then times
+building the cached N-day manifest from scratch and applying incremental
+changes to it, and checks the counts against a plain per-order expansion.
+
+    python bench/manifest.py --orders 300000 --days 14 --max-seconds 5
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from support import AREAS, PLAN_AMOUNTS
+
+import kitchen
+
+CUSTOM_PLANS = ["custom_veg_7", "custom_nonveg_14", "custom_mixed_30", "custom_custom_7"]
+
+
+def seed_active(db, orders, rng_seed=1):
+    rng = random.Random(rng_seed)
+    now = datetime.utcnow()
+    plans = list(PLAN_AMOUNTS) + CUSTOM_PLANS
+    table = db.metadata.tables["orders"]
+    rows = []
+    for i in range(1, orders + 1):
+        created = now - timedelta(seconds=rng.randint(0, 31 * 86400))
+        plan = rng.choice(plans)
+        if plan.startswith("custom_"):
+            plan = f"{plan}_{1700000000000 + i}"
+        rows.append({"plan_id": plan, "amount": 99900, "currency": "INR",
+                     "status": rng.choices(["paid", "fulfilled", "refunded"], [80, 15, 5])[0],
+                     "created_at": created, "updated_at": created,
+                     "area": rng.choice(AREAS + [None])})
+        if len(rows) == 5000:
+            db.session.execute(table.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(table.insert(), rows)
+    db.session.commit()
+
+
+def expected_counts(db, tiffin, start, days):
+    """Per-order expansion, for checking the interval aggregation."""
+    plans = tiffin.manifest_plans()
+    counts = Counter()
+    for created_at, plan_id, area in db.session.query(
+            tiffin.Order.created_at, tiffin.Order.plan_id, tiffin.Order.area
+    ).filter(tiffin.Order.status.in_(kitchen.ACTIVE_STATUSES)):
+        meal_type, duration = kitchen.plan_span(plan_id, plans)
+        first = created_at.date() + timedelta(days=kitchen.LEAD_DAYS)
+        for offset in range(duration):
+            day = first + timedelta(days=offset)
+            if 0 <= (day - start).days < days:
+                counts[(day, meal_type, area or kitchen.UNASSIGNED)] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=300000, help="Orders to seed")
+    parser.add_argument("--days", type=int, default=14, help="Days in the cached window")
+    parser.add_argument("--changes", type=int, default=10000, help="Incremental changes to apply")
+    parser.add_argument("--max-seconds", type=float, default=5.0, help="Fail above this build time")
+    parser.add_argument("--check", action="store_true", help="Compare with a per-order expansion")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="tiffin-manifest-bench-")
+    os.environ["LOCALAPPDATA"] = tmpdir
+    import app as tiffin
+
+    application = tiffin.create_app({"MANIFEST_DAYS": args.days, "RATE_LIMIT_BACKEND": "off"})
+    with application.app_context():
+        db = tiffin.db
+        db.create_all()
+        tiffin.ensure_default_plans()
+        started = time.perf_counter()
+        seed_active(db, args.orders)
+        print(f"Seeded {args.orders} orders in {time.perf_counter() - started:.1f}s")
+
+        manifest = tiffin.kitchen_manifest
+        started = time.perf_counter()
+        window = manifest.window()
+        build = time.perf_counter() - started
+        print(f"build {args.days}-day window   {build * 1000:8.1f}ms "
+              f"({window.orders} subscriptions in range, {len(window.counts)} meal/area rows)")
+
+        today = window.start
+        changes = [(today - timedelta(days=n % 30), "veg_month", AREAS[n % len(AREAS)], 1)
+                   for n in range(args.changes)]
+        started = time.perf_counter()
+        manifest.apply(changes)
+        manifest.apply([(d, p, a, -s) for d, p, a, s in changes])
+        apply = time.perf_counter() - started
+        print(f"apply {2 * args.changes} changes      {apply * 1000:8.1f}ms")
+
+        started = time.perf_counter()
+        manifest.day(today)
+        print(f"read one day (cached)      {(time.perf_counter() - started) * 1000:8.1f}ms")
+
+        failures = []
+        if args.check:
+            expected = expected_counts(db, tiffin, today, args.days)
+            actual = Counter({(today + timedelta(days=i), meal_type, area): count
+                              for (meal_type, area), row in window.counts.items()
+                              for i, count in enumerate(row) if count})
+            if actual != expected:
+                failures.append("manifest differs from the per-order expansion")
+            else:
+                print("✓ Counts match a per-order expansion")
+        if build > args.max_seconds:
+            failures.append(f"build took {build:.2f}s > {args.max_seconds:g}s")
+    if failures:
+        print("\n❌ " + "\n❌ ".join(failures))
+        raise SystemExit(1)
+    print("\n✓ Manifest within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""End-to-end latency/throughput benchmark for the Flask endpoints.
+
+Runs every scenario in-process (Flask test client) and over a real threaded
+WSGI server, at several table sizes, with Stripe served by fake_stripe.py and
+SMTP by a local sink. Reports p50/p95/p99 latency, throughput and SQL queries
+per request, and fails when an endpoint exceeds its query budget
+(bench/budgets.json) — the usual symptom of an N+1 regression.
+
+    python bench/run.py --sizes 0,10000,100000 --requests 200 --output results.json
+    python bench/run.py --baseline results.json --max-regression 0.25
+
+Without DATABASE_URL a throwaway SQLite database is used.
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import platform
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from support import ROOT, PLAN_AMOUNTS, QueryCounter, SMTPSink, seed, summarize
+
+WEBHOOK_SECRET = "whsec_bench"
+STATIC_PAGES = ["/", "/plans", "/about", "/features", "/static/css/style.css"]
+
+
+def configure_environment(tmpdir, stripe_url, smtp_port):
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmpdir, 'bench.db')}")
+    os.environ.update({
+        "STRIPE_API_BASE": stripe_url,
+        "STRIPE_SECRET_KEY": "sk_test_bench",
+        "STRIPE_WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(smtp_port),
+        "SMTP_STARTTLS": "false",
+        "SMTP_FROM": "bench@example.com",
+        "ADMIN_EMAIL": "admin@example.com",
+        # The load generator is one client hammering the same endpoints
+        "RATE_LIMIT_BACKEND": "off",
+    })
+
+
+# -----------------------
+# Clients
+# -----------------------
+class InProcessClient:
+    mode = "in-process"
+
+    def __init__(self, app):
+        self.app = app
+        self.client = app.test_client()
+        with self.client.session_transaction() as sess:
+            sess["admin_logged_in"] = True
+
+    def request(self, method, path, **kwargs):
+        return self.client.open(path, method=method, **kwargs).status_code
+
+    def run(self, requests_iter, concurrency):
+        latencies, errors = [], 0
+        start = time.perf_counter()
+        for method, path, kwargs in requests_iter:
+            t0 = time.perf_counter()
+            status = self.request(method, path, **kwargs)
+            latencies.append(time.perf_counter() - t0)
+            errors += status >= 400
+        return latencies, errors, time.perf_counter() - start
+
+    def close(self):
+        pass
+
+
+class WSGIClient:
+    mode = "wsgi"
+
+    def __init__(self, app):
+        import requests
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.app = app
+        self._requests = requests
+        self.server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+        self.base = f"http://127.0.0.1:{self.server.port}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self._local = threading.local()
+
+    def session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._requests.Session()
+            session.post(self.base + "/admin/login",
+                         data={"username": self.app.config["ADMIN_USERNAME"],
+                               "password": self.app.config["ADMIN_PASSWORD"]},
+                         allow_redirects=False)
+            self._local.session = session
+        return session
+
+    def request(self, method, path, json=None, data=None, headers=None):
+        response = self.session().request(method, self.base + path, json=json, data=data,
+                                          headers=headers, allow_redirects=False)
+        return response.status_code
+
+    def run(self, requests_iter, concurrency):
+        items = list(requests_iter)
+        latencies, errors = [], [0]
+        lock = threading.Lock()
+        cursor = iter(items)
+
+        def work():
+            self.session()
+            while True:
+                with lock:
+                    item = next(cursor, None)
+                if item is None:
+                    return
+                method, path, kwargs = item
+                t0 = time.perf_counter()
+                status = self.request(method, path, **kwargs)
+                elapsed = time.perf_counter() - t0
+                with lock:
+                    latencies.append(elapsed)
+                    errors[0] += status >= 400
+
+        threads = [threading.Thread(target=work) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return latencies, errors[0], time.perf_counter() - start
+
+    def close(self):
+        self.server.shutdown()
+
+
+# -----------------------
+# Scenarios
+# -----------------------
+def checkout_payload(n, repeat_customers=500):
+    plan = list(PLAN_AMOUNTS)[n % len(PLAN_AMOUNTS)]
+    customer = n % repeat_customers
+    return {
+        "plan_id": plan,
+        "amount": PLAN_AMOUNTS[plan],
+        "currency": "inr",
+        "description": f"bench {plan}",
+        "customer": {"name": f"Bench {customer}", "phone": f"6{customer:09d}",
+                     "email": f"bench{customer}@example.com"},
+    }
+
+
+def signed_webhook(event_id, payment_intent_id):
+    payload = json.dumps({
+        "id": event_id, "object": "event", "type": "payment_intent.succeeded",
+        "created": int(time.time()),
+        "data": {"object": {"id": payment_intent_id, "object": "payment_intent",
+                            "latest_charge": f"ch_{event_id}"}},
+    })
+    timestamp = int(time.time())
+    signature = hmac.new(WEBHOOK_SECRET.encode(), f"{timestamp}.{payload}".encode(),
+                         hashlib.sha256).hexdigest()
+    return payload, {"Stripe-Signature": f"t={timestamp},v1={signature}",
+                     "Content-Type": "application/json"}
+
+
+def scenarios(client, count, run_id):
+    """Yield (endpoint, requests) pairs; setup requests run before timing."""
+    yield "/api/create_payment_intent", [
+        ("POST", "/api/create_payment_intent", {"json": checkout_payload(n)}) for n in range(count)
+    ]
+
+    # Intents to confirm: fake Stripe auto-confirms them on retrieval
+    import app as tiffin
+    with client.app.app_context():
+        intent_ids = [row[0] for row in tiffin.db.session.execute(
+            tiffin.db.select(tiffin.Order.stripe_payment_intent_id)
+              .where(tiffin.Order.status == "created",
+                     tiffin.Order.stripe_payment_intent_id.like("pi_fake%"))
+              .order_by(tiffin.Order.id.desc())
+              .limit(count)
+        )]
+    yield "/api/confirm_payment", [
+        ("POST", "/api/confirm_payment", {"json": {"payment_intent_id": pi}}) for pi in intent_ids
+    ]
+
+    yield "/api/submit_complaint", [
+        ("POST", "/api/submit_complaint", {"json": {
+            "Name": f"Bench {n}", "Phone": f"6{n % 500:09d}", "Place": "Kochi",
+            "Category": "Food", "Complaint": "Quality", "Description": "Bench complaint",
+        }}) for n in range(count)
+    ]
+
+    webhooks = []
+    for n in range(count):
+        payload, headers = signed_webhook(f"evt_bench_{run_id}_{n}", f"pi_seed{n + 1}")
+        webhooks.append(("POST", "/api/webhook", {"data": payload, "headers": headers}))
+    yield "/api/webhook", webhooks
+
+    yield "/admin", [("GET", "/admin", {}) for _ in range(count)]
+
+    for page in STATIC_PAGES:
+        yield page, [("GET", page, {}) for _ in range(count)]
+
+
+# -----------------------
+# Runner
+# -----------------------
+def run(args):
+    from fake_stripe import FakeStripeServer
+
+    tmpdir = tempfile.mkdtemp(prefix="tiffin-bench-")
+    stripe_server = FakeStripeServer(latency=args.stripe_latency).start()
+    smtp = SMTPSink().start()
+    configure_environment(tmpdir, stripe_server.url, smtp.port)
+
+    import app as tiffin
+
+    application = tiffin.create_app()
+    with application.app_context():
+        counter = QueryCounter(tiffin.db.engine)
+
+    results = []
+    for size in args.sizes:
+        with application.app_context():
+            tiffin.db.drop_all()
+            tiffin.db.create_all()
+            tiffin.ensure_default_plans()
+            seed(tiffin.db, size)
+            # A serving process holds the plan catalog; load it outside the timings
+            tiffin.plan_catalog.invalidate()
+            tiffin.plan_catalog.plans()
+            tiffin.customer_cache.clear()
+
+        for client_cls in (InProcessClient, WSGIClient):
+            client = client_cls(application)
+            run_id = f"{size}_{client.mode}"
+            try:
+                for endpoint, requests_list in scenarios(client, args.requests, run_id):
+                    if args.only and endpoint not in args.only:
+                        continue
+                    counter.reset()
+                    latencies, errors, elapsed = client.run(requests_list, args.concurrency)
+                    queries = counter.count / len(latencies) if latencies else 0.0
+                    row = {"mode": client.mode, "size": size, "endpoint": endpoint,
+                           **summarize(latencies, elapsed),
+                           "errors": errors, "queries_per_request": round(queries, 2)}
+                    results.append(row)
+                    print(f"{client.mode:10s} {size:>8d} {endpoint:28s} "
+                          f"p50={row['p50_ms']:8.2f}ms p95={row['p95_ms']:8.2f}ms "
+                          f"p99={row['p99_ms']:8.2f}ms {row['throughput_rps']:8.1f} rps "
+                          f"q/req={row['queries_per_request']:5.2f} errors={errors}")
+            finally:
+                client.close()
+
+    stripe_server.stop()
+    smtp.stop()
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": application.config["SQLALCHEMY_DATABASE_URI"].split(":", 1)[0],
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "stripe_latency": args.stripe_latency,
+        },
+        "results": results,
+    }
+
+
+def check_budgets(report, budgets):
+    failures = []
+    for row in report["results"]:
+        budget = budgets.get(row["endpoint"])
+        if budget is not None and row["queries_per_request"] > budget:
+            failures.append(f"{row['mode']} size={row['size']} {row['endpoint']}: "
+                            f"{row['queries_per_request']} queries/request > budget {budget}")
+        if row["errors"]:
+            failures.append(f"{row['mode']} size={row['size']} {row['endpoint']}: "
+                            f"{row['errors']} error responses")
+    return failures
+
+
+def compare(report, baseline, max_regression):
+    previous = {(r["mode"], r["size"], r["endpoint"]): r for r in baseline["results"]}
+    failures = []
+    print("\nComparison with baseline (p95 latency, throughput):")
+    for row in report["results"]:
+        old = previous.get((row["mode"], row["size"], row["endpoint"]))
+        if not old or not old["p95_ms"]:
+            continue
+        change = (row["p95_ms"] - old["p95_ms"]) / old["p95_ms"]
+        rps_change = ((row["throughput_rps"] - old["throughput_rps"]) / old["throughput_rps"]
+                      if old["throughput_rps"] else 0.0)
+        flag = ""
+        if max_regression is not None and change > max_regression:
+            flag = "  ← REGRESSION"
+            failures.append(f"{row['mode']} size={row['size']} {row['endpoint']}: "
+                            f"p95 {old['p95_ms']}ms → {row['p95_ms']}ms ({change:+.0%})")
+        print(f"  {row['mode']:10s} {row['size']:>8d} {row['endpoint']:28s} "
+              f"p95 {change:+7.1%}  rps {rps_change:+7.1%}{flag}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="0,10000",
+                        type=lambda v: [int(float(x)) for x in v.split(",")],
+                        help="Comma-separated order table sizes (default 0,10000)")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="Client threads in wsgi mode")
+    parser.add_argument("--stripe-latency", type=float, default=0.0,
+                        help="Seconds of latency added by the fake Stripe server")
+    parser.add_argument("--only", action="append", help="Only run this endpoint (repeatable)")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Compare against a previous results JSON")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="Fail if p95 grows by more than this fraction vs. the baseline")
+    parser.add_argument("--budgets", default=os.path.join(ROOT, "bench", "budgets.json"))
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Results written to {args.output}")
+
+    failures = []
+    if os.path.exists(args.budgets):
+        with open(args.budgets) as f:
+            failures += check_budgets(report, json.load(f))
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += compare(report, json.load(f), args.max_regression)
+
+    if failures:
+        print("\n❌ Benchmark checks failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        raise SystemExit(1)
+    print("\n✓ All endpoints within query budgets")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Startup cost: importing app and building it with create_app().
+
+Runs ``python -X importtime`` in fresh interpreters and reports the median
+import and create_app() times and the modules that cost the most. Fails if a
+module that should only load on first use (stripe, requests, smtplib ...) is
+imported at startup, or when a budget or baseline is exceeded.
+
+    python bench/startup.py --runs 5 --output startup.json
+    python bench/startup.py --baseline startup.json --max-regression 0.25
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from support import ROOT
+
+# Heavy clients that must stay out of startup
+LAZY_MODULES = ["stripe", "requests", "smtplib", "httpx", "PIL", "brotli", "aiosqlite"]
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app({})
+created = time.perf_counter()
+print(json.dumps({"import_ms": (imported - start) * 1000, "create_ms": (created - imported) * 1000}))
+"""
+
+
+def parse_importtime(stderr):
+    """[(name, depth, self_us, cumulative_us)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure(env):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD], cwd=ROOT,
+                            env=env, capture_output=True, text=True, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    rows = parse_importtime(result.stderr)
+    # Modules the interpreter had already loaded (site, .pth files) are not ours
+    start = next(i for i, row in enumerate(rows) if row[:2] == ("app", 0))
+    first = start
+    while first > 0 and rows[first - 1][1] > 0:
+        first -= 1
+    return timings, rows[first:]
+
+
+def run(args):
+    tmpdir = tempfile.mkdtemp(prefix="tiffin-startup-")
+    env = dict(os.environ, LOCALAPPDATA=tmpdir, PYTHONDONTWRITEBYTECODE="1")
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmpdir, 'app.db')}")
+    runs = [measure(env) for _ in range(args.runs)]
+
+    imported = {name for _, rows in runs for name, *_ in rows}
+    top = {}
+    for _, rows in runs:
+        for name, depth, _, cumulative in rows:
+            if depth == 1:
+                top.setdefault(name, []).append(cumulative / 1000)
+    return {
+        "runs": args.runs,
+        "import_ms": round(statistics.median(t["import_ms"] for t, _ in runs), 1),
+        "create_app_ms": round(statistics.median(t["create_ms"] for t, _ in runs), 1),
+        "modules": len(imported),
+        "slowest": sorted(({"module": name, "ms": round(statistics.median(ms), 1)}
+                           for name, ms in top.items()), key=lambda m: -m["ms"])[:args.top],
+        "lazy_violations": sorted(m for m in LAZY_MODULES
+                                  if m in imported or any(n.startswith(m + ".") for n in imported)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time")
+    parser.add_argument("--top", type=int, default=10, help="Slowest direct imports to list")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="Fail if import + create_app() takes longer (median)")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--baseline", help="Compare against a previous results JSON")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Allowed growth vs. the baseline (fraction)")
+    args = parser.parse_args()
+
+    report = run(args)
+    total = report["import_ms"] + report["create_app_ms"]
+    print(f"import app     {report['import_ms']:8.1f}ms ({report['modules']} modules)")
+    print(f"create_app()   {report['create_app_ms']:8.1f}ms")
+    print("slowest direct imports:")
+    for module in report["slowest"]:
+        print(f"  {module['module']:28s} {module['ms']:8.1f}ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Results written to {args.output}")
+
+    failures = [f"{m} imported at startup" for m in report["lazy_violations"]]
+    if args.max_ms is not None and total > args.max_ms:
+        failures.append(f"startup {total:.1f}ms > budget {args.max_ms:g}ms")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        before = baseline["import_ms"] + baseline["create_app_ms"]
+        change = (total - before) / before if before else 0.0
+        print(f"\nvs. baseline: {before:.1f}ms → {total:.1f}ms ({change:+.0%})")
+        if change > args.max_regression:
+            failures.append(f"startup regressed {change:+.0%} (limit {args.max_regression:+.0%})")
+
+    if failures:
+        print("\n❌ Startup checks failed:")
+        for failure in failures:
+            print(f"  - {failure}")
+        raise SystemExit(1)
+    print("\n✓ Startup within budget, no heavy clients imported")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Shared helpers for the benchmark scripts: local SMTP sink, table seeding,
+SQL query counting and latency statistics."""
+import os
+import random
+import socketserver
+import sys
+import threading
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from catalog import DEFAULT_PLANS  # noqa: E402
+import rollups  # noqa: E402
+
+PLAN_AMOUNTS = {plan["id"]: plan["price"] for plan in DEFAULT_PLANS}
+AREAS = ["Kakkanad", "Edappally", "Vyttila", "Kaloor", "Fort Kochi", "Aluva"]
+
+
+# -----------------------
+# SMTP sink
+# -----------------------
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept and discard messages."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 bench-smtp ready")
+        in_data = False
+        for raw in self.rfile:
+            line = raw.decode(errors="replace").rstrip("\r\n")
+            if in_data:
+                if line == ".":
+                    in_data = False
+                    self.server.messages += 1
+                    self.reply("250 OK")
+                continue
+            verb = line.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 bench-smtp")
+            elif verb == "DATA":
+                in_data = True
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), _SMTPHandler)
+        self.messages = 0
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+# -----------------------
+# Query counting
+# -----------------------
+class QueryCounter:
+    """Counts statements executed on an engine (all threads)."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+
+
+# -----------------------
+# Seeding
+# -----------------------
+def seed(db, size, rng_seed=1):
+    """Fill customers/orders/complaints with `size` orders' worth of rows.
+
+    Uses Core executemany batches; customers = size/10, complaints = size/4.
+    """
+    if size <= 0:
+        return
+    rng = random.Random(rng_seed)
+    now = datetime.utcnow()
+    customers = max(size // 10, 1)
+    batch = 5000
+    tables = db.metadata.tables
+
+    def spread():
+        return now - timedelta(seconds=rng.randint(0, 180 * 86400))
+
+    rows = []
+    for i in range(1, customers + 1):
+        phone = f"7{i:09d}"
+        rows.append({"id": i, "name": f"Customer {i}", "phone": phone, "phone_key": phone,
+                     "email": f"customer{i}@example.com",
+                     "email_key": f"customer{i}@example.com",
+                     "stripe_customer_id": f"cus_seed{i}", "created_at": spread()})
+        if len(rows) == batch:
+            db.session.execute(tables["customers"].insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(tables["customers"].insert(), rows)
+
+    plans = list(PLAN_AMOUNTS)
+    rows = []
+    for i in range(1, size + 1):
+        plan = rng.choice(plans)
+        created = spread()
+        rows.append({"plan_id": plan, "amount": PLAN_AMOUNTS[plan], "currency": "INR",
+                     "stripe_payment_intent_id": f"pi_seed{i}",
+                     "status": rng.choices(["paid", "created", "fulfilled", "failed"],
+                                           [60, 20, 15, 5])[0],
+                     "created_at": created, "updated_at": created,
+                     "customer_id": rng.randint(1, customers), "area": AREAS[i % len(AREAS)]})
+        if len(rows) == batch:
+            db.session.execute(tables["orders"].insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(tables["orders"].insert(), rows)
+
+    rows = []
+    for i in range(1, size // 4 + 1):
+        created = spread()
+        rows.append({"name": f"Customer {i}", "phone": f"7{rng.randint(1, customers):09d}",
+                     "place": "Kochi", "category": "Food", "complaint_type": "Quality",
+                     "description": "Food was cold", "status": rng.choice(["New", "In Progress", "Resolved"]),
+                     "created_at": created, "updated_at": created})
+        if len(rows) == batch:
+            db.session.execute(tables["complaints"].insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(tables["complaints"].insert(), rows)
+    # Core inserts bypass the ORM hooks that maintain the rollups
+    rollups.rebuild(db.session.connection())
+    db.session.commit()
+
+
+# -----------------------
+# Statistics
+# -----------------------
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def summarize(latencies, elapsed):
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+        "throughput_rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+    }
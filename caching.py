@@ -0,0 +1,187 @@
+"""Small in-process caches."""
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUTTLCache:
+    """Thread-safe mapping bounded by size (LRU eviction) and entry age (TTL)."""
+
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class PageEntry:
+    __slots__ = ("gzip_body", "etag", "mimetype", "size")
+
+    def __init__(self, body, mimetype):
+        self.gzip_body = gzip.compress(body, compresslevel=6, mtime=0)
+        self.etag = hashlib.sha1(body).hexdigest()[:20]
+        self.mimetype = mimetype
+        self.size = len(body)
+
+    def body(self, compressed):
+        return self.gzip_body if compressed else gzip.decompress(self.gzip_body)
+
+
+class PageCache:
+    """Rendered responses kept gzip-compressed, keyed by (route, version).
+
+    A new version (template mtime, deploy id) simply misses; stale versions
+    age out through the LRU bound.
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def store(self, key, body, mimetype):
+        entry = PageEntry(body, mimetype)
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            entries = list(self._data.values())
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stored_bytes": sum(len(e.gzip_body) for e in entries),
+            "uncompressed_bytes": sum(e.size for e in entries),
+        }
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one.
+
+    The first caller for a key runs the function; callers that arrive while
+    it runs wait and get the same result (or exception). Nothing is kept
+    once the call returns, so this never serves stale data.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._tasks = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn):
+        """Returns (result, shared); shared is True when another caller ran fn."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    async def do_async(self, key, fn):
+        """do() for coroutines on one event loop: fn() returns an awaitable."""
+        import asyncio
+
+        task = self._tasks.get(key)
+        if task is not None:
+            self.shared += 1
+            return await asyncio.shield(task), True
+        task = self._tasks[key] = asyncio.ensure_future(fn())
+        self.calls += 1
+        try:
+            return await asyncio.shield(task), False
+        finally:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+
+    def stats(self):
+        return {"in_flight": len(self._flights) + len(self._tasks), "calls": self.calls,
+                "shared": self.shared}
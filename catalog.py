@@ -0,0 +1,113 @@
+"""Subscription plan catalog.
+
+Plans live in the ``plans`` table; the app keeps one in-process snapshot of
+them (``PlanCatalog``) and only goes back to the database when the snapshot
+is older than its TTL or a plan row was changed by this process. Checkout
+validates prices against the snapshot, so it costs no extra query.
+
+Custom plans are priced from per-meal rates and duration discounts, using the
+same formula as the plans page.
+"""
+import hashlib
+import json
+import threading
+import time
+
+DEFAULT_PLANS = [
+    {"id": "veg_week", "name": "Veg Week", "price": 99900, "duration_days": 7,
+     "meal_type": "veg", "description": "7 veg days weekly plan (₹999/week)",
+     "features": ["7 veg days", "For vegetarians", "Breakfast, Lunch & Dinner"],
+     "badge": None, "badge_style": None, "position": 1},
+    {"id": "mixed_week", "name": "Mixed Week", "price": 299900, "duration_days": 7,
+     "meal_type": "mixed", "description": "4 veg + 3 nonveg weekly plan (₹2,999/week)",
+     "features": ["4 veg days", "3 non-veg days", "Best variety"],
+     "badge": "Popular", "badge_style": "success", "position": 2},
+    {"id": "veg_month", "name": "Veg Month", "price": 399900, "duration_days": 30,
+     "meal_type": "veg", "description": "30 veg days monthly plan (₹3,999/month)",
+     "features": ["30 veg days", "Best value", "Daily fresh meals"],
+     "badge": "Save 15%", "badge_style": "warning", "position": 3},
+    {"id": "nonveg_month", "name": "Non-Veg Month", "price": 599900, "duration_days": 30,
+     "meal_type": "nonveg", "description": "30 non-veg days monthly plan (₹5,999/month)",
+     "features": ["30 non-veg days", "Premium selection", "Protein rich meals"],
+     "badge": None, "badge_style": None, "position": 4},
+]
+
+# Custom plan builder: rupees per meal and discount per duration (days)
+CUSTOM_MEAL_PRICES = {"veg": 33, "nonveg": 66, "mixed": 50, "custom": 45}
+CUSTOM_DURATIONS = {7: 1.0, 14: 0.95, 30: 0.85}
+CUSTOM_MEALS = ("breakfast", "lunch", "dinner")
+
+
+def custom_plan_price(details):
+    """Price in paise for a custom plan, or None if the options are invalid."""
+    if not isinstance(details, dict):
+        return None
+    meal_type = details.get("mealType")
+    meals = details.get("mealsPerDay") or []
+    try:
+        duration = int(details.get("duration") or 0)
+        days_per_week = int(details.get("daysPerWeek") or 7)
+    except (TypeError, ValueError):
+        return None
+    if (meal_type not in CUSTOM_MEAL_PRICES or duration not in CUSTOM_DURATIONS
+            or not meals or len(set(meals)) != len(meals)
+            or any(m not in CUSTOM_MEALS for m in meals) or not 1 <= days_per_week <= 7):
+        return None
+    if duration == 7:
+        total_meals = len(meals) * days_per_week
+    else:
+        total_meals = len(meals) * duration
+    base = CUSTOM_MEAL_PRICES[meal_type] * total_meals
+    # Same rounding as the page: Math.round on rupees, then to paise
+    return int(base * CUSTOM_DURATIONS[duration] + 0.5) * 100
+
+
+class PlanCatalog:
+    """Versioned, in-process snapshot of the active plans.
+
+    ``loader`` returns a list of plan dicts; it is called at most once per
+    ``ttl`` seconds (and after ``invalidate()``). An empty list means nothing
+    is on sale; the catalog never falls back to ``DEFAULT_PLANS``.
+    """
+
+    def __init__(self, loader, ttl=60):
+        self.loader = loader
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._plans = None
+        self._by_id = {}
+        self._version = None
+        self._expires = 0.0
+        self.loads = 0
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._plans is not None and now < self._expires:
+            return
+        with self._lock:
+            if self._plans is not None and time.monotonic() < self._expires:
+                return
+            plans = list(self.loader())
+            plans.sort(key=lambda p: (p["position"], p["id"]))
+            payload = json.dumps(plans, sort_keys=True, default=str).encode()
+            self._by_id = {p["id"]: p for p in plans}
+            self._plans = plans
+            self._version = hashlib.sha1(payload).hexdigest()[:16]
+            self._expires = time.monotonic() + self.ttl
+            self.loads += 1
+
+    def invalidate(self):
+        self._expires = 0.0
+
+    def plans(self):
+        self._refresh()
+        return self._plans
+
+    def get(self, plan_id):
+        self._refresh()
+        return self._by_id.get(plan_id)
+
+    @property
+    def version(self):
+        self._refresh()
+        return self._version
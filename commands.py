@@ -0,0 +1,323 @@
+"""Flask CLI commands: `flask initdb`, `flask db-upgrade`, `flask outbox-worker` ...
+
+Registered by create_app(). Modules only some commands need (migrations,
+seeding, search, assets) are imported by those commands.
+"""
+import csv
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import Blueprint, current_app
+
+import exports
+import rollups
+from admin_api import export_fetcher, export_query
+from app import (
+    RECONCILE_CHECKPOINT, AdminEvent, ComplaintDailyStat, OrderDailyStat, OutboxMessage, config,
+    current_reconcile_run, customer_cache, db, drain_outbox, ensure_default_plans,
+    finish_reconcile_run, kitchen_manifest, new_mailer, new_reconcile_run, outbox_worker_pool,
+    parse_date, parse_manifest_date, plan_catalog, process_stripe_events, reconcile_page,
+    reconcile_worker, save_checkpoint, smtp_configured, webhook_pipeline_stats, webhook_worker,
+)
+
+# Commands are registered at the top level: `flask initdb`, not `flask cli initdb`
+cli = Blueprint("cli", __name__, cli_group=None)
+
+
+@cli.cli.command("initdb")
+def initdb_cmd():
+    """Initialize the database."""
+    db.create_all()
+    ensure_default_plans()
+    print("✓ Database initialized successfully!")
+
+
+@cli.cli.command("resetdb")
+def resetdb_cmd():
+    """Reset the database (drop all tables and recreate)."""
+    db.drop_all()
+    db.create_all()
+    ensure_default_plans()
+    customer_cache.clear()
+    plan_catalog.invalidate()
+    print("✓ Database reset successfully!")
+
+
+@cli.cli.command("db-upgrade")
+@click.option("--no-backup", is_flag=True, help="Skip the pre-migration backup.")
+@click.option("--backup-dir", default=None, help="Directory for the backup file.")
+def db_upgrade_cmd(no_backup, backup_dir):
+    """Apply pending schema migrations (backs up the database first)."""
+    import migrations
+
+    migrations.upgrade(db.engine, backup=not no_backup, backup_dir=backup_dir,
+                       metadata=db.metadata)
+
+
+@cli.cli.command("stats-rebuild")
+def stats_rebuild_cmd():
+    """Recompute the daily statistics rollups from orders and complaints."""
+    db.create_all()
+    with db.engine.begin() as conn:
+        rollups.rebuild(conn)
+    orders = db.session.query(db.func.count()).select_from(OrderDailyStat).scalar()
+    complaints = db.session.query(db.func.count()).select_from(ComplaintDailyStat).scalar()
+    print(f"✓ Rebuilt rollups: {orders} order bucket(s), {complaints} complaint bucket(s)")
+
+
+def _row_count(ctx, param, value):
+    """Accept 1e6 as well as 1000000."""
+    try:
+        count = float(value)
+    except ValueError:
+        raise click.BadParameter(f"{value!r} is not a number")
+    if count < 0 or count != int(count):
+        raise click.BadParameter(f"{value!r} is not a whole number >= 0")
+    return int(count)
+
+
+@cli.cli.command("seeddb")
+@click.option("--customers", default="10000", callback=_row_count, help="Customers to add.")
+@click.option("--orders", default="50000", callback=_row_count, help="Orders to add.")
+@click.option("--complaints", default="5000", callback=_row_count, help="Complaints to add.")
+@click.option("--seed", default=1, type=int, help="Random seed; same seed, same rows.")
+@click.option("--days", default=365, type=click.IntRange(1), help="Spread rows over this many days.")
+@click.option("--batch", default=50000, type=click.IntRange(1), help="Rows per executemany.")
+@click.option("--reset", is_flag=True, help="Drop and recreate all tables first.")
+def seeddb_cmd(customers, orders, complaints, seed, days, batch, reset):
+    """Fill the database with synthetic data for scale testing (see seeding.py)."""
+    import seeding
+
+    if reset:
+        db.drop_all()
+    db.create_all()
+    ensure_default_plans()
+    db.session.close()
+    print(f"Seeding {customers:,} customers, {orders:,} orders, {complaints:,} complaints "
+          f"(seed {seed})")
+    started = time.perf_counter()
+    seeding.seed(db.engine, db.metadata, customers=customers, orders=orders,
+                 complaints=complaints, seed=seed, days=days, batch=batch)
+    customer_cache.clear()
+    kitchen_manifest.invalidate()
+    print(f"✓ Seeded in {time.perf_counter() - started:.1f}s")
+
+
+@cli.cli.command("export")
+@click.argument("table", type=click.Choice(["orders", "complaints", "customers"]))
+@click.option("--output", "-o", required=True, help="File to write.")
+@click.option("--format", "fmt", type=click.Choice(list(exports.FORMATS)), default="csv")
+@click.option("--gzip", "compress", is_flag=True, help="gzip-compress the output.")
+@click.option("--from", "date_from", default=None, help="Created on or after (YYYY-MM-DD).")
+@click.option("--to", "date_to", default=None, help="Created on or before (YYYY-MM-DD).")
+@click.option("--status", default=None, help="Only rows with this status.")
+@click.option("--after-id", default=0, type=int, help="Start after this id.")
+@click.option("--resume", is_flag=True, help="Continue from the file's checkpoint.")
+def export_cmd(table, output, fmt, compress, date_from, date_to, status, after_id, resume):
+    """Export a table in id order with constant memory."""
+    model, stmt = export_query(table)
+    fetch = export_fetcher(model, stmt, parse_date(date_from), parse_date(date_to), status)
+    written, last_id = exports.export_to_file(
+        output, list(stmt.selected_columns.keys()), fetch, fmt=fmt, compress=compress,
+        after_id=after_id, resume=resume, batch_size=config["EXPORT_BATCH_SIZE"],
+    )
+    print(f"✓ Exported {written} {table} row(s) to {output} (last id {last_id})")
+
+
+@cli.cli.command("manifest")
+@click.option("--date", "day", default=None, help="First day (YYYY-MM-DD, default today).")
+@click.option("--days", default=1, show_default=True, type=click.IntRange(1, 366),
+              help="Number of days.")
+@click.option("--output", "-o", default="-", help="CSV file to write (default stdout).")
+def manifest_cmd(day, days, output):
+    """Write the kitchen/delivery manifest as CSV: date, meal_type, area, count."""
+    start = parse_manifest_date(day)
+    if start is None:
+        raise SystemExit("--date must be YYYY-MM-DD")
+    window = kitchen_manifest.window()
+    if not (window.covers(start) and window.covers(start + timedelta(days=days - 1))):
+        _, window = kitchen_manifest.build(start, days)
+    with click.open_file(output, "w", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["date", "meal_type", "area", "count"])
+        total = 0
+        for offset in range(days):
+            manifest = window.day(start + timedelta(days=offset))
+            total += manifest["total"]
+            for row in manifest["rows"]:
+                writer.writerow([manifest["date"], row["meal_type"], row["area"], row["count"]])
+    if output != "-":
+        print(f"✓ Manifest for {days} day(s) written to {output} ({total} deliveries)")
+
+
+@cli.cli.command("search-rebuild")
+def search_rebuild_cmd():
+    """Create the complaints full-text index if needed and re-index every row."""
+    import search
+
+    db.create_all()
+    with db.engine.begin() as conn:
+        search.rebuild(conn)
+    print("✓ Complaint search index rebuilt")
+
+
+@cli.cli.command("events-prune")
+@click.option("--days", default=7, show_default=True, help="Keep this many days of events.")
+def events_prune_cmd(days):
+    """Delete live-dashboard events older than --days."""
+    db.create_all()
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    count = AdminEvent.query.filter(AdminEvent.created_at < cutoff).delete()
+    db.session.commit()
+    print(f"✓ Pruned {count} event(s) older than {days} day(s)")
+
+
+@cli.cli.command("db-explain")
+def db_explain_cmd():
+    """Check that every hot query is served by an index."""
+    import migrations
+
+    results = migrations.explain_hot_queries(db.engine)
+    failures = 0
+    for name, plan, uses_index in results:
+        mark = "✓" if uses_index else "❌"
+        failures += not uses_index
+        print(f"{mark} {name}")
+        for line in plan.splitlines():
+            print(f"      {line}")
+    if failures:
+        raise SystemExit(f"{failures} hot query(s) not using an index — run: flask db-upgrade")
+
+
+@cli.cli.command("outbox-worker")
+@click.option("--threads", default=None, type=int, help="Worker threads (default OUTBOX_WORKERS).")
+@click.option("--once", is_flag=True, help="Drain the outbox once and exit.")
+def outbox_worker_cmd(threads, once):
+    """Deliver queued admin emails."""
+    if not smtp_configured():
+        raise SystemExit("SMTP_HOST, ADMIN_EMAIL and SMTP_FROM/SMTP_USER must be set")
+    if once:
+        mailer = new_mailer()
+        total = 0
+        try:
+            while True:
+                handled = drain_outbox(mailer)
+                if not handled:
+                    break
+                total += handled
+        finally:
+            mailer.close()
+        print(f"✓ Handled {total} outbox message(s)")
+        return
+    pool = outbox_worker_pool(threads or max(config["OUTBOX_WORKERS"], 1)).start()
+    print(f"✓ Outbox workers running ({len(pool.workers)} thread(s)) — Ctrl+C to stop")
+    try:
+        while True:
+            pool.workers[0].join(1)
+    except KeyboardInterrupt:
+        pool.stop()
+
+
+@cli.cli.command("outbox-requeue")
+def outbox_requeue_cmd():
+    """Move dead-lettered outbox messages back to pending."""
+    count = (OutboxMessage.query.filter_by(status="dead")
+             .update({"status": "pending", "attempts": 0,
+                      "next_attempt_at": datetime.utcnow()}))
+    db.session.commit()
+    print(f"✓ Requeued {count} message(s)")
+
+
+@cli.cli.command("webhook-worker")
+@click.option("--once", is_flag=True, help="Apply the current backlog and exit.")
+def webhook_worker_cmd(once):
+    """Apply recorded Stripe webhook events to orders."""
+    if once:
+        total = 0
+        while True:
+            handled = process_stripe_events()
+            if not handled:
+                break
+            total += handled
+        print(f"✓ Applied {total} webhook event(s)")
+        return
+    worker = webhook_worker()
+    worker.start()
+    print("✓ Webhook worker running — Ctrl+C to stop")
+    try:
+        while worker.is_alive():
+            worker.join(1)
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+@cli.cli.command("reconcile")
+@click.option("--since", default=None,
+              help="Restart from intents created at this UTC time (YYYY-MM-DD[THH:MM]) "
+                   "instead of the checkpoint.")
+@click.option("--dry-run", is_flag=True, help="Report mismatches without changing anything.")
+def reconcile_cmd(since, dry_run):
+    """Sync order statuses with Stripe's PaymentIntent list."""
+    if since:
+        try:
+            start = datetime.fromisoformat(since)
+        except ValueError:
+            raise SystemExit("--since must be YYYY-MM-DD or YYYY-MM-DDTHH:MM")
+        state = new_reconcile_run((start - datetime(1970, 1, 1)).total_seconds())
+    else:
+        state = current_reconcile_run()
+    done = False
+    while not done:
+        state, mismatches, done = reconcile_page(state, dry_run=dry_run)
+        for m in mismatches:
+            print(f"  order {m['order_id']} ({m['payment_intent_id']}): {m['from']} → {m['to']}"
+                  f" (Stripe: {m['stripe_status']})")
+        if not dry_run:
+            save_checkpoint(RECONCILE_CHECKPOINT, finish_reconcile_run(state) if done else state)
+            db.session.commit()
+    verb = "to correct" if dry_run else "corrected"
+    print(f"✓ {state['intents']} payment intent(s) checked, {state['corrected']} order(s) {verb}, "
+          f"{state['no_order']} without an order")
+
+
+@cli.cli.command("reconcile-worker")
+def reconcile_worker_cmd():
+    """Reconcile with Stripe every RECONCILE_INTERVAL_SECONDS."""
+    worker = reconcile_worker()
+    worker.start()
+    print(f"✓ Reconcile worker running every {config['RECONCILE_INTERVAL_SECONDS']:g}s — Ctrl+C to stop")
+    try:
+        while worker.is_alive():
+            worker.join(1)
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+@cli.cli.command("webhook-stats")
+def webhook_stats_cmd():
+    """Show webhook backlog and lag."""
+    for key, value in webhook_pipeline_stats().items():
+        print(f"  {key:28s} {value}")
+
+
+@cli.cli.command("build-assets")
+@click.option("--out", default=None, help="Output directory (default: ASSET_BUILD_DIR)")
+def build_assets_command(out):
+    """Fingerprint, dedupe and precompress static/ for long-lived caching."""
+    import assets
+
+    manifest = assets.build(current_app.static_folder, out or config["ASSET_BUILD_DIR"])
+    stats = manifest["stats"]
+    print(f"   {stats['source_bytes'] / 1024:.0f} KiB in, {stats['output_bytes'] / 1024:.0f} KiB out "
+          f"(before compression)")
+
+
+@cli.cli.command("routes")
+def routes_cmd():
+    """List all registered routes."""
+    print("\nRegistered Routes:")
+    for rule in current_app.url_map.iter_rules():
+        methods = ','.join(sorted(rule.methods - {'HEAD', 'OPTIONS'}))
+        print(f"  {rule.rule:50s} {methods:20s} {rule.endpoint}")
+    print()
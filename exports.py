@@ -0,0 +1,136 @@
+"""Streaming exports (CSV or JSON Lines, optionally gzip-compressed).
+
+Rows are read in keyset batches (``WHERE id > :last ORDER BY id LIMIT n``),
+each batch in its own short read, so memory stays flat however many rows are
+exported and no long-running transaction holds up writers. Rows come out in
+id order, so an export can always continue from the last id it wrote:
+``after_id`` over HTTP, ``--resume`` for files, which keeps a small
+``<file>.checkpoint`` next to the output.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+import zlib
+from datetime import date, datetime
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+}
+DEFAULT_BATCH_SIZE = 2000
+
+
+def keyset_batches(fetch, after_id=0, batch_size=DEFAULT_BATCH_SIZE):
+    """Yield lists of rows from fetch(after_id, limit) until a short batch."""
+    while True:
+        rows = fetch(after_id, batch_size)
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
+            return
+        after_id = rows[-1].id
+
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def encode_batch(columns, rows, fmt="csv", header=False):
+    """Serialize one batch of rows to text."""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if header:
+            writer.writerow(columns)
+        writer.writerows(["" if v is None else _value(v) for v in row] for row in rows)
+        return buffer.getvalue()
+    return "".join(json.dumps(dict(zip(columns, map(_value, row))), ensure_ascii=False) + "\n"
+                   for row in rows)
+
+
+def stream(columns, batches, fmt="csv", compress=False):
+    """Bytes for an HTTP response body; gzip is compressed on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # 31: gzip
+    header = fmt == "csv"
+    if header and compressor is None:
+        yield encode_batch(columns, [], fmt, header=True).encode("utf-8")
+    elif header:
+        yield compressor.compress(encode_batch(columns, [], fmt, header=True).encode("utf-8"))
+    for rows in batches:
+        data = encode_batch(columns, rows, fmt).encode("utf-8")
+        if compressor is None:
+            yield data
+        else:
+            chunk = compressor.compress(data)
+            if chunk:
+                yield chunk
+    if compressor is not None:
+        yield compressor.flush()
+
+
+def _read_checkpoint(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_checkpoint(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump(state, fh)
+    os.replace(tmp, path)
+
+
+def export_to_file(path, columns, fetch, fmt="csv", compress=False, after_id=0,
+                   resume=False, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Write an export to `path`; returns (rows written, last id).
+
+    Each batch is appended (as its own gzip member when compressing, which
+    gzip readers concatenate) and then recorded in the checkpoint. Resuming
+    cuts the file back to the last recorded batch, discarding anything an
+    interrupted run wrote after it, and carries on from that batch's last id.
+    """
+    checkpoint_path = path + ".checkpoint"
+    checkpoint = _read_checkpoint(checkpoint_path) if resume else None
+    if checkpoint and os.path.exists(path):
+        after_id = checkpoint["last_id"]
+        mode = "r+b"
+    else:
+        checkpoint = None
+        mode = "wb"
+
+    written = 0
+    last_id = after_id
+    with open(path, mode) as fh:
+        if checkpoint:
+            fh.truncate(checkpoint["offset"])
+            fh.seek(checkpoint["offset"])
+        else:
+            header = encode_batch(columns, [], fmt, header=True) if fmt == "csv" else ""
+            if header:
+                data = header.encode("utf-8")
+                fh.write(gzip.compress(data, mtime=0) if compress else data)
+        for rows in keyset_batches(fetch, after_id, batch_size):
+            data = encode_batch(columns, rows, fmt).encode("utf-8")
+            fh.write(gzip.compress(data, compresslevel=6, mtime=0) if compress else data)
+            fh.flush()
+            os.fsync(fh.fileno())
+            written += len(rows)
+            last_id = rows[-1].id
+            _write_checkpoint(checkpoint_path, {
+                "last_id": last_id, "offset": fh.tell(),
+                "rows": (checkpoint or {}).get("rows", 0) + written,
+                "format": fmt, "gzip": compress,
+            })
+            if progress:
+                progress(written, last_id)
+        if not checkpoint and not written:
+            _write_checkpoint(checkpoint_path, {"last_id": last_id, "offset": fh.tell(),
+                                                "rows": 0, "format": fmt, "gzip": compress})
+    return written, last_id
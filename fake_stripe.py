@@ -0,0 +1,299 @@
+"""In-process fake of the slice of the Stripe API this app uses.
+
+Lets the payment endpoints run (and be load-tested) without network access:
+
+    python fake_stripe.py --port 12111 --latency 0.05
+    STRIPE_API_BASE=http://127.0.0.1:12111 python app.py
+
+or from Python::
+
+    server = FakeStripeServer(latency=0.05).start()
+    ... StripeGateway("sk_test_fake", api_base=server.url) ...
+    server.stop()
+
+Objects live in memory. Writes honour ``Idempotency-Key`` the way Stripe
+does: a repeated key replays the first response. With ``auto_confirm`` every
+payment intent is reported as succeeded (with a charge) on retrieval, which
+stands in for the browser confirming the card.
+"""
+import argparse
+import itertools
+import json
+import random
+import threading
+import time
+from urllib.parse import parse_qsl
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+from werkzeug.wrappers import Request, Response
+
+
+def _unflatten(pairs):
+    """Turn Stripe's form encoding (metadata[plan_id]=x, expand[0]=y) into dicts/lists."""
+    result = {}
+    for key, value in pairs:
+        parts = key.replace("]", "").split("[")
+        target = result
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return _listify(result)
+
+
+def _listify(value):
+    if isinstance(value, dict):
+        if value and all(k.isdigit() for k in value):
+            return [_listify(value[k]) for k in sorted(value, key=int)]
+        return {k: _listify(v) for k, v in value.items()}
+    return value
+
+
+class FakeStripe:
+    """WSGI application holding the fake Stripe state."""
+
+    def __init__(self, latency=0.0, failure_rate=0.0, auto_confirm=True, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.auto_confirm = auto_confirm
+        self.random = random.Random(seed)
+        self.customers = {}
+        self.payment_intents = {}
+        self.charges = {}
+        self.idempotent_responses = {}
+        self.request_count = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _new_id(self, prefix):
+        return f"{prefix}_fake{next(self._ids):010d}"
+
+    # -----------------------
+    # Handlers
+    # -----------------------
+    def create_customer(self, params):
+        customer = {
+            "id": self._new_id("cus"),
+            "object": "customer",
+            "created": int(time.time()),
+            "name": params.get("name"),
+            "email": params.get("email"),
+            "phone": params.get("phone"),
+            "metadata": params.get("metadata", {}),
+        }
+        self.customers[customer["id"]] = customer
+        return 200, customer
+
+    def create_payment_intent(self, params):
+        if "amount" not in params or "currency" not in params:
+            return 400, {"error": {"type": "invalid_request_error",
+                                   "message": "Missing required param: amount/currency."}}
+        pi_id = self._new_id("pi")
+        intent = {
+            "id": pi_id,
+            "object": "payment_intent",
+            "amount": int(params["amount"]),
+            "currency": params["currency"],
+            "customer": params.get("customer"),
+            "description": params.get("description"),
+            "metadata": params.get("metadata", {}),
+            "client_secret": f"{pi_id}_secret_fake",
+            "created": int(time.time()),
+            "status": "requires_payment_method",
+            "latest_charge": None,
+        }
+        self.payment_intents[pi_id] = intent
+        return 200, intent
+
+    def confirm_payment_intent(self, pi_id):
+        intent = self.payment_intents.get(pi_id)
+        if intent is None:
+            return self._missing("payment_intent", pi_id)
+        if intent["status"] != "succeeded":
+            charge = {
+                "id": self._new_id("ch"),
+                "object": "charge",
+                "amount": intent["amount"],
+                "currency": intent["currency"],
+                "payment_intent": pi_id,
+                "created": int(time.time()),
+                "status": "succeeded",
+                "refunded": False,
+                "amount_refunded": 0,
+            }
+            self.charges[charge["id"]] = charge
+            intent["status"] = "succeeded"
+            intent["latest_charge"] = charge["id"]
+        return 200, intent
+
+    def retrieve_payment_intent(self, pi_id, params):
+        intent = self.payment_intents.get(pi_id)
+        if intent is None:
+            return self._missing("payment_intent", pi_id)
+        if self.auto_confirm:
+            self.confirm_payment_intent(pi_id)
+        return 200, self._expand(intent, params.get("expand", []))
+
+    def list_payment_intents(self, params):
+        """Newest first, filtered by created[gte|gt|lte|lt], paged by starting_after."""
+        try:
+            limit = min(max(int(params.get("limit", 10)), 1), 100)
+        except ValueError:
+            return 400, {"error": {"type": "invalid_request_error", "message": "Invalid limit."}}
+        created = params.get("created", {})
+        if not isinstance(created, dict):
+            created = {"gte": created, "lte": created}
+        bounds = {op: int(value) for op, value in created.items()}
+        intents = sorted(self.payment_intents.values(), key=lambda i: (i["created"], i["id"]),
+                         reverse=True)
+        intents = [i for i in intents
+                   if i["created"] >= bounds.get("gte", i["created"])
+                   and i["created"] > bounds.get("gt", i["created"] - 1)
+                   and i["created"] <= bounds.get("lte", i["created"])
+                   and i["created"] < bounds.get("lt", i["created"] + 1)]
+        after = params.get("starting_after")
+        if after:
+            ids = [i["id"] for i in intents]
+            if after not in ids:
+                return self._missing("payment_intent", after)
+            intents = intents[ids.index(after) + 1:]
+        expand = [e[len("data."):] for e in params.get("expand", []) if e.startswith("data.")]
+        return 200, {"object": "list", "url": "/v1/payment_intents",
+                     "has_more": len(intents) > limit,
+                     "data": [self._expand(i, expand) for i in intents[:limit]]}
+
+    def create_refund(self, params):
+        intent = self.payment_intents.get(params.get("payment_intent"))
+        if intent is None or not intent.get("latest_charge"):
+            return self._missing("payment_intent", params.get("payment_intent"))
+        charge = self.charges[intent["latest_charge"]]
+        amount = int(params.get("amount", charge["amount"] - charge.get("amount_refunded", 0)))
+        charge["amount_refunded"] = charge.get("amount_refunded", 0) + amount
+        charge["refunded"] = charge["amount_refunded"] >= charge["amount"]
+        return 200, {"id": self._new_id("re"), "object": "refund", "amount": amount,
+                     "charge": charge["id"], "payment_intent": intent["id"],
+                     "status": "succeeded", "created": int(time.time())}
+
+    def _expand(self, intent, expand):
+        intent = dict(intent)
+        if "latest_charge" in expand and intent.get("latest_charge"):
+            intent["latest_charge"] = self.charges[intent["latest_charge"]]
+        return intent
+
+    @staticmethod
+    def _missing(kind, object_id):
+        return 404, {"error": {"type": "invalid_request_error", "code": "resource_missing",
+                               "message": f"No such {kind}: '{object_id}'"}}
+
+    # -----------------------
+    # WSGI
+    # -----------------------
+    def dispatch(self, method, path, params):
+        parts = path.strip("/").split("/")
+        if parts[:1] != ["v1"]:
+            return 404, {"error": {"type": "invalid_request_error", "message": "Unrecognized request URL"}}
+        parts = parts[1:]
+        if method == "POST" and parts == ["customers"]:
+            return self.create_customer(params)
+        if method == "POST" and parts == ["payment_intents"]:
+            return self.create_payment_intent(params)
+        if method == "POST" and len(parts) == 3 and parts[0] == "payment_intents" and parts[2] == "confirm":
+            return self.confirm_payment_intent(parts[1])
+        if method == "GET" and parts == ["payment_intents"]:
+            return self.list_payment_intents(params)
+        if method == "POST" and parts == ["refunds"]:
+            return self.create_refund(params)
+        if method == "GET" and len(parts) == 2 and parts[0] == "payment_intents":
+            return self.retrieve_payment_intent(parts[1], params)
+        return 404, {"error": {"type": "invalid_request_error",
+                               "message": f"Unrecognized request URL ({method}: {path})"}}
+
+    def __call__(self, environ, start_response):
+        request = Request(environ)
+        if self.latency:
+            time.sleep(self.latency)
+        if not request.headers.get("Authorization", "").startswith("Bearer "):
+            status, body = 401, {"error": {"type": "invalid_request_error",
+                                           "message": "You did not provide an API key."}}
+            return self._respond(status, body, {})(environ, start_response)
+
+        with self._lock:
+            self.request_count += 1
+            if self.failure_rate and self.random.random() < self.failure_rate:
+                status, body = 500, {"error": {"type": "api_error", "message": "Injected failure"}}
+                return self._respond(status, body, {})(environ, start_response)
+
+            if request.method == "POST":
+                params = _unflatten(parse_qsl(request.get_data(as_text=True), keep_blank_values=True))
+            else:
+                params = _unflatten(request.args.items(multi=True))
+
+            headers = {}
+            key = request.headers.get("Idempotency-Key")
+            if request.method == "POST" and key:
+                replay = self.idempotent_responses.get(key)
+                if replay is not None:
+                    status, body = replay
+                    headers["Idempotent-Replayed"] = "true"
+                    return self._respond(status, body, headers)(environ, start_response)
+
+            status, body = self.dispatch(request.method, request.path, params)
+            if request.method == "POST" and key and status < 500:
+                self.idempotent_responses[key] = (status, body)
+        return self._respond(status, body, headers)(environ, start_response)
+
+    @staticmethod
+    def _respond(status, body, headers):
+        headers = dict(headers, **{"Request-Id": f"req_fake{time.monotonic_ns()}"})
+        return Response(json.dumps(body), status=status, headers=headers,
+                        content_type="application/json")
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class FakeStripeServer:
+    """Runs a FakeStripe app on a threaded local HTTP server."""
+
+    def __init__(self, host="127.0.0.1", port=0, quiet=True, **options):
+        self.app = FakeStripe(**options)
+        self._server = make_server(host, port, self.app, threaded=True,
+                                   request_handler=_QuietHandler if quiet else None)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://{self._server.host}:{self._server.port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--no-auto-confirm", action="store_true",
+                        help="Leave payment intents unpaid until POST /v1/payment_intents/<id>/confirm")
+    args = parser.parse_args()
+
+    server = FakeStripeServer(args.host, args.port, quiet=False, latency=args.latency,
+                              failure_rate=args.failure_rate,
+                              auto_confirm=not args.no_auto_confirm)
+    print(f"✓ Fake Stripe listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
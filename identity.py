@@ -0,0 +1,29 @@
+"""Normalized customer identity keys.
+
+Customers type the same phone number as "+91 98765 43210", "098765 43210" or
+"9876543210", and emails in any case. The normalized forms are what the
+unique ``customers.phone_key``/``email_key`` indexes and the identity cache
+are keyed on.
+"""
+import re
+
+_NON_DIGITS = re.compile(r"\D+")
+
+
+def normalize_phone(phone):
+    """Digits only, without the +91 / 0 trunk prefix for Indian numbers."""
+    if not phone:
+        return None
+    digits = _NON_DIGITS.sub("", str(phone))
+    if len(digits) == 12 and digits.startswith("91"):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith("0"):
+        digits = digits[1:]
+    return digits or None
+
+
+def normalize_email(email):
+    if not email:
+        return None
+    email = str(email).strip().lower()
+    return email or None
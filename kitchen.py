@@ -0,0 +1,249 @@
+"""Kitchen and delivery manifest: how many meals to cook and deliver per day.
+
+A paid subscription is delivered for its plan's ``duration_days``
+consecutive days, starting the day after the order was placed
+(``LEAD_DAYS``). The manifest counts, for each day, the active subscriptions
+per meal type and delivery area.
+
+Orders are never expanded day by day. The database groups active orders by
+(order day, plan, area); each group becomes one interval, added to a
+difference array per (meal type, area) as +count on its first day and
+-count on the day after its last, and a running sum over each array gives
+every day's count. The work grows with days x groups, not with orders.
+
+``KitchenManifest`` keeps the next ``days`` days in memory. Changes
+committed by this process (an order paid, refunded ...) adjust the cached
+counts directly; changes made by other processes are picked up when the
+snapshot expires after ``ttl`` seconds.
+"""
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+from catalog import CUSTOM_DURATIONS, CUSTOM_MEAL_PRICES
+
+# Order statuses that are being delivered
+ACTIVE_STATUSES = ("paid", "fulfilled")
+# Orders placed today start with tomorrow's delivery
+LEAD_DAYS = 1
+UNASSIGNED = "unassigned"
+
+
+def normalize_area(value):
+    """Delivery area as typed at checkout, tidied for grouping; None if blank."""
+    if not isinstance(value, str):
+        return None
+    value = " ".join(value.split())[:80]
+    return value.title() or None
+
+
+def plan_span(plan_id, plans):
+    """(meal type, days) for a plan id, or None if it cannot be resolved.
+
+    `plans` maps catalog plan ids to (meal type, duration days). Custom plans
+    carry both in their id: ``custom_<meal type>_<days>_<timestamp>``.
+    """
+    span = plans.get(plan_id)
+    if span is not None:
+        return span
+    parts = (plan_id or "").split("_")
+    if len(parts) >= 3 and parts[0] == "custom" and parts[1] in CUSTOM_MEAL_PRICES:
+        try:
+            days = int(parts[2])
+        except ValueError:
+            return None
+        if days in CUSTOM_DURATIONS:
+            return parts[1], days
+    return None
+
+
+def custom_plan_prefixes():
+    """``custom_<meal type>_<days>`` for every custom plan option."""
+    return [f"custom_{meal_type}_{days}"
+            for meal_type in CUSTOM_MEAL_PRICES for days in CUSTOM_DURATIONS]
+
+
+def longest_span(plans):
+    return max([days for _, days in plans.values()] + list(CUSTOM_DURATIONS))
+
+
+def order_days(start, days, plans):
+    """Range of order days whose subscriptions overlap [start, start + days)."""
+    first = start - timedelta(days=LEAD_DAYS + longest_span(plans) - 1)
+    last = start + timedelta(days=days - 1 - LEAD_DAYS)
+    return first, last
+
+
+class Window:
+    """Counts for `days` consecutive days from `start`.
+
+    ``counts`` maps (meal type, area) to a list with one count per day.
+    """
+
+    def __init__(self, start, days, counts, orders=0, unresolved=0):
+        self.start = start
+        self.days = days
+        self.counts = counts
+        self.orders = orders
+        self.unresolved = unresolved
+
+    @property
+    def end(self):
+        return self.start + timedelta(days=self.days - 1)
+
+    def covers(self, day):
+        return 0 <= (day - self.start).days < self.days
+
+    def add(self, order_day, meal_type, area, duration, count):
+        """Add `count` subscriptions placed on `order_day` (negative to remove)."""
+        first = (order_day - self.start).days + LEAD_DAYS
+        lo, hi = max(first, 0), min(first + duration, self.days)
+        if lo >= hi:
+            return
+        self.orders += count
+        key = (meal_type, area or UNASSIGNED)
+        row = self.counts.get(key)
+        if row is None:
+            row = self.counts[key] = [0] * self.days
+        for i in range(lo, hi):
+            row[i] += count
+
+    def day(self, day):
+        """{"date", "total", "by_meal_type", "by_area", "rows"} for one day."""
+        i = (day - self.start).days
+        rows = sorted(
+            ({"meal_type": meal_type, "area": area, "count": row[i]}
+             for (meal_type, area), row in self.counts.items() if row[i]),
+            key=lambda r: (r["meal_type"], r["area"]),
+        )
+        by_meal_type, by_area = defaultdict(int), defaultdict(int)
+        for r in rows:
+            by_meal_type[r["meal_type"]] += r["count"]
+            by_area[r["area"]] += r["count"]
+        return {"date": day.isoformat(), "total": sum(by_meal_type.values()),
+                "by_meal_type": dict(sorted(by_meal_type.items())),
+                "by_area": dict(sorted(by_area.items())), "rows": rows}
+
+
+def aggregate(groups, plans, start, days):
+    """Build a Window from (order day, plan id, area, count) groups.
+
+    Each group is one interval in a difference array per (meal type, area);
+    a running sum turns the arrays into per-day counts.
+    """
+    diffs = defaultdict(lambda: [0] * (days + 1))
+    orders = unresolved = 0
+    for order_day, plan_id, area, count in groups:
+        if isinstance(order_day, str):
+            order_day = date.fromisoformat(order_day[:10])
+        elif isinstance(order_day, datetime):
+            order_day = order_day.date()
+        span = plan_span(plan_id, plans)
+        if span is None:
+            unresolved += count
+            continue
+        meal_type, duration = span
+        first = (order_day - start).days + LEAD_DAYS
+        lo, hi = max(first, 0), min(first + duration, days)
+        if lo >= hi:
+            continue
+        orders += count
+        diff = diffs[(meal_type, area or UNASSIGNED)]
+        diff[lo] += count
+        diff[hi] -= count
+
+    counts = {}
+    for key, diff in diffs.items():
+        running, row = 0, []
+        for delta in diff[:days]:
+            running += delta
+            row.append(running)
+        counts[key] = row
+    return Window(start, days, counts, orders, unresolved)
+
+
+class KitchenManifest:
+    """In-process manifest for the next `days` days.
+
+    ``load_groups(first_day, last_day)`` returns (order day, plan id, area,
+    count) for active orders placed between the two days (inclusive);
+    ``load_plans()`` returns {plan id: (meal type, duration days)} for every
+    plan, active or not.
+    """
+
+    def __init__(self, load_groups, load_plans, days=14, ttl=60, today=None):
+        self.load_groups = load_groups
+        self.load_plans = load_plans
+        self.days = days
+        self.ttl = ttl
+        self.today = today or (lambda: datetime.utcnow().date())
+        self._lock = threading.Lock()
+        self._window = None
+        self._plans = {}
+        self._expires = 0.0
+        self.builds = 0
+        self.hits = 0
+        self.last_build_seconds = 0.0
+
+    def build(self, start, days):
+        """Compute a window from the database (not cached)."""
+        plans = self.load_plans()
+        first, last = order_days(start, days, plans)
+        return plans, aggregate(self.load_groups(first, last), plans, start, days)
+
+    def window(self):
+        """The cached window starting today, rebuilt when stale."""
+        today = self.today()
+        window = self._window
+        if window is not None and window.start == today and time.monotonic() < self._expires:
+            self.hits += 1
+            return window
+        with self._lock:
+            window = self._window
+            if window is not None and window.start == today and time.monotonic() < self._expires:
+                self.hits += 1
+                return window
+            started = time.perf_counter()
+            self._plans, window = self.build(today, self.days)
+            self.last_build_seconds = time.perf_counter() - started
+            self._window = window
+            self._expires = time.monotonic() + self.ttl
+            self.builds += 1
+            return window
+
+    def day(self, day):
+        """Manifest for one day; days outside the cached window are computed."""
+        window = self.window()
+        if not window.covers(day):
+            _, window = self.build(day, 1)
+        return window.day(day)
+
+    def apply(self, changes):
+        """Adjust the cached window for committed (order day, plan id, area, +/-1) changes."""
+        with self._lock:
+            window = self._window
+            if window is None:
+                return
+            for order_day, plan_id, area, sign in changes:
+                span = plan_span(plan_id, self._plans)
+                if span is None:
+                    window.unresolved += sign
+                    continue
+                meal_type, duration = span
+                window.add(order_day, meal_type, area, duration, sign)
+
+    def invalidate(self):
+        self._expires = 0.0
+
+    def stats(self):
+        window = self._window
+        return {
+            "days": self.days,
+            "start": window.start.isoformat() if window else None,
+            "subscriptions": window.orders if window else 0,
+            "unresolved": window.unresolved if window else 0,
+            "builds": self.builds,
+            "hits": self.hits,
+            "last_build_seconds": round(self.last_build_seconds, 4),
+        }
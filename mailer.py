@@ -0,0 +1,77 @@
+"""Long-lived SMTP connection used by the outbox workers.
+
+Opening a connection, negotiating STARTTLS and logging in costs several round
+trips, so a mailer keeps one authenticated connection open and reuses it for
+every message, reconnecting only when the server has dropped it.
+"""
+import logging
+import smtplib
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPMailer:
+    def __init__(self, host, port=587, username=None, password=None,
+                 starttls=True, timeout=10, idle_check_seconds=30, on_send=None):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.idle_check_seconds = idle_check_seconds
+        # Optional callback(seconds, error) for external metrics
+        self.on_send = on_send
+        self._server = None
+        self._last_used = 0.0
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            server.starttls()
+        if self.username and self.password:
+            server.login(self.username, self.password)
+        self._server = server
+        logger.info("SMTP connection opened to %s:%s", self.host, self.port)
+
+    def _ensure_connected(self):
+        if self._server is None:
+            self._connect()
+        elif time.monotonic() - self._last_used > self.idle_check_seconds:
+            # Servers drop idle sessions; a NOOP is far cheaper than a failed send
+            try:
+                status, _ = self._server.noop()
+                if status != 250:
+                    raise smtplib.SMTPServerDisconnected("NOOP failed")
+            except (smtplib.SMTPException, OSError):
+                self.close()
+                self._connect()
+
+    def send(self, msg):
+        """Send an EmailMessage, reconnecting once if the session was dropped."""
+        start = time.perf_counter()
+        error = None
+        try:
+            self._ensure_connected()
+            try:
+                self._server.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, OSError):
+                self.close()
+                self._connect()
+                self._server.send_message(msg)
+            self._last_used = time.monotonic()
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if self.on_send:
+                self.on_send(time.perf_counter() - start, error)
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
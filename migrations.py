@@ -0,0 +1,325 @@
+"""Versioned schema migrations for the tiffin service database.
+
+Each migration has an integer version and is applied at most once; applied
+versions are recorded in the ``schema_migrations`` table. Migrations are
+written to be idempotent so they can run against databases that were created
+by ``db.create_all()`` with the current models.
+
+Run them with ``flask db-upgrade``; check index usage with ``flask db-explain``.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from catalog import DEFAULT_PLANS
+from identity import normalize_email, normalize_phone
+import rollups
+import search
+
+
+class Migration:
+    def __init__(self, version, name, apply, transactional=True):
+        self.version = version
+        self.name = name
+        self.apply = apply
+        # PostgreSQL cannot CREATE INDEX CONCURRENTLY inside a transaction
+        self.transactional = transactional
+
+
+# -----------------------
+# Migration Steps
+# -----------------------
+def _add_stripe_customer_id(conn):
+    """Port of the old migrate_database.py script."""
+    columns = [col["name"] for col in inspect(conn).get_columns("customers")]
+    if "stripe_customer_id" not in columns:
+        conn.execute(text("ALTER TABLE customers ADD COLUMN stripe_customer_id VARCHAR(120)"))
+
+
+def _add_order_stripe_columns(conn):
+    """Databases created before the Stripe switch only have razorpay_* columns."""
+    columns = [col["name"] for col in inspect(conn).get_columns("orders")]
+    if "stripe_payment_intent_id" not in columns:
+        conn.execute(text("ALTER TABLE orders ADD COLUMN stripe_payment_intent_id VARCHAR(120)"))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS uq_orders_stripe_payment_intent_id"
+            " ON orders (stripe_payment_intent_id)"
+        ))
+    if "stripe_charge_id" not in columns:
+        conn.execute(text("ALTER TABLE orders ADD COLUMN stripe_charge_id VARCHAR(120)"))
+
+
+HOT_PATH_INDEXES = [
+    ("ix_customers_phone", "customers", "phone"),
+    ("ix_customers_email", "customers", "email"),
+    ("ix_orders_created_at_id", "orders", "created_at, id"),
+    ("ix_orders_status_created_at_id", "orders", "status, created_at, id"),
+    ("ix_orders_status_amount", "orders", "status, amount"),
+    ("ix_orders_customer_id", "orders", "customer_id"),
+    ("ix_complaints_created_at_id", "complaints", "created_at, id"),
+    ("ix_complaints_status_created_at_id", "complaints", "status, created_at, id"),
+    ("ix_complaints_customer_id", "complaints", "customer_id"),
+]
+
+
+def create_indexes(conn, indexes):
+    """Create indexes without blocking writers where the backend allows it."""
+    concurrently = "CONCURRENTLY " if conn.dialect.name == "postgresql" else ""
+    for name, table, columns in indexes:
+        conn.execute(text(
+            f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({columns})"
+        ))
+
+
+def _create_hot_path_indexes(conn):
+    create_indexes(conn, HOT_PATH_INDEXES)
+
+
+IDENTITY_BACKFILL_BATCH = 5000
+
+
+def _add_customer_identity_keys(conn):
+    """Backfill normalized phone/email keys and make them unique.
+
+    Customers are read and updated in id-ordered batches. When several
+    customers share a key, the oldest row keeps it and the others are set
+    back to NULL (one UPDATE per column) so the unique index can be built.
+    """
+    columns = [col["name"] for col in inspect(conn).get_columns("customers")]
+    for column in ("phone_key", "email_key"):
+        if column not in columns:
+            conn.execute(text(f"ALTER TABLE customers ADD COLUMN {column} VARCHAR(180)"))
+
+    after_id = 0
+    while True:
+        rows = conn.execute(
+            text("SELECT id, phone, email FROM customers WHERE id > :after ORDER BY id LIMIT :n"),
+            {"after": after_id, "n": IDENTITY_BACKFILL_BATCH},
+        ).all()
+        if not rows:
+            break
+        conn.execute(text("UPDATE customers SET phone_key = :p, email_key = :e WHERE id = :id"),
+                     [{"id": row_id, "p": normalize_phone(phone), "e": normalize_email(email)}
+                      for row_id, phone, email in rows])
+        after_id = rows[-1][0]
+
+    for column in ("phone_key", "email_key"):
+        conn.execute(text(
+            f"UPDATE customers SET {column} = NULL WHERE {column} IS NOT NULL AND id NOT IN"
+            f" (SELECT MIN(id) FROM customers WHERE {column} IS NOT NULL GROUP BY {column})"
+        ))
+
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_customers_phone_key ON customers (phone_key)"))
+    conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS uq_customers_email_key ON customers (email_key)"))
+
+
+def _seed_plans(conn):
+    """Move the prices that used to be hardcoded in plans.html into the plans table."""
+    if conn.execute(text("SELECT COUNT(*) FROM plans")).scalar():
+        return
+    conn.execute(
+        text("INSERT INTO plans (id, name, price, currency, duration_days, meal_type, description,"
+             " features, badge, badge_style, position, active, updated_at)"
+             " VALUES (:id, :name, :price, 'INR', :duration_days, :meal_type, :description,"
+             " :features, :badge, :badge_style, :position, :active, :updated_at)"),
+        [dict(plan, features=json.dumps(plan["features"]), active=True, updated_at=datetime.utcnow())
+         for plan in DEFAULT_PLANS],
+    )
+
+
+def _backfill_rollups(conn):
+    """Fill the daily statistics rollups from existing orders and complaints."""
+    rollups.rebuild(conn)
+
+
+def _complaint_search_index(conn):
+    """Full-text index over complaints, backfilled from existing rows."""
+    search.rebuild(conn)
+
+
+def _add_order_area(conn):
+    """Delivery area per order, for the kitchen manifest."""
+    columns = [col["name"] for col in inspect(conn).get_columns("orders")]
+    if "area" not in columns:
+        conn.execute(text("ALTER TABLE orders ADD COLUMN area VARCHAR(80)"))
+    create_indexes(conn, [("ix_orders_status_created_at_plan_area", "orders",
+                           "status, created_at, plan_id, area")])
+
+
+MIGRATIONS = [
+    Migration(1, "add customers.stripe_customer_id", _add_stripe_customer_id),
+    Migration(2, "add orders stripe columns", _add_order_stripe_columns),
+    Migration(3, "hot path indexes", _create_hot_path_indexes, transactional=False),
+    Migration(4, "customer identity keys", _add_customer_identity_keys),
+    Migration(5, "seed plan catalog", _seed_plans),
+    Migration(6, "statistics rollups", _backfill_rollups),
+    Migration(7, "complaint full-text search", _complaint_search_index),
+    Migration(8, "orders.area for the kitchen manifest", _add_order_area, transactional=False),
+    # Custom plan ids are now counted without their timestamp
+    Migration(9, "rollups per custom plan type", _backfill_rollups),
+]
+
+
+# -----------------------
+# Runner
+# -----------------------
+def ensure_version_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            " version INTEGER PRIMARY KEY,"
+            " name VARCHAR(200) NOT NULL,"
+            " applied_at TIMESTAMP NOT NULL)"
+        ))
+
+
+def applied_versions(engine):
+    # Read-only, so the pre-migration backup is taken before anything changes
+    if not inspect(engine).has_table("schema_migrations"):
+        return set()
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def pending_migrations(engine):
+    done = applied_versions(engine)
+    return [m for m in sorted(MIGRATIONS, key=lambda m: m.version) if m.version not in done]
+
+
+def backup_database(engine, backup_dir=None):
+    """Take a consistent copy of the database before migrating.
+
+    SQLite uses the online backup API so concurrent readers and writers are
+    not disturbed; PostgreSQL is dumped with pg_dump. Returns the backup path.
+    """
+    url = engine.url
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if url.get_backend_name() == "sqlite":
+        db_path = url.database
+        if not db_path or db_path == ":memory:" or not os.path.exists(db_path):
+            return None
+        backup_dir = backup_dir or os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(backup_dir, exist_ok=True)
+        backup_path = os.path.join(backup_dir, f"{os.path.basename(db_path)}.backup.{stamp}")
+        source = sqlite3.connect(db_path)
+        target = sqlite3.connect(backup_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        return backup_path
+
+    if url.get_backend_name() == "postgresql":
+        if not shutil.which("pg_dump"):
+            raise RuntimeError("pg_dump not found on PATH; install it or pass --no-backup")
+        backup_dir = backup_dir or os.getcwd()
+        os.makedirs(backup_dir, exist_ok=True)
+        backup_path = os.path.join(backup_dir, f"{url.database}.backup.{stamp}.dump")
+        env = dict(os.environ, PGPASSWORD=url.password or "")
+        subprocess.run(
+            ["pg_dump", "--format=custom", "--file", backup_path,
+             "--host", url.host or "localhost", "--port", str(url.port or 5432),
+             "--username", url.username or "postgres", url.database],
+            check=True, env=env,
+        )
+        return backup_path
+
+    raise RuntimeError(f"Don't know how to back up a {url.get_backend_name()} database")
+
+
+def upgrade(engine, backup=True, backup_dir=None, log=print, metadata=None):
+    """Apply all pending migrations in version order; returns applied versions.
+
+    Tables of `metadata` (the models) that do not exist yet are created
+    after the backup, so the backup holds the database as it was.
+    """
+    pending = pending_migrations(engine)
+    if pending and backup:
+        backup_path = backup_database(engine, backup_dir)
+        if backup_path:
+            log(f"✓ Backup created: {backup_path}")
+    if metadata is not None:
+        metadata.create_all(engine)
+    if not pending:
+        log("✓ Database schema is up to date")
+        return []
+
+    ensure_version_table(engine)
+    applied = []
+    for migration in pending:
+        log(f"→ Applying {migration.version:04d}: {migration.name}")
+        if migration.transactional:
+            with engine.begin() as conn:
+                migration.apply(conn)
+                _record(conn, migration)
+        else:
+            with engine.connect() as conn:
+                conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+                migration.apply(conn)
+                _record(conn, migration)
+        applied.append(migration.version)
+    log(f"✓ Applied {len(applied)} migration(s)")
+    return applied
+
+
+def _record(conn, migration):
+    conn.execute(
+        text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+        {"v": migration.version, "n": migration.name, "t": datetime.utcnow()},
+    )
+
+
+# -----------------------
+# EXPLAIN check
+# -----------------------
+HOT_QUERIES = [
+    ("customer by phone key",
+     "SELECT id, stripe_customer_id FROM customers WHERE phone_key = :v", {"v": "9999999999"}),
+    ("customer by email key",
+     "SELECT id, stripe_customer_id FROM customers WHERE email_key = :v", {"v": "someone@example.com"}),
+    ("order by payment intent",
+     "SELECT id FROM orders WHERE stripe_payment_intent_id = :v", {"v": "pi_x"}),
+    ("orders dashboard page",
+     "SELECT id FROM orders ORDER BY created_at DESC, id DESC LIMIT 51", {}),
+    ("orders page by status",
+     "SELECT id FROM orders WHERE status = :v ORDER BY created_at DESC, id DESC LIMIT 51",
+     {"v": "paid"}),
+    ("order totals by status",
+     "SELECT status, count(id), sum(amount) FROM orders GROUP BY status", {}),
+    ("complaints dashboard page",
+     "SELECT id FROM complaints ORDER BY created_at DESC, id DESC LIMIT 51", {}),
+    ("complaints page by status",
+     "SELECT id FROM complaints WHERE status = :v ORDER BY created_at DESC, id DESC LIMIT 51",
+     {"v": "New"}),
+]
+
+
+def explain_hot_queries(engine, queries=None):
+    """Return (name, plan, uses_index) for each hot query."""
+    results = []
+    with engine.connect() as conn:
+        dialect = conn.dialect.name
+        if dialect == "postgresql":
+            # Small tables make the planner prefer seq scans; ask whether an
+            # index *can* serve the query rather than whether it is cheaper now.
+            conn.execute(text("SET enable_seqscan = off"))
+        for name, sql, params in queries or HOT_QUERIES:
+            if dialect == "sqlite":
+                rows = conn.execute(text("EXPLAIN QUERY PLAN " + sql), params).fetchall()
+                plan = "\n".join(row[-1] for row in rows)
+                scans = [row[-1] for row in rows if row[-1].startswith("SCAN")]
+                uses_index = all(
+                    "USING" in step and "INDEX" in step for step in scans
+                ) and "USE TEMP B-TREE" not in plan
+            else:
+                rows = conn.execute(text("EXPLAIN " + sql), params).fetchall()
+                plan = "\n".join(row[0] for row in rows)
+                uses_index = "Index" in plan and "Seq Scan" not in plan
+            results.append((name, plan, uses_index))
+    return results
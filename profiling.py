@@ -0,0 +1,228 @@
+"""On-demand request profiling.
+
+A profiled request runs with a ``StackSampler`` thread that looks at the
+request thread's Python stack every few milliseconds (``sys._current_frames``)
+and adds the time since the previous look to that stack. Nothing is traced
+and nothing is patched, so requests that are not profiled run exactly as
+before. The SQL statements (text only, never parameters) and the Stripe and
+SMTP calls made during the request are recorded next to the samples.
+
+Finished profiles are kept as one JSON file each by ``ProfileStore``, which
+deletes the oldest beyond ``keep``. ``collapsed()`` and ``speedscope()``
+turn a stored profile into the files flame-graph tools read: Brendan Gregg's
+collapsed stacks (flamegraph.pl, inferno) and https://www.speedscope.app.
+"""
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+
+PROFILE_ID = re.compile(r"^\d{8}T\d{9}-[0-9a-f]{8}$")
+# SQL text kept per statement
+MAX_STATEMENT = 2000
+
+
+class StackSampler(threading.Thread):
+    """Samples one thread's stack every `interval` seconds, for at most `limit` seconds.
+
+    ``stacks`` maps a tuple of frame labels (outermost first) to seconds.
+    """
+
+    def __init__(self, thread_id, interval=0.002, limit=60.0):
+        super().__init__(name="profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.limit = limit
+        self.stacks = {}
+        self.samples = 0
+        self._labels = {}
+        self._stopped = threading.Event()
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (
+                f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        return label
+
+    def run(self):
+        last = started = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is not None:
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack = tuple(reversed(stack))
+                self.stacks[stack] = self.stacks.get(stack, 0.0) + (now - last)
+                self.samples += 1
+            last = now
+            if now - started > self.limit:
+                return
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class RequestProfile:
+    """Samples and calls for one request, started on the request's thread."""
+
+    def __init__(self, method, path, reason, interval=0.002):
+        now = time.time()
+        self.id = (time.strftime("%Y%m%dT%H%M%S", time.gmtime(now))
+                   + f"{int(now * 1000) % 1000:03d}-{uuid.uuid4().hex[:8]}")
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.created_at = now
+        self.started = time.perf_counter()
+        self.duration = None
+        self.calls = []
+        self.sampler = StackSampler(threading.get_ident(), interval)
+        self.sampler.start()
+
+    def call(self, kind, name, seconds, error=None):
+        """Record a finished SQL statement or Stripe/SMTP call that took `seconds`."""
+        start = time.perf_counter() - seconds - self.started
+        self.calls.append({"kind": kind, "name": name[:MAX_STATEMENT],
+                           "start_ms": round(start * 1000, 3), "ms": round(seconds * 1000, 3),
+                           "error": None if error is None else str(error)[:200]})
+
+    def finish(self, status):
+        """Stop sampling; the profile as a JSON-ready dict."""
+        self.duration = time.perf_counter() - self.started
+        self.sampler.stop()
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "reason": self.reason,
+            "created_at": self.created_at,
+            "duration_ms": round(self.duration * 1000, 3),
+            "samples": self.sampler.samples,
+            "interval_ms": self.sampler.interval * 1000,
+            "calls": self.calls,
+            "stacks": [{"frames": list(frames), "ms": round(seconds * 1000, 3)}
+                       for frames, seconds in self.sampler.stacks.items()],
+        }
+
+
+def summary(profile):
+    """The profile without its samples and calls, with per-kind call totals."""
+    row = {k: v for k, v in profile.items() if k not in ("stacks", "calls")}
+    for kind in ("sql", "stripe", "smtp"):
+        calls = [c for c in profile["calls"] if c["kind"] == kind]
+        row[f"{kind}_calls"] = len(calls)
+        row[f"{kind}_ms"] = round(sum(c["ms"] for c in calls), 3)
+    return row
+
+
+class ProfileStore:
+    """The newest `keep` profiles, one ``<id>.json`` file each, in `directory`."""
+
+    def __init__(self, directory, keep=50):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def _path(self, profile_id):
+        return os.path.join(self.directory, f"{profile_id}.json")
+
+    def _ids(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        # Ids start with the time, so name order is age order
+        return sorted(n[:-5] for n in names if n.endswith(".json") and PROFILE_ID.match(n[:-5]))
+
+    def save(self, profile):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(profile["id"])
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(profile, f, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+        with self._lock:
+            for profile_id in self._ids()[:-self.keep]:
+                try:
+                    os.remove(self._path(profile_id))
+                except FileNotFoundError:
+                    pass
+
+    def get(self, profile_id):
+        """The stored profile, or None if `profile_id` is unknown (or malformed)."""
+        if not PROFILE_ID.match(profile_id or ""):
+            return None
+        try:
+            with open(self._path(profile_id), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def list(self):
+        """Summaries of the stored profiles, newest first."""
+        rows = []
+        for profile_id in reversed(self._ids()):
+            profile = self.get(profile_id)
+            if profile is not None:
+                rows.append(summary(profile))
+        return rows
+
+
+def collapsed(profile):
+    """Collapsed stacks: ``outer;inner;leaf <microseconds>`` per line."""
+    lines = []
+    for stack in profile["stacks"]:
+        weight = int(stack["ms"] * 1000)
+        if weight:
+            frames = (frame.replace(";", ":") for frame in stack["frames"])
+            lines.append(f"{';'.join(frames)} {weight}\n")
+    return "".join(sorted(lines))
+
+
+def speedscope(profile):
+    """speedscope file: the samples, plus the SQL/Stripe/SMTP calls on a timeline."""
+    frames, index = [], {}
+
+    def frame(name):
+        i = index.get(name)
+        if i is None:
+            i = index[name] = len(frames)
+            frames.append({"name": name})
+        return i
+
+    samples = [[frame(name) for name in stack["frames"]] for stack in profile["stacks"]]
+    weights = [stack["ms"] for stack in profile["stacks"]]
+    title = f"{profile['method']} {profile['path']}"
+    profiles = [{
+        "type": "sampled", "name": f"{title} (samples)", "unit": "milliseconds",
+        "startValue": 0, "endValue": sum(weights), "samples": samples, "weights": weights,
+    }]
+
+    events, last = [], 0.0
+    for call in sorted(profile["calls"], key=lambda c: c["start_ms"]):
+        # Calls run one after another on the request thread; clamp rounding overlap
+        opened = max(call["start_ms"], last)
+        last = max(opened, call["start_ms"] + call["ms"])
+        i = frame(f"{call['kind'].upper()} {' '.join(call['name'].split())[:200]}")
+        events += [{"type": "O", "frame": i, "at": opened}, {"type": "C", "frame": i, "at": last}]
+    if events:
+        profiles.append({"type": "evented", "name": f"{title} (SQL, Stripe, SMTP)",
+                         "unit": "milliseconds", "startValue": 0,
+                         "endValue": max(last, profile["duration_ms"]), "events": events})
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": f"{title} {profile['id']}",
+        "exporter": "tiffin profiler",
+        "activeProfileIndex": 0,
+        "shared": {"frames": frames},
+        "profiles": profiles,
+    }
@@ -0,0 +1,172 @@
+"""Token-bucket rate limiting.
+
+A rule such as ``10/60`` allows a burst of 10 requests and refills at 10 per
+60 seconds. Each (rule, key) pair, e.g. a client IP or a phone number, has
+its own bucket holding a token count and the time it was last updated, so a
+check is a little arithmetic and no timers or background work.
+
+Backends:
+
+* ``MemoryBackend``: a dict behind a lock. A check takes about a
+  microsecond. Limits apply per process, which is right for a single worker.
+* ``SQLiteBackend``: one shared SQLite file, updated by a single UPSERT
+  statement per check, so every worker and process on the host sees the
+  same buckets.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+
+
+class Rule:
+    """`capacity` requests per `period` seconds, refilled continuously."""
+
+    def __init__(self, name, capacity, period):
+        if capacity < 1 or period <= 0:
+            raise ValueError(f"invalid rate limit for {name}: {capacity}/{period}")
+        self.name = name
+        self.capacity = float(capacity)
+        self.rate = capacity / period
+        self.period = float(period)
+
+    @classmethod
+    def parse(cls, name, spec):
+        """'10/60' -> Rule(name, 10, 60); an empty spec or 'off' -> None."""
+        if not spec or spec.strip().lower() in ("off", "0"):
+            return None
+        capacity, _, period = spec.partition("/")
+        return cls(name, int(capacity), float(period or 1))
+
+    def __repr__(self):
+        return f"Rule({self.name!r}, {self.capacity:g}/{self.period:g}s)"
+
+
+def client_address(remote_addr, forwarded_for=None, proxies=0):
+    """Client IP, trusting X-Forwarded-For only as far as `proxies` hops."""
+    if proxies and forwarded_for:
+        route = [part.strip() for part in forwarded_for.split(",") if part.strip()]
+        if len(route) >= proxies:
+            return route[-proxies]
+    return remote_addr or "unknown"
+
+
+def retry_after(rule, tokens):
+    """Whole seconds until the bucket holds one token again."""
+    return max(1, math.ceil((1 - tokens) / rule.rate))
+
+
+class MemoryBackend:
+    """In-process buckets: {(rule, key): [tokens, updated]}."""
+
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+        # A bucket left alone for the longest period seen is full again
+        self._horizon = 0.0
+
+    def hit(self, rule, key):
+        """Take a token; returns 0 if allowed, else seconds to wait."""
+        now = self.clock()
+        bucket_key = (rule.name, key)
+        with self._lock:
+            bucket = self._buckets.get(bucket_key)
+            if bucket is None:
+                self._horizon = max(self._horizon, rule.period)
+                if len(self._buckets) >= self.max_keys:
+                    self._prune(now)
+                self._buckets[bucket_key] = [rule.capacity - 1, now]
+                return 0
+            tokens = min(rule.capacity, bucket[0] + (now - bucket[1]) * rule.rate)
+            bucket[1] = now
+            if tokens >= 1:
+                bucket[0] = tokens - 1
+                return 0
+            bucket[0] = tokens
+        return retry_after(rule, tokens)
+
+    def _prune(self, now):
+        # Buckets idle long enough to be full again carry no information;
+        # if every bucket is busy, forget the oldest half
+        full = [k for k, (_, updated) in self._buckets.items() if now - updated >= self._horizon]
+        if not full:
+            by_age = sorted(self._buckets, key=lambda k: self._buckets[k][1])
+            full = by_age[:len(by_age) // 2]
+        for k in full:
+            del self._buckets[k]
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBackend:
+    """Buckets in a SQLite file shared by every worker on the host."""
+
+    SCHEMA = ("CREATE TABLE IF NOT EXISTS rate_buckets ("
+              " key TEXT PRIMARY KEY, tokens REAL NOT NULL,"
+              " updated REAL NOT NULL, allowed INTEGER NOT NULL) WITHOUT ROWID")
+    # One statement refills, takes a token when there is one and reports
+    # whether it did; SET expressions all see the old row
+    HIT = (
+        "INSERT INTO rate_buckets (key, tokens, updated, allowed)"
+        " VALUES (:key, :capacity - 1, :now, 1)"
+        " ON CONFLICT(key) DO UPDATE SET"
+        " allowed = min(:capacity, tokens + (:now - updated) * :rate) >= 1,"
+        " tokens = min(:capacity, tokens + (:now - updated) * :rate)"
+        "  - (min(:capacity, tokens + (:now - updated) * :rate) >= 1),"
+        " updated = :now"
+        " RETURNING tokens, allowed"
+    )
+    PRUNE_EVERY = 10000
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._local = threading.local()
+        self._hits = 0
+        self._horizon = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().execute(self.SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def hit(self, rule, key):
+        now = self.clock()
+        conn = self._connection()
+        tokens, allowed = conn.execute(self.HIT, {
+            "key": f"{rule.name}:{key}", "capacity": rule.capacity,
+            "rate": rule.rate, "now": now,
+        }).fetchone()
+        self._hits += 1
+        self._horizon = max(self._horizon, rule.period)
+        if self._hits % self.PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM rate_buckets WHERE updated < ?", (now - self._horizon,))
+        return 0 if allowed else retry_after(rule, tokens)
+
+    def reset(self):
+        self._connection().execute("DELETE FROM rate_buckets")
+
+
+def new_backend(name, path=None):
+    """'memory', 'sqlite' (shared file at `path`) or 'off' (None)."""
+    if name == "memory":
+        return MemoryBackend()
+    if name == "sqlite":
+        return SQLiteBackend(path)
+    if name in ("off", "none", ""):
+        return None
+    raise ValueError(f"unknown RATE_LIMIT_BACKEND {name!r}")
@@ -0,0 +1,117 @@
+"""Request profiling hooks and the /admin/profiles pages.
+
+A request is profiled (see profiling.py) when it carries a token from
+/admin/profiles in X-Profile-Token or ?__profile=<token>, when a logged-in
+admin adds ?__profile=1, or as every PROFILE_SAMPLE_EVERY-th request.
+Otherwise the cost is a header lookup and a substring test.
+
+Loaded by create_app(), which calls init_app() to add the hooks.
+"""
+import itertools
+from urllib.parse import urlencode
+
+from flask import Blueprint, Response, current_app, g, jsonify, render_template, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+import profiling
+from app import admin_required, config, is_admin, service
+
+PROFILE_HEADER = "X-Profile-Token"
+_profile_counter = itertools.count(1)
+
+bp = Blueprint("profiles", __name__)
+
+
+def profile_tokens():
+    return URLSafeTimedSerializer(current_app.secret_key, salt="request-profile")
+
+
+def new_profile_token():
+    return profile_tokens().dumps("profile")
+
+
+def valid_profile_token(token):
+    try:
+        profile_tokens().loads(token, max_age=config["PROFILE_TOKEN_TTL"])
+    except BadSignature:
+        return False
+    return True
+
+
+def profile_reason():
+    """Why this request should be profiled, or None."""
+    token = request.headers.get(PROFILE_HEADER)
+    if token is None and b"__profile" in request.query_string:
+        token = request.args.get("__profile")
+    if token is not None:
+        if is_admin():
+            return "admin"
+        if valid_profile_token(token):
+            return "token"
+    every = config["PROFILE_SAMPLE_EVERY"]
+    if every and request.endpoint != "static" and next(_profile_counter) % every == 0:
+        return "sampled"
+    return None
+
+
+def profiled_path(path, args):
+    """The path and query string to store, without the ?__profile token."""
+    query = urlencode([(k, v) for k, v in args.items(multi=True) if k != "__profile"])
+    return f"{path}?{query}" if query else path
+
+
+def _start_profile():
+    reason = profile_reason()
+    if reason:
+        g.profile = profiling.RequestProfile(request.method,
+                                             profiled_path(request.path, request.args),
+                                             reason, config["PROFILE_INTERVAL_MS"] / 1000)
+
+
+def _finish_profile(response):
+    profile = g.pop("profile", None)
+    if profile is not None:
+        service("profiles").save(profile.finish(response.status_code))
+        response.headers["X-Profile-Id"] = profile.id
+    return response
+
+
+@bp.route("/admin/profiles")
+@admin_required
+def admin_profiles():
+    """Stored request profiles, and a token to profile requests from elsewhere"""
+    return render_template("admin_profiles.html", profiles=service("profiles").list(),
+                           token=new_profile_token(), header=PROFILE_HEADER,
+                           token_ttl=config["PROFILE_TOKEN_TTL"],
+                           sample_every=config["PROFILE_SAMPLE_EVERY"])
+
+
+@bp.route("/admin/profiles/<profile_id>/<any(speedscope, collapsed, json):fmt>")
+@admin_required
+def admin_profile_file(profile_id, fmt):
+    profile = service("profiles").get(profile_id)
+    if profile is None:
+        return jsonify({"error": "Profile not found"}), 404
+    if fmt == "collapsed":
+        response = Response(profiling.collapsed(profile), mimetype="text/plain")
+        filename = f"{profile_id}.collapsed.txt"
+    else:
+        body = profiling.speedscope(profile) if fmt == "speedscope" else profile
+        response = jsonify(body)
+        filename = f"{profile_id}.{'speedscope.' if fmt == 'speedscope' else ''}json"
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
+    return response
+
+
+def init_app(app):
+    """Add the profile store, the pages and the request hooks to `app`.
+
+    Call it between the request timer's hooks and the metrics' after_request,
+    so a profile covers the whole request.
+    """
+    app.extensions["tiffin"]["profiles"] = profiling.ProfileStore(
+        app.config["PROFILE_DIR"], keep=app.config["PROFILE_KEEP"])
+    app.register_blueprint(bp)
+    app.before_request(_start_profile)
+    # after_request functions run in reverse order: the profile ends last
+    app.after_request(_finish_profile)
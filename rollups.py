@@ -0,0 +1,101 @@
+"""Daily statistics rollups.
+
+``order_daily_stats`` holds order count and amount per (day, plan_id,
+status), and ``complaint_daily_stats`` holds complaint count per (day,
+category, status). The day is the day the row was created (UTC). Every
+status change moves one unit from the old bucket to the new one, in the same
+transaction as the change itself, so reports read a few hundred rollup rows
+instead of scanning orders.
+
+Custom plan ids carry a timestamp (``custom_<meal type>_<days>_<ts>``), so
+each would be a bucket of its own; they are counted under
+``custom_<meal type>_<days>`` instead (``rollup_plan_id``), the same way in
+the incremental deltas and in ``rebuild``.
+
+``rebuild`` recomputes both tables from scratch; run it after bulk imports
+or manual SQL edits (``flask stats-rebuild``).
+"""
+from collections import defaultdict
+
+from sqlalchemy import text
+
+from kitchen import custom_plan_prefixes
+
+ORDER_DIMENSIONS = ("day", "plan_id", "status")
+COMPLAINT_DIMENSIONS = ("day", "category", "status")
+CUSTOM_PREFIXES = frozenset(custom_plan_prefixes())
+
+
+def rollup_plan_id(plan_id):
+    """The plan id an order is counted under: custom plans without their timestamp."""
+    if plan_id and plan_id.startswith("custom_"):
+        parts = plan_id.split("_", 3)
+        if len(parts) == 4 and "_".join(parts[:3]) in CUSTOM_PREFIXES:
+            return "_".join(parts[:3])
+    return plan_id
+
+
+# rollup_plan_id in SQL; substr() rather than LIKE, which ignores case on SQLite
+ROLLUP_PLAN_ID = ("CASE " + " ".join(
+    f"WHEN substr(plan_id, 1, {len(prefix) + 1}) = '{prefix}_' THEN '{prefix}'"
+    for prefix in sorted(CUSTOM_PREFIXES)) + " ELSE plan_id END")
+
+REBUILD_STATEMENTS = [
+    "DELETE FROM order_daily_stats",
+    "DELETE FROM complaint_daily_stats",
+    "INSERT INTO order_daily_stats (day, plan_id, status, order_count, amount_total)"
+    f" SELECT date(created_at), {ROLLUP_PLAN_ID}, status, COUNT(*), COALESCE(SUM(amount), 0)"
+    f" FROM orders WHERE created_at IS NOT NULL GROUP BY date(created_at), {ROLLUP_PLAN_ID}, status",
+    "INSERT INTO complaint_daily_stats (day, category, status, complaint_count)"
+    " SELECT date(created_at), COALESCE(category, ''), status, COUNT(*)"
+    " FROM complaints WHERE created_at IS NOT NULL"
+    " GROUP BY date(created_at), COALESCE(category, ''), status",
+]
+
+
+def rebuild(conn):
+    for statement in REBUILD_STATEMENTS:
+        conn.execute(text(statement))
+
+
+class RollupDeltas:
+    """Accumulates +/- changes to rollup buckets until they are written."""
+
+    def __init__(self):
+        self.orders = defaultdict(lambda: [0, 0])
+        self.complaints = defaultdict(int)
+
+    def __bool__(self):
+        return bool(self.orders or self.complaints)
+
+    def order(self, created_at, plan_id, amount, status, sign=1):
+        if created_at is None or status is None:
+            return
+        bucket = self.orders[(created_at.date(), rollup_plan_id(plan_id), status)]
+        bucket[0] += sign
+        bucket[1] += sign * (amount or 0)
+
+    def order_transition(self, created_at, plan_id, amount, old_status, new_status):
+        if old_status != new_status:
+            self.order(created_at, plan_id, amount, old_status, -1)
+            self.order(created_at, plan_id, amount, new_status, 1)
+
+    def complaint(self, created_at, category, status, sign=1):
+        if created_at is None or status is None:
+            return
+        self.complaints[(created_at.date(), category or "", status)] += sign
+
+    def complaint_transition(self, created_at, category, old_status, new_status):
+        if old_status != new_status:
+            self.complaint(created_at, category, old_status, -1)
+            self.complaint(created_at, category, new_status, 1)
+
+    def order_rows(self):
+        return [{"day": day, "plan_id": plan_id, "status": status,
+                 "order_count": count, "amount_total": amount}
+                for (day, plan_id, status), (count, amount) in self.orders.items()
+                if count or amount]
+
+    def complaint_rows(self):
+        return [{"day": day, "category": category, "status": status, "complaint_count": count}
+                for (day, category, status), count in self.complaints.items() if count]
@@ -0,0 +1,130 @@
+"""Full-text search over complaints.
+
+SQLite: an external-content FTS5 table, ``complaints_fts``, indexes name,
+place, complaint_type and description. Triggers keep it in step with the
+``complaints`` table, and ``rebuild`` re-indexes every row. Status changes
+do not touch the index, because the triggers only fire when indexed columns
+change.
+
+PostgreSQL: a stored generated ``search_vector`` tsvector column with a GIN
+index. Queries use prefix matching (``word:*``), ``ts_rank`` and
+``ts_headline``.
+
+Either way a query is an index lookup, so search stays fast at millions of
+rows where ``LIKE '%word%'`` would scan the table.
+"""
+import html
+import re
+
+from sqlalchemy import DateTime, text
+
+MAX_TERMS = 8
+_TERM = re.compile(r"\w+", re.UNICODE)
+# Private-use markers survive escaping and are then turned into <mark> tags
+_START, _END = "\ue000", "\ue001"
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS complaints_fts USING fts5("
+    " name, place, complaint_type, description,"
+    " content='complaints', content_rowid='id',"
+    " tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS complaints_fts_ai AFTER INSERT ON complaints BEGIN"
+    " INSERT INTO complaints_fts (rowid, name, place, complaint_type, description)"
+    " VALUES (new.id, new.name, new.place, new.complaint_type, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS complaints_fts_ad AFTER DELETE ON complaints BEGIN"
+    " INSERT INTO complaints_fts (complaints_fts, rowid, name, place, complaint_type, description)"
+    " VALUES ('delete', old.id, old.name, old.place, old.complaint_type, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS complaints_fts_au"
+    " AFTER UPDATE OF name, place, complaint_type, description ON complaints BEGIN"
+    " INSERT INTO complaints_fts (complaints_fts, rowid, name, place, complaint_type, description)"
+    " VALUES ('delete', old.id, old.name, old.place, old.complaint_type, old.description);"
+    " INSERT INTO complaints_fts (rowid, name, place, complaint_type, description)"
+    " VALUES (new.id, new.name, new.place, new.complaint_type, new.description); END",
+]
+
+POSTGRES_DDL = [
+    "ALTER TABLE complaints ADD COLUMN IF NOT EXISTS search_vector tsvector"
+    " GENERATED ALWAYS AS (to_tsvector('simple',"
+    " coalesce(name, '') || ' ' || coalesce(place, '') || ' ' ||"
+    " coalesce(complaint_type, '') || ' ' || coalesce(description, ''))) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_complaints_search_vector ON complaints USING GIN (search_vector)",
+]
+
+RESULT_COLUMNS = "c.id, c.name, c.phone, c.place, c.category, c.complaint_type, c.status, c.created_at"
+
+
+def install(conn):
+    """Create the search index for the connection's backend (idempotent)."""
+    statements = SQLITE_DDL if conn.dialect.name == "sqlite" else POSTGRES_DDL
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def uninstall(conn):
+    if conn.dialect.name == "sqlite":
+        conn.execute(text("DROP TABLE IF EXISTS complaints_fts"))
+
+
+def suspend(conn):
+    """Stop indexing row by row, before a bulk load; ``rebuild`` restores it."""
+    if conn.dialect.name == "sqlite":
+        for suffix in ("ai", "ad", "au"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS complaints_fts_{suffix}"))
+    else:
+        conn.execute(text("DROP INDEX IF EXISTS ix_complaints_search_vector"))
+
+
+def rebuild(conn):
+    """Re-index every complaint (the generated column needs nothing on PostgreSQL)."""
+    install(conn)
+    if conn.dialect.name == "sqlite":
+        conn.execute(text("INSERT INTO complaints_fts (complaints_fts) VALUES ('rebuild')"))
+
+
+def query_terms(q):
+    return _TERM.findall(q or "")[:MAX_TERMS]
+
+
+def highlight(snippet):
+    """HTML-escape a snippet and turn the match markers into <mark> tags."""
+    escaped = html.escape(snippet or "")
+    return escaped.replace(_START, "<mark>").replace(_END, "</mark>")
+
+
+def search(conn, q, limit=20, offset=0, status=None):
+    """Ranked complaints matching every term of `q` (each as a prefix).
+
+    Returns a list of dicts with the complaint fields, a highlighted
+    `snippet` and a `rank` (lower is better on SQLite, higher on PostgreSQL;
+    results are already ordered).
+    """
+    terms = query_terms(q)
+    if not terms:
+        return []
+    params = {"limit": limit, "offset": offset, "status": status,
+              "mark_start": _START, "mark_end": _END}
+    status_filter = " AND c.status = :status" if status else ""
+    if conn.dialect.name == "sqlite":
+        params["match"] = " ".join('"{}"*'.format(term.replace('"', "")) for term in terms)
+        sql = (
+            f"SELECT {RESULT_COLUMNS},"
+            " snippet(complaints_fts, -1, :mark_start, :mark_end, '…', 16) AS snippet,"
+            " bm25(complaints_fts) AS rank"
+            " FROM complaints_fts JOIN complaints c ON c.id = complaints_fts.rowid"
+            f" WHERE complaints_fts MATCH :match{status_filter}"
+            " ORDER BY rank, c.id LIMIT :limit OFFSET :offset"
+        )
+    else:
+        params["match"] = " & ".join(f"{term}:*" for term in terms)
+        params["headline"] = f"StartSel={_START}, StopSel={_END}, MaxWords=24, MinWords=8"
+        sql = (
+            f"SELECT {RESULT_COLUMNS},"
+            " ts_headline('simple', coalesce(c.description, c.name), to_tsquery('simple', :match),"
+            " :headline) AS snippet,"
+            " ts_rank(c.search_vector, to_tsquery('simple', :match)) AS rank"
+            " FROM complaints c"
+            f" WHERE c.search_vector @@ to_tsquery('simple', :match){status_filter}"
+            " ORDER BY rank DESC, c.id LIMIT :limit OFFSET :offset"
+        )
+    rows = conn.execute(text(sql).columns(created_at=DateTime), params).mappings().all()
+    return [dict(row, snippet=highlight(row["snippet"])) for row in rows]
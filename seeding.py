@@ -0,0 +1,448 @@
+"""Synthetic customers, orders and complaints for scale testing (``flask seeddb``).
+
+Rows come from one seeded ``random.Random``, so the same arguments on the
+same starting database produce the same rows:
+
+- Customers sign up over the last ``days`` days, more of them recently (the
+  business grows), and ids follow signup order.
+- Orders pick their customer with a power-law skew: a few regulars place
+  many orders, most customers one or two. An order is placed after its
+  customer signed up, mostly around lunch and dinner. Plans follow the real
+  catalog plus custom plans priced by ``catalog.custom_plan_price``, and the
+  status mix depends on age (recent orders are still being paid).
+- Complaints are filed by customers about their own area, with the
+  categories and types of the complaint form; old ones are mostly resolved.
+
+Rows are loaded through ``Connection.exec_driver_sql`` in batches of
+``batch`` rows, one DB-API executemany each, skipping per-row ORM and type
+processing. The tables' secondary indexes and the full-text triggers are
+dropped for the load and built once at the end, and SQLite writes without
+fsync meanwhile. Core inserts bypass the ORM hooks, so the search index is
+rebuilt afterwards and the rollups get the counts the generator kept.
+"""
+import random
+import time
+from bisect import bisect
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import accumulate, combinations
+
+from sqlalchemy import text
+
+import search
+from catalog import (
+    CUSTOM_DURATIONS, CUSTOM_MEAL_PRICES, CUSTOM_MEALS, DEFAULT_PLANS, custom_plan_price,
+)
+
+TABLES = ("customers", "orders", "complaints")
+AREAS = ["Kakkanad", "Edappally", "Vyttila", "Kaloor", "Fort Kochi", "Aluva",
+         "Palarivattom", "Thrippunithura", "Kalamassery", "Panampilly Nagar"]
+FIRST_NAMES = ["Arjun", "Anjali", "Rahul", "Fathima", "Vishnu", "Aparna", "Mohammed", "Sneha",
+               "Akhil", "Divya", "Joseph", "Meera", "Nikhil", "Aisha", "Sreejith", "Lakshmi",
+               "Adil", "Neha", "Kiran", "Riya", "Thomas", "Gayathri", "Faisal", "Anu"]
+LAST_NAMES = ["Nair", "Menon", "Thomas", "Pillai", "Kurian", "Varghese", "Rahman", "Iyer",
+              "George", "Krishnan", "Joseph", "Das", "Shibily", "Mathew", "Babu", "Ali"]
+EMAIL_DOMAINS = ["gmail.com", "yahoo.co.in", "outlook.com", "hotmail.com", "rediffmail.com"]
+
+# Orders placed in each hour of the day (IST): breakfast, lunch and dinner peaks
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 8, 9, 6, 5, 9, 14, 12, 6, 4, 4, 6, 10, 14, 12, 7, 3, 2]
+# Share of orders for each catalog plan, and for custom plans
+PLAN_WEIGHTS = {"veg_week": 30, "mixed_week": 22, "veg_month": 18, "nonveg_month": 12}
+CUSTOM_WEIGHT = 18
+# Status mix of orders at least a day old, and of younger ones
+SETTLED_STATUSES = {"paid": 40, "fulfilled": 42, "failed": 6, "canceled": 5, "refunded": 4,
+                    "partially_refunded": 1.5, "disputed": 1, "dispute_lost": 0.5}
+RECENT_STATUSES = {"created": 25, "processing": 5, "paid": 55, "fulfilled": 5, "failed": 7,
+                   "canceled": 3}
+# Not touched since checkout; changed days after payment (the rest: minutes after)
+PENDING = {"created", "processing"}
+LATER = {"fulfilled", "refunded", "partially_refunded", "disputed", "dispute_lost"}
+CHARGED = {"paid", "fulfilled", "refunded", "partially_refunded", "disputed", "dispute_lost"}
+COMPLAINT_CATEGORIES = {"Lunch": 45, "Dinner": 35, "Breakfast": 20}
+COMPLAINT_TYPES = {
+    "Delivery": ["Delivery was {n} minutes late", "Delivered to the wrong address",
+                 "Delivery person could not find the flat", "Order did not arrive today"],
+    "Food": ["Food was cold when it arrived", "Curry was too spicy", "Rice was undercooked",
+             "Found a hair in the {meal}", "Portion size was smaller than usual"],
+    "Other": ["Charged twice for the same plan", "Could not pause my subscription",
+              "Need a GST invoice for last month", "Support did not call back"],
+}
+COMPLAINT_TYPE_WEIGHTS = {"Delivery": 35, "Food": 50, "Other": 15}
+# Complaint statuses by age: under 2 days, under 2 weeks, older
+COMPLAINT_STATUSES = ["New", "In Progress", "Resolved"]
+COMPLAINT_STATUS_WEIGHTS = [[60, 30, 10], [15, 30, 55], [2, 3, 95]]
+
+# Regulars (this share of customers) place REGULAR_ORDERS of all orders and
+# complaints; everything else is spread over all customers
+REGULARS = 0.1
+REGULAR_ORDERS = 0.5
+
+
+EPOCH = datetime(1970, 1, 1)
+DAY = 86400
+IST = 19800  # UTC+05:30, in seconds
+
+
+def _weighted(rng, weights):
+    """sample(k) -> k choices from {value: weight}, via one cumulative table."""
+    values = list(weights)
+    cumulative = list(accumulate(weights.values()))
+    return lambda k: rng.choices(values, cum_weights=cumulative, k=k)
+
+
+def custom_options():
+    """(meal type, days, price, description) for every custom plan a customer can build."""
+    options = []
+    for meal_type in CUSTOM_MEAL_PRICES:
+        for duration in CUSTOM_DURATIONS:
+            for size in range(1, len(CUSTOM_MEALS) + 1):
+                for meals in combinations(CUSTOM_MEALS, size):
+                    for days_per_week in (5, 6, 7):
+                        price = custom_plan_price({"mealType": meal_type, "mealsPerDay": meals,
+                                                   "duration": duration,
+                                                   "daysPerWeek": days_per_week})
+                        options.append((meal_type, duration, price,
+                                        f"Custom {meal_type} plan, {duration} days "
+                                        f"({', '.join(meals)})"))
+    return options
+
+
+def as_datetime(seconds):
+    return EPOCH + timedelta(seconds=seconds)
+
+
+class SQLiteText:
+    """Unix seconds -> the text SQLAlchemy stores for a DateTime on SQLite.
+
+    Built from a cached date prefix and a table of the day's 86400 times,
+    which is several times faster than formatting a datetime per value.
+    """
+
+    def __init__(self):
+        self.dates = {}
+        self.times = [f"{s // 3600:02d}:{s // 60 % 60:02d}:{s % 60:02d}.000000"
+                      for s in range(DAY)]
+
+    def __call__(self, seconds):
+        day, second = divmod(seconds, DAY)
+        date = self.dates.get(day)
+        if date is None:
+            date = self.dates[day] = (EPOCH + timedelta(days=day)).strftime("%Y-%m-%d ")
+        return date + self.times[second]
+
+
+class Generator:
+    """Yields row tuples in time order; ids continue from `first_customer_id` / `first_order_id`.
+
+    Times are whole unix seconds (UTC) until `stamp` turns them into column
+    values: datetimes by default, ``SQLiteText()`` for SQLite. While rows are
+    generated, ``order_stats`` and ``complaint_stats`` count them per rollup
+    bucket, keyed by (UTC day number, plan id or category, status).
+    """
+
+    def __init__(self, seed, days=365, now=None, first_customer_id=1, first_order_id=1,
+                 stamp=as_datetime):
+        self.rng = random.Random(seed)
+        self.now = int(((now or datetime.utcnow()) - EPOCH).total_seconds())
+        # `days` whole days (IST) before today, and today so far
+        self.start = ((self.now + IST) // DAY - days) * DAY - IST
+        self.span = self.now - self.start
+        self.first_customer_id = first_customer_id
+        self.first_order_id = first_order_id
+        self.stamp = stamp
+        self.signups = []  # seconds after start, per generated customer, in id order
+        self.areas = []
+        self.names = []
+        self.order_stats = defaultdict(lambda: [0, 0])
+        self.complaint_stats = defaultdict(int)
+
+        self.plans = {plan["id"]: plan for plan in DEFAULT_PLANS}
+        plan_weights = {plan_id: PLAN_WEIGHTS.get(plan_id, 10) for plan_id in self.plans}
+        plan_weights["custom"] = CUSTOM_WEIGHT
+        self.pick_plan = _weighted(self.rng, plan_weights)
+        self.pick_settled = _weighted(self.rng, SETTLED_STATUSES)
+        self.pick_recent = _weighted(self.rng, RECENT_STATUSES)
+        self.pick_hour = _weighted(self.rng, dict(enumerate(HOUR_WEIGHTS)))
+        self.pick_category = _weighted(self.rng, COMPLAINT_CATEGORIES)
+        self.pick_type = _weighted(self.rng, COMPLAINT_TYPE_WEIGHTS)
+        self.custom = custom_options()
+
+    def _timeline(self, count):
+        """`count` sorted offsets (seconds after start) for rows created over the period.
+
+        Day d gets a share growing linearly with d (the business grows), and
+        within a day the hours follow HOUR_WEIGHTS. Today stops at now.
+        """
+        rnd, now = self.rng.random, self.span
+        days = -(-self.span // DAY)
+        placed = 0
+        for d in range(days):
+            upto = round(count * ((d + 1) / days) ** 2)
+            n, placed = upto - placed, upto
+            if not n:
+                continue
+            day = d * DAY
+            times = [day + hour * 3600 + int(3600 * rnd()) for hour in self.pick_hour(n)]
+            if day + DAY > now:
+                times = [t if t <= now else day + int((now - day) * rnd()) for t in times]
+            times.sort()
+            yield from times
+
+    def _placed(self, count):
+        """`count` (customer index, seconds after start) pairs for orders or complaints.
+
+        A share REGULAR_ORDERS of them goes to the regulars, the REGULARS
+        share of customers scattered over signup order by a prime stride; the
+        rest to any customer. Either way only customers who had signed up by
+        then: with the defaults a regular places about 25 orders for every 2
+        or 3 of anyone else.
+        """
+        rnd, signups = self.rng.random, self.signups
+        customers = len(signups)
+        if not customers:
+            for offset in self._timeline(count):
+                yield None, offset
+            return
+        stride = 7919 if customers % 7919 else 1
+        regulars = max(int(customers * REGULARS), 1)
+        joined = 0
+        for offset in self._timeline(count):
+            while joined < customers and signups[joined] <= offset:
+                joined += 1
+            u = rnd()
+            c = int(regulars * u / REGULAR_ORDERS) * stride % customers \
+                if u < REGULAR_ORDERS else customers
+            if c >= joined:
+                # Before the first signup nobody can order yet: a guest checkout
+                c = int(joined * rnd()) if joined else None
+            yield c, offset
+
+    # Customers ----------------------------------------------------------
+    def customers(self, count):
+        """(id, name, email, phone, phone_key, email_key, stripe_customer_id, created_at) rows."""
+        rng, stamp, start = self.rng, self.stamp, self.start
+        rnd = rng.random
+        self.signups = signups = list(self._timeline(count))
+        self.areas = rng.choices(AREAS, k=count)
+        self.names = names = []
+        first = self.first_customer_id
+        for i, offset in enumerate(signups):
+            customer_id = first + i
+            first_name = FIRST_NAMES[int(rnd() * len(FIRST_NAMES))]
+            last_name = LAST_NAMES[int(rnd() * len(LAST_NAMES))]
+            name = f"{first_name} {last_name}"
+            # Unique per id: 10 digits starting 6-9, like an Indian mobile number
+            phone_key = f"{6 + customer_id // 10 ** 9 % 4}{customer_id % 10 ** 9:09d}"
+            phone = f"+91 {phone_key}"
+            names.append((name, phone))
+            email = (f"{first_name.lower()}.{last_name.lower()}{customer_id}"
+                     f"@{EMAIL_DOMAINS[int(rnd() * len(EMAIL_DOMAINS))]}")
+            yield (customer_id, name, email, phone, phone_key, email,
+                   f"cus_seed{customer_id:010d}" if rnd() < 0.8 else None, stamp(start + offset))
+
+    # Orders -------------------------------------------------------------
+    def orders(self, count):
+        """(id, plan_id, description, amount, currency, stripe_payment_intent_id,
+        stripe_charge_id, status, created_at, updated_at, customer_id, area) rows."""
+        rng, stamp, start, now = self.rng, self.stamp, self.start, self.now
+        rnd = rng.random
+        first, first_customer = self.first_order_id, self.first_customer_id
+        areas, custom, stats = self.areas, self.custom, self.order_stats
+        catalog = {plan_id: (plan["price"], plan["description"])
+                   for plan_id, plan in self.plans.items()}
+        # Seconds from checkout to the last update: none, up to a month, up to 10 minutes
+        delays = {status: 0 if status in PENDING else 30 * DAY if status in LATER else 600
+                  for status in list(SETTLED_STATUSES) + list(RECENT_STATUSES)}
+        picks = zip(self._placed(count), self.pick_plan(count), self.pick_settled(count),
+                    self.pick_recent(count))
+        for order_id, ((c, offset), plan_id, status, recent) in enumerate(picks, first):
+            created = start + offset
+            if plan_id == "custom":
+                meal_type, duration, amount, description = custom[int(rnd() * len(custom))]
+                rollup_plan = f"custom_{meal_type}_{duration}"
+                plan_id = f"{rollup_plan}_{created * 1000 + int(1000 * rnd())}"
+            else:
+                amount, description = catalog[plan_id]
+                rollup_plan = plan_id
+            if now - created < DAY:
+                status = recent
+            created_at = stamp(created)
+            delay = delays[status]
+            updated_at = stamp(min(created + 1 + int(delay * rnd()), now)) if delay else created_at
+
+            bucket = stats[(created // DAY, rollup_plan, status)]
+            bucket[0] += 1
+            bucket[1] += amount
+            # Ids padded to a fixed width sort in insertion order in their unique indexes
+            intent = f"pi_seed{order_id:012d}" if status != "created" or rnd() < 0.9 else None
+            yield (order_id, plan_id, description, amount, "INR", intent,
+                   f"ch_seed{order_id:012d}" if status in CHARGED else None, status,
+                   created_at, updated_at,
+                   None if c is None else first_customer + c,
+                   AREAS[int(rnd() * len(AREAS))] if c is None else areas[c])
+
+    # Complaints ---------------------------------------------------------
+    def complaints(self, count):
+        """(name, phone, place, category, complaint_type, description, status,
+        created_at, updated_at, customer_id) rows."""
+        rng, stamp, start, now = self.rng, self.stamp, self.start, self.now
+        rnd = rng.random
+        first_customer, areas, names = self.first_customer_id, self.areas, self.names
+        stats = self.complaint_stats
+        categories = self.pick_category(count)
+        kinds = self.pick_type(count)
+        statuses = [list(accumulate(weights)) for weights in COMPLAINT_STATUS_WEIGHTS]
+        for i, (c, offset) in enumerate(self._placed(count)):
+            created = start + offset
+            if c is None:
+                name = FIRST_NAMES[int(rnd() * len(FIRST_NAMES))]
+                phone, customer_id = f"9{int(rnd() * 10 ** 9):09d}", None
+                place = AREAS[int(rnd() * len(AREAS))]
+            else:
+                (name, phone), place, customer_id = names[c], areas[c], first_customer + c
+            age = now - created
+            cumulative = statuses[0 if age < 2 * DAY else 1 if age < 14 * DAY else 2]
+            status = COMPLAINT_STATUSES[bisect(cumulative, rnd() * cumulative[-1])]
+            updated = created if status == "New" else min(created + 3600 * (1 + int(96 * rnd())), now)
+            templates = COMPLAINT_TYPES[kinds[i]]
+            description = templates[int(rnd() * len(templates))].format(
+                n=20 + int(70 * rnd()), meal=categories[i].lower())
+            stats[(created // DAY, categories[i], status)] += 1
+            yield (name, phone, place, categories[i], kinds[i], description, status,
+                   stamp(created), stamp(updated), customer_id)
+
+
+# -----------------------
+# Loading
+# -----------------------
+CUSTOMER_COLUMNS = ("id", "name", "email", "phone", "phone_key", "email_key",
+                    "stripe_customer_id", "created_at")
+ORDER_COLUMNS = ("id", "plan_id", "description", "amount", "currency", "stripe_payment_intent_id",
+                 "stripe_charge_id", "status", "created_at", "updated_at", "customer_id", "area")
+COMPLAINT_COLUMNS = ("name", "phone", "place", "category", "complaint_type", "description",
+                     "status", "created_at", "updated_at", "customer_id")
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(conn, table, columns, rows, batch, commit_every):
+    """executemany `rows` in batches, committing every `commit_every` rows; returns the count."""
+    marker = "?" if conn.dialect.paramstyle == "qmark" else "%s"
+    statement = (f"INSERT INTO {table} ({', '.join(columns)})"
+                 f" VALUES ({', '.join([marker] * len(columns))})")
+    inserted = pending = 0
+    for chunk in _batches(rows, batch):
+        conn.exec_driver_sql(statement, chunk)
+        inserted += len(chunk)
+        pending += len(chunk)
+        if pending >= commit_every:
+            conn.commit()
+            pending = 0
+    conn.commit()
+    return inserted
+
+
+def _write_rollups(conn, generator, batch):
+    """Add the generator's bucket counts to the rollup tables (an upsert, so existing rows add up)."""
+    sqlite = conn.dialect.name == "sqlite"
+    epoch = EPOCH.date()
+
+    def day(n):
+        value = epoch + timedelta(days=n)
+        return value.isoformat() if sqlite else value
+
+    for table, keys, counters, rows in (
+        ("order_daily_stats", ("day", "plan_id", "status"), ("order_count", "amount_total"),
+         ((day(d), plan_id, status, count, amount)
+          for (d, plan_id, status), (count, amount) in generator.order_stats.items())),
+        ("complaint_daily_stats", ("day", "category", "status"), ("complaint_count",),
+         ((day(d), category, status, count)
+          for (d, category, status), count in generator.complaint_stats.items())),
+    ):
+        columns = keys + counters
+        marker = "?" if conn.dialect.paramstyle == "qmark" else "%s"
+        statement = (f"INSERT INTO {table} ({', '.join(columns)})"
+                     f" VALUES ({', '.join([marker] * len(columns))})"
+                     f" ON CONFLICT ({', '.join(keys)}) DO UPDATE SET "
+                     + ", ".join(f"{c} = {table}.{c} + excluded.{c}" for c in counters))
+        for chunk in _batches(rows, batch):
+            conn.exec_driver_sql(statement, chunk)
+    conn.commit()
+
+
+def _relax(conn):
+    """Session settings for a bulk load; returns the statements that undo them."""
+    if conn.dialect.name == "sqlite":
+        synchronous = conn.exec_driver_sql("PRAGMA synchronous").scalar()
+        conn.exec_driver_sql("PRAGMA synchronous=OFF")
+        conn.exec_driver_sql("PRAGMA cache_size=-262144")
+        return [f"PRAGMA synchronous={synchronous}", "PRAGMA cache_size=-65536"]
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql("SET synchronous_commit = off")
+        return ["RESET synchronous_commit"]
+    return []
+
+
+def _next_id(conn, table):
+    return (conn.execute(text(f"SELECT MAX(id) FROM {table}")).scalar() or 0) + 1
+
+
+def seed(engine, metadata, customers=0, orders=0, complaints=0, seed=1, days=365,
+         batch=50000, commit_every=500000, log=print):
+    """Generate and load the rows; returns {table: rows inserted}.
+
+    New rows get ids after the existing ones, so seeding an existing
+    database adds to it.
+    """
+    tables = [metadata.tables[name] for name in TABLES]
+    counts = {}
+    with engine.connect() as conn:
+        generator = Generator(seed, days=days,
+                              first_customer_id=_next_id(conn, "customers"),
+                              first_order_id=_next_id(conn, "orders"),
+                              stamp=SQLiteText() if conn.dialect.name == "sqlite" else as_datetime)
+        undo = _relax(conn)
+        conn.commit()
+        indexes = [index for table in tables for index in table.indexes]
+        try:
+            started = time.perf_counter()
+            for index in indexes:
+                index.drop(conn, checkfirst=True)
+            search.suspend(conn)
+            conn.commit()
+            for name, columns, rows in (
+                ("customers", CUSTOMER_COLUMNS, generator.customers(customers)),
+                ("orders", ORDER_COLUMNS, generator.orders(orders)),
+                ("complaints", COMPLAINT_COLUMNS, generator.complaints(complaints)),
+            ):
+                step = time.perf_counter()
+                counts[name] = _insert(conn, name, columns, rows, batch, commit_every)
+                log(f"   {name:11s} {counts[name]:>10,} rows  {time.perf_counter() - step:6.1f}s")
+            log(f"   loaded in {time.perf_counter() - started:.1f}s")
+        finally:
+            step = time.perf_counter()
+            for index in indexes:
+                index.create(conn, checkfirst=True)
+            conn.commit()
+            log(f"   indexes    rebuilt in {time.perf_counter() - step:6.1f}s")
+            step = time.perf_counter()
+            search.rebuild(conn)
+            _write_rollups(conn, generator, batch)
+            log(f"   search index and rollups rebuilt in {time.perf_counter() - step:.1f}s")
+            for statement in undo:
+                conn.exec_driver_sql(statement)
+            if conn.dialect.name == "sqlite":
+                # Fresh planner statistics for the new row counts, from a sample
+                conn.exec_driver_sql("PRAGMA analysis_limit=1000")
+            conn.exec_driver_sql("ANALYZE")
+            conn.commit()
+    return counts
@@ -0,0 +1,241 @@
+"""Application settings.
+
+``create_app()`` reads every setting here exactly once, from the environment
+(after ``.env``) with any explicit overrides on top, and stores the parsed
+values in ``app.config`` under the same names. Values are converted and
+checked up front and every problem is reported together as a ConfigError,
+so a typo in ``OUTBOX_WORKERS`` stops the process at boot rather than at the
+first email.
+"""
+import os
+
+import exports
+import ratelimit
+
+
+class ConfigError(ValueError):
+    """One or more settings are missing or malformed."""
+
+
+def text(value):
+    return str(value)
+
+
+def flag(value):
+    if isinstance(value, bool):
+        return value
+    value = str(value).strip().lower()
+    if value in ("1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off", ""):
+        return False
+    raise ValueError("expected true or false")
+
+
+def integer(minimum=None):
+    def parse(value):
+        value = int(value)
+        if minimum is not None and value < minimum:
+            raise ValueError(f"must be at least {minimum}")
+        return value
+    return parse
+
+
+def number(minimum=None):
+    def parse(value):
+        value = float(value)
+        if minimum is not None and value < minimum:
+            raise ValueError(f"must be at least {minimum:g}")
+        return value
+    return parse
+
+
+def choice(*options):
+    def parse(value):
+        value = str(value).lower()
+        if value not in options:
+            raise ValueError(f"must be one of {', '.join(options)}")
+        return value
+    return parse
+
+
+LOG_LEVELS = choice("debug", "info", "warning", "error", "critical")
+
+# name: (parser, default); a default of None leaves the setting unset
+SETTINGS = {
+    "SECRET_KEY": (text, "your-secret-key-here-change-in-production"),
+    "LOG_LEVEL": (LOG_LEVELS, "INFO"),
+    # The Stripe library logs every request at INFO; keep it quiet unless asked
+    "STRIPE_LOG_LEVEL": (LOG_LEVELS, "WARNING"),
+
+    # Database (see db_engine.py); DATABASE_URL overrides the SQLite file in
+    # the instance folder. The pool settings apply to PostgreSQL only.
+    "DATABASE_URL": (text, None),
+    "DB_POOL_SIZE": (integer(1), 10),
+    "DB_MAX_OVERFLOW": (integer(0), 20),
+    "DB_POOL_TIMEOUT": (number(0), 30.0),
+    "DB_POOL_RECYCLE": (integer(-1), 1800),  # -1: never recycle
+    "SQLITE_BUSY_TIMEOUT_MS": (integer(0), 5000),
+    "SQLITE_MMAP_SIZE": (integer(0), 256 * 1024 * 1024),
+    "SQLITE_CACHE_SIZE_KB": (integer(1), 65536),
+
+    # Stripe; point STRIPE_API_BASE at fake_stripe.py to run payments offline
+    "STRIPE_SECRET_KEY": (text, "sk_test_xxxxxxxxxxxxx"),
+    "STRIPE_PUBLISHABLE_KEY": (text, "pk_test_xxxxxxxxxxxxx"),
+    "STRIPE_API_BASE": (text, None),
+    "STRIPE_MAX_RETRIES": (integer(0), 2),
+    "STRIPE_POOL_SIZE": (integer(1), 20),
+    "STRIPE_WEBHOOK_SECRET": (text, None),
+
+    # Admin credentials
+    "ADMIN_USERNAME": (text, "admin"),
+    "ADMIN_PASSWORD": (text, "secure_admin_password_123"),
+
+    # SMTP (optional)
+    "SMTP_HOST": (text, None),
+    "SMTP_PORT": (integer(1), 587),
+    "SMTP_USER": (text, None),
+    "SMTP_PASS": (text, None),
+    "SMTP_FROM": (text, None),
+    "SMTP_STARTTLS": (flag, True),
+    "ADMIN_EMAIL": (text, None),
+
+    # Email outbox
+    "OUTBOX_WORKERS": (integer(0), 1),
+    "OUTBOX_POLL_SECONDS": (number(0), 2.0),
+    "OUTBOX_BATCH_SIZE": (integer(1), 20),
+    "OUTBOX_MAX_ATTEMPTS": (integer(1), 8),
+    "OUTBOX_BACKOFF_SECONDS": (number(0), 30.0),
+    "OUTBOX_BACKOFF_MAX_SECONDS": (number(0), 3600.0),
+    "OUTBOX_LEASE_SECONDS": (integer(1), 300),
+    # When > 0, notifications are held this long and bursts are sent as one digest
+    "OUTBOX_DIGEST_SECONDS": (integer(0), 0),
+
+    # Customer identity cache: phone/email key -> (customer id, stripe_customer_id)
+    "CUSTOMER_CACHE_SIZE": (integer(1), 50000),
+    "CUSTOMER_CACHE_TTL": (integer(0), 600),
+    # Plan catalog snapshot lifetime; edits made by this process apply at once
+    "PLAN_CACHE_TTL": (integer(0), 60),
+
+    # Rendered marketing pages
+    "PAGE_CACHE_MAX_AGE": (integer(0), 300),
+    "DEPLOY_VERSION": (text, None),
+    # `flask build-assets` output (default: static_build/ next to app.py)
+    "ASSET_BUILD_DIR": (text, None),
+
+    # Rate limits for the public write endpoints (see RATE_LIMITS below).
+    # memory: per process; sqlite: shared by all workers on a host
+    "RATE_LIMIT_BACKEND": (choice("memory", "sqlite", "off", "none"), "memory"),
+    "RATE_LIMIT_PATH": (text, None),
+    # Number of reverse proxies in front of the app that append X-Forwarded-For
+    "RATE_LIMIT_PROXIES": (integer(0), 0),
+
+    # Kitchen manifest: days kept precomputed, and how long before changes
+    # made by other processes show up
+    "MANIFEST_DAYS": (integer(1), 14),
+    "MANIFEST_CACHE_TTL": (integer(0), 60),
+
+    # Admin live updates: how often the dashboard's EventSource reconnects,
+    # how long the change feed keeps events and how often the webhook worker
+    # deletes older ones
+    "ADMIN_EVENTS_RETRY_MS": (integer(0), 3000),
+    "ADMIN_EVENTS_BATCH": (integer(1), 100),
+    "ADMIN_EVENTS_KEEP_SECONDS": (integer(60), 24 * 3600),
+    "ADMIN_EVENTS_PRUNE_SECONDS": (integer(1), 300),
+
+    # Webhook pipeline
+    "WEBHOOK_POLL_SECONDS": (number(0), 1.0),
+    "WEBHOOK_BATCH_SIZE": (integer(1), 500),
+
+    # Reconciliation with Stripe's PaymentIntent list (flask reconcile /
+    # reconcile-worker). The first run looks back RECONCILE_LOOKBACK_HOURS;
+    # intents still open after RECONCILE_OPEN_HOURS stop holding the
+    # checkpoint back.
+    "RECONCILE_INTERVAL_SECONDS": (number(1), 900.0),
+    "RECONCILE_PAGE_SIZE": (integer(1), 100),  # Stripe's maximum is 100
+    "RECONCILE_LOOKBACK_HOURS": (integer(1), 72),
+    "RECONCILE_OPEN_HOURS": (integer(0), 24),
+
+    # Request profiling (/admin/profiles): profile every Nth request (0: only
+    # on demand), how often to sample the stack, and how many profiles to
+    # keep on disk (default directory: profiles/ in the instance folder)
+    "PROFILE_SAMPLE_EVERY": (integer(0), 0),
+    "PROFILE_INTERVAL_MS": (number(0.5), 2.0),
+    "PROFILE_KEEP": (integer(1), 50),
+    "PROFILE_DIR": (text, None),
+    # How long a profiling token from /admin/profiles stays valid
+    "PROFILE_TOKEN_TTL": (integer(1), 3600),
+
+    # Bearer token for Prometheus to scrape /metrics; without one only a
+    # logged-in admin can read it
+    "METRICS_TOKEN": (text, None),
+    "DASHBOARD_PAGE_SIZE": (integer(1), 50),
+    "BULK_MAX_IDS": (integer(1), 1000),
+    "EXPORT_BATCH_SIZE": (integer(1), exports.DEFAULT_BATCH_SIZE),
+}
+
+# Rate limit rules as "burst/seconds", each set by RATE_LIMIT_<NAME> ("off"
+# disables a rule)
+RATE_LIMITS = {
+    "payment_ip": "20/60",
+    "payment_phone": "5/300",
+    "complaint_ip": "10/60",
+    "complaint_phone": "3/600",
+}
+
+
+def load(environ, overrides=None, root_path=".", instance_path="instance"):
+    """Parse every setting; returns a dict for app.config.
+
+    `overrides` take precedence over `environ` and go through the same
+    checks; keys that are not settings (e.g. TESTING or
+    SQLALCHEMY_DATABASE_URI) are passed through unchanged.
+    """
+    overrides = dict(overrides or {})
+    errors = []
+    config = {}
+
+    def raw(name, default):
+        if name in overrides:
+            return overrides.pop(name)
+        return environ.get(name, default)
+
+    for name, (parse, default) in SETTINGS.items():
+        value = raw(name, default)
+        if value is None:
+            config[name] = None
+            continue
+        try:
+            config[name] = parse(value)
+        except (TypeError, ValueError) as e:
+            errors.append(f"{name}={value!r}: {e}")
+
+    rules = {}
+    for rule_name, default in RATE_LIMITS.items():
+        name = f"RATE_LIMIT_{rule_name.upper()}"
+        value = raw(name, default)
+        try:
+            rules[rule_name] = ratelimit.Rule.parse(rule_name, value)
+        except (TypeError, ValueError) as e:
+            errors.append(f"{name}={value!r}: {e}")
+    config["RATE_LIMITS"] = rules
+
+    if errors:
+        raise ConfigError("Invalid configuration:\n  " + "\n  ".join(errors))
+
+    config["LOG_LEVEL"] = config["LOG_LEVEL"].upper()
+    config["STRIPE_LOG_LEVEL"] = config["STRIPE_LOG_LEVEL"].upper()
+    config["SMTP_FROM"] = config["SMTP_FROM"] or config["SMTP_USER"] or config["ADMIN_EMAIL"]
+
+    # Use a writable local folder instead of OneDrive (Windows); elsewhere the
+    # Flask instance folder. DATABASE_URL overrides it for the database.
+    local_appdata = raw("LOCALAPPDATA", None)
+    config["LOCAL_INSTANCE"] = (os.path.join(local_appdata, "mini_project_instance")
+                                if local_appdata else instance_path)
+    config["ASSET_BUILD_DIR"] = config["ASSET_BUILD_DIR"] or os.path.join(root_path, "static_build")
+    config["RATE_LIMIT_PATH"] = (config["RATE_LIMIT_PATH"]
+                                 or os.path.join(config["LOCAL_INSTANCE"], "ratelimit.db"))
+    config["PROFILE_DIR"] = config["PROFILE_DIR"] or os.path.join(config["LOCAL_INSTANCE"], "profiles")
+
+    config.update(overrides)
+    return config
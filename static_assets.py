@@ -0,0 +1,78 @@
+"""Serving the fingerprinted static build.
+
+`flask build-assets` writes fingerprinted copies of static/ to
+ASSET_BUILD_DIR (see assets.py); when a manifest exists, url_for('static',
+...) in templates resolves to the hashed file, served from /assets/ with a
+year-long immutable Cache-Control.
+
+Loaded by create_app(), which calls init_app().
+"""
+import mimetypes
+
+from flask import Blueprint, render_template, request, send_from_directory, url_for
+
+import assets
+from app import config, service
+
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+bp = Blueprint("assets", __name__)
+
+
+def load_asset_manifest(build_dir):
+    """(logical name -> entry, served path -> entry) from a build's manifest."""
+    manifest = (assets.load_manifest(build_dir) or {}).get("files", {})
+    files = {}
+    for entry in manifest.values():
+        files[entry["path"]] = entry
+        for variant in entry.get("variants", []):
+            files[variant["path"]] = {"path": variant["path"], "encodings": []}
+    return manifest, files
+
+
+def asset_url_for(endpoint, **values):
+    """url_for that serves static files from the fingerprinted build when available."""
+    if endpoint == "static":
+        entry = service("asset_manifest").get(values.get("filename"))
+        if entry is not None:
+            values["filename"] = entry["path"]
+            return url_for("assets.hashed_asset", **values)
+    return url_for(endpoint, **values)
+
+
+def asset_srcset(filename):
+    """srcset of the WebP variants of a static image, or "" if none were built."""
+    entry = service("asset_manifest").get(filename)
+    if not entry:
+        return ""
+    return ", ".join(f"{url_for('assets.hashed_asset', filename=v['path'])} {v['width']}w"
+                     for v in entry.get("variants", []))
+
+
+@bp.route("/assets/<path:filename>")
+def hashed_asset(filename):
+    """Fingerprinted assets: immutable, served precompressed when the client accepts it"""
+    entry = service("asset_files").get(filename)
+    if entry is None:
+        return render_template("404.html"), 404
+    encoding = assets.negotiate_encoding(request.headers.get("Accept-Encoding"),
+                                         entry["encodings"])
+    suffix = {"br": ".br", "gzip": ".gz"}.get(encoding, "")
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    response = send_from_directory(config["ASSET_BUILD_DIR"], filename + suffix,
+                                   mimetype=mimetype, max_age=ASSET_MAX_AGE)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if entry["encodings"]:
+        response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_app(app):
+    """Load the build's manifest and serve it through url_for and /assets/."""
+    manifest, files = load_asset_manifest(app.config["ASSET_BUILD_DIR"])
+    app.extensions["tiffin"].update(asset_manifest=manifest, asset_files=files)
+    app.register_blueprint(bp)
+    app.jinja_env.globals.update(url_for=asset_url_for, asset_srcset=asset_srcset)
@@ -0,0 +1,339 @@
+"""Gateway between the app and the Stripe API.
+
+All Stripe calls go through a StripeGateway, which owns:
+
+* one pooled keep-alive ``requests.Session`` shared by every call,
+* a timeout per operation (a customer create can wait longer than a status
+  lookup on the checkout path),
+* bounded network retries — every write carries an idempotency key derived
+  from our own rows, so a retried request can never create a second object,
+* per-operation latency and error counters (see ``stats()``).
+
+Every operation also has an ``*_async`` variant for the ASGI entry point
+(asgi.py). Those share one pooled ``httpx.AsyncClient``, created on first
+use (so httpx is only needed then), with the same timeouts, retries and
+counters.
+
+The stripe and requests libraries are imported on the first call rather
+than with this module, so creating a gateway costs nothing at startup.
+
+Point ``api_base`` at ``fake_stripe.py`` to run the payment endpoints offline.
+"""
+import functools
+import threading
+import time
+
+DEFAULT_TIMEOUTS = {
+    # (connect, read) seconds
+    "create_customer": (3.05, 10),
+    "create_payment_intent": (3.05, 15),
+    "retrieve_payment_intent": (3.05, 8),
+    # A page of 100 intents with their charges expanded
+    "list_payment_intents": (3.05, 30),
+}
+DEFAULT_TIMEOUT = (3.05, 15)
+
+
+class InvalidSignature(Exception):
+    """A webhook whose Stripe-Signature does not match its payload."""
+
+
+class StripeGateway:
+    def __init__(self, api_key, api_base=None, timeouts=None, max_retries=2,
+                 pool_size=20, on_call=None):
+        self.api_key = api_key
+        self.api_base = api_base
+        self.max_retries = max_retries
+        self.timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+        # Optional callback(operation, seconds, error) for external metrics
+        self.on_call = on_call
+
+        self.session = None
+        self.pool_size = pool_size
+        self._clients = {}
+        self._async_clients = {}
+        self._async_http = None
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    # -----------------------
+    # Plumbing
+    # -----------------------
+    def _client(self, operation):
+        """StripeClient for an operation; all of them share the pooled session."""
+        timeout = self.timeouts.get(operation, DEFAULT_TIMEOUT)
+        client = self._clients.get(timeout)
+        if client is None:
+            import stripe
+
+            # Checked again under the lock: threads racing here share one client
+            with self._lock:
+                client = self._clients.get(timeout)
+                if client is None:
+                    if self.session is None:
+                        self.session = _pooled_session(self.pool_size)
+                    http_client = stripe.RequestsClient(timeout=timeout, session=self.session)
+                    client = stripe.StripeClient(
+                        self.api_key, http_client=http_client, **self._client_options()
+                    )
+                    self._clients[timeout] = client
+        return client.v1
+
+    def _client_options(self):
+        kwargs = {"max_network_retries": self.max_retries}
+        if self.api_base:
+            kwargs["base_addresses"] = {"api": self.api_base}
+        return kwargs
+
+    def _async_client(self, operation):
+        """StripeClient on a shared httpx.AsyncClient, for the *_async operations."""
+        connect, read = self.timeouts.get(operation, DEFAULT_TIMEOUT)
+        client = self._async_clients.get((connect, read))
+        if client is None:
+            import ssl
+
+            import httpx
+            import stripe
+
+            if self._async_http is None:
+                verify = ssl.create_default_context(cafile=stripe.ca_bundle_path)
+                self._async_http = httpx.AsyncClient(
+                    verify=verify,
+                    limits=httpx.Limits(max_connections=self.pool_size * 10,
+                                        max_keepalive_connections=self.pool_size),
+                )
+            http_client = _shared_httpx_client(self._async_http,
+                                               timeout=httpx.Timeout(read, connect=connect))
+            client = stripe.StripeClient(self.api_key, http_client=http_client,
+                                         **self._client_options())
+            self._async_clients[(connect, read)] = client
+        return client.v1
+
+    def _call(self, operation, fn, *args, **kwargs):
+        start = time.perf_counter()
+        error = None
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self._record(operation, elapsed, error)
+
+    async def _call_async(self, operation, fn, *args, **kwargs):
+        start = time.perf_counter()
+        error = None
+        try:
+            return await fn(*args, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self._record(operation, elapsed, error)
+
+    def _record(self, operation, elapsed, error):
+        with self._lock:
+            stat = self._stats.setdefault(
+                operation, {"calls": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            )
+            stat["calls"] += 1
+            stat["errors"] += error is not None
+            stat["total_seconds"] += elapsed
+            stat["max_seconds"] = max(stat["max_seconds"], elapsed)
+        if self.on_call:
+            self.on_call(operation, elapsed, error)
+
+    def stats(self):
+        """Per-operation call counts, error counts and latency (seconds)."""
+        with self._lock:
+            return {
+                op: dict(stat, mean_seconds=stat["total_seconds"] / stat["calls"])
+                for op, stat in self._stats.items()
+            }
+
+    # -----------------------
+    # Operations
+    # -----------------------
+    @staticmethod
+    def _customer_params(name, email, phone, metadata):
+        params = {"metadata": metadata}
+        for key, value in (("name", name), ("email", email), ("phone", phone)):
+            if value:
+                params[key] = value
+        return params
+
+    @staticmethod
+    def _payment_intent_params(amount, currency, customer, description, metadata):
+        params = {
+            "amount": amount,
+            "currency": currency,
+            "customer": customer,
+            "metadata": metadata,
+        }
+        if description:
+            params["description"] = description
+        return params
+
+    def create_customer(self, name, email, phone, metadata, idempotency_key):
+        client = self._client("create_customer")
+        return self._call("create_customer", client.customers.create,
+                          params=self._customer_params(name, email, phone, metadata),
+                          options={"idempotency_key": idempotency_key})
+
+    def create_payment_intent(self, amount, currency, customer, description, metadata,
+                              idempotency_key):
+        client = self._client("create_payment_intent")
+        return self._call("create_payment_intent", client.payment_intents.create,
+                          params=self._payment_intent_params(amount, currency, customer,
+                                                             description, metadata),
+                          options={"idempotency_key": idempotency_key})
+
+    def retrieve_payment_intent(self, payment_intent_id, expand=("latest_charge",)):
+        client = self._client("retrieve_payment_intent")
+        params = {"expand": list(expand)} if expand else None
+        return self._call("retrieve_payment_intent", client.payment_intents.retrieve,
+                          payment_intent_id, params=params)
+
+    def list_payment_intents(self, created_gte=None, created_lt=None, starting_after=None,
+                             limit=100, expand=("data.latest_charge",)):
+        """One page of PaymentIntents, newest first; follow with starting_after=page.data[-1].id."""
+        client = self._client("list_payment_intents")
+        params = {"limit": min(limit, 100)}
+        created = {}
+        if created_gte is not None:
+            created["gte"] = int(created_gte)
+        if created_lt is not None:
+            created["lt"] = int(created_lt)
+        if created:
+            params["created"] = created
+        if starting_after:
+            params["starting_after"] = starting_after
+        if expand:
+            params["expand"] = list(expand)
+        return self._call("list_payment_intents", client.payment_intents.list, params=params)
+
+    async def create_customer_async(self, name, email, phone, metadata, idempotency_key):
+        client = self._async_client("create_customer")
+        return await self._call_async(
+            "create_customer", client.customers.create_async,
+            params=self._customer_params(name, email, phone, metadata),
+            options={"idempotency_key": idempotency_key})
+
+    async def create_payment_intent_async(self, amount, currency, customer, description,
+                                          metadata, idempotency_key):
+        client = self._async_client("create_payment_intent")
+        return await self._call_async(
+            "create_payment_intent", client.payment_intents.create_async,
+            params=self._payment_intent_params(amount, currency, customer, description, metadata),
+            options={"idempotency_key": idempotency_key})
+
+    async def retrieve_payment_intent_async(self, payment_intent_id, expand=("latest_charge",)):
+        client = self._async_client("retrieve_payment_intent")
+        params = {"expand": list(expand)} if expand else None
+        return await self._call_async(
+            "retrieve_payment_intent", client.payment_intents.retrieve_async,
+            payment_intent_id, params=params)
+
+    @staticmethod
+    def construct_event(payload, sig_header, secret):
+        """Verified webhook event; ValueError for a bad payload, InvalidSignature otherwise."""
+        import stripe
+
+        try:
+            return stripe.Webhook.construct_event(payload, sig_header, secret)
+        except stripe.SignatureVerificationError as e:
+            raise InvalidSignature(str(e)) from e
+
+    @staticmethod
+    def charge_id(payment_intent):
+        """ID of the intent's latest charge, whether or not it was expanded."""
+        charge = getattr(payment_intent, "latest_charge", None)
+        if isinstance(charge, str) or charge is None:
+            return charge
+        return charge.id
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+
+    async def aclose(self):
+        if self._async_http is not None:
+            await self._async_http.aclose()
+            self._async_http = None
+            self._async_clients.clear()
+
+
+def _pooled_session(pool_size):
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _shared_httpx_client(async_client, timeout):
+    """A stripe HTTP client sending its requests on a shared httpx.AsyncClient."""
+    return _shared_httpx_client_class()(async_client, timeout)
+
+
+@functools.cache
+def _shared_httpx_client_class():
+    # Built on first use, so stripe is still only imported then
+    import anyio
+    import stripe
+
+    class SharedHTTPXClient(stripe.HTTPClient):
+        """Async-only ``stripe.HTTPClient`` on an AsyncClient it does not own.
+
+        ``stripe.HTTPXClient`` opens its own AsyncClient per instance, one per
+        timeout here; this one reuses the gateway's pool and leaves closing it
+        to ``StripeGateway.aclose``.
+        """
+
+        name = "httpx"
+
+        def __init__(self, async_client, timeout):
+            super().__init__()
+            self._async_client = async_client
+            self._timeout = timeout
+
+        async def _send(self, method, url, headers, post_data, stream=False):
+            request = self._async_client.build_request(
+                method, url, headers=headers, content=post_data, timeout=self._timeout)
+            try:
+                response = await self._async_client.send(request, stream=stream)
+            except Exception as e:
+                raise stripe.APIConnectionError(
+                    "Unexpected error communicating with Stripe "
+                    f"(Network error: a {type(e).__name__} was raised)",
+                    should_retry=True) from e
+            return response
+
+        async def request_async(self, method, url, headers, post_data=None):
+            response = await self._send(method, url, headers, post_data)
+            return response.content, response.status_code, response.headers
+
+        async def request_stream_async(self, method, url, headers, post_data=None):
+            response = await self._send(method, url, headers, post_data, stream=True)
+            return response.aiter_bytes(), response.status_code, response.headers
+
+        def sleep_async(self, secs):
+            return anyio.sleep(secs)
+
+        async def close_async(self):
+            pass
+
+        def request(self, method, url, headers, post_data=None):
+            raise RuntimeError("SharedHTTPXClient only sends async requests")
+
+        request_stream = request
+
+        def close(self):
+            pass
+
+    return SharedHTTPXClient
@@ -0,0 +1,93 @@
+"""Shared fixtures: each test gets its own app on a fresh SQLite database.
+
+A test module can override ``app_config`` to change settings, e.g.
+``{"OUTBOX_DIGEST_SECONDS": 60}``; the values go to ``create_app`` the same
+way environment variables would.
+"""
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import app as tiffin  # noqa: E402
+
+WEBHOOK_SECRET = "whsec_test"
+
+BASE_CONFIG = {
+    "RATE_LIMIT_BACKEND": "off",
+    "ADMIN_EMAIL": "admin@example.com",
+    "SMTP_HOST": "localhost",
+    "SMTP_FROM": "tiffin@example.com",
+    "STRIPE_WEBHOOK_SECRET": WEBHOOK_SECRET,
+}
+
+
+@pytest.fixture
+def app_config():
+    return {}
+
+
+@pytest.fixture
+def app(tmp_path, app_config):
+    application = tiffin.create_app(dict(BASE_CONFIG, LOCALAPPDATA=str(tmp_path), **app_config))
+    with application.app_context():
+        tiffin.db.create_all()
+        tiffin.ensure_default_plans()
+        yield application
+        tiffin.db.session.remove()
+        tiffin.db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_client(app):
+    c = app.test_client()
+    with c.session_transaction() as session:
+        session["admin_logged_in"] = True
+    return c
+
+
+@pytest.fixture
+def stripe_server():
+    from fake_stripe import FakeStripeServer
+
+    server = FakeStripeServer(auto_confirm=False).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def send_webhook(client):
+    """POST a signed Stripe event to /api/webhook; returns the response."""
+    def send(event_id, event_type, obj, created=None):
+        payload = json.dumps({"id": event_id, "object": "event", "type": event_type,
+                              "created": created or int(time.time()), "data": {"object": obj}})
+        timestamp = int(time.time())
+        signature = hmac.new(WEBHOOK_SECRET.encode(), f"{timestamp}.{payload}".encode(),
+                             hashlib.sha256).hexdigest()
+        return client.post("/api/webhook", data=payload,
+                           headers={"Stripe-Signature": f"t={timestamp},v1={signature}"})
+    return send
+
+
+@pytest.fixture
+def add_order(app):
+    """Insert an order through the ORM, so the rollups see it; returns the order."""
+    def add(status="created", plan_id="veg_week", amount=99900, **fields):
+        order = tiffin.Order(plan_id=plan_id, amount=amount, status=status, **fields)
+        tiffin.db.session.add(order)
+        tiffin.db.session.commit()
+        return order
+    return add
@@ -0,0 +1,70 @@
+"""The admin change feed: /admin/api/events and pruning."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as tiffin
+
+
+@pytest.fixture
+def app_config():
+    return {"ADMIN_EVENTS_KEEP_SECONDS": 3600, "ADMIN_EVENTS_PRUNE_SECONDS": 60}
+
+
+def event_ids():
+    return [row.id for row in tiffin.AdminEvent.query.order_by(tiffin.AdminEvent.id)]
+
+
+def age_events(hours):
+    tiffin.db.session.execute(tiffin.db.update(tiffin.AdminEvent).values(
+        created_at=datetime.utcnow() - timedelta(hours=hours)))
+    tiffin.db.session.commit()
+
+
+def test_events_after_the_last_id(admin_client, add_order):
+    start = admin_client.get("/admin/api/events").get_data(as_text=True)
+    last_id = int(start.split("id: ")[1].split()[0])
+    order = add_order()
+
+    body = admin_client.get("/admin/api/events", headers={"Last-Event-ID": str(last_id)})
+
+    text = body.get_data(as_text=True)
+    assert f'"id": {order.id}' in text
+    assert "retry: 3000" in text
+
+
+def test_old_events_are_pruned(app, add_order):
+    for _ in range(3):
+        add_order()
+    age_events(hours=2)
+    add_order()
+    fresh = event_ids()[-1]
+
+    assert tiffin.prune_admin_events() == 3
+    assert event_ids() == [fresh]
+
+
+def test_the_newest_event_is_kept_however_old(app, add_order):
+    add_order()
+    add_order()
+    age_events(hours=2)
+    newest = event_ids()[-1]
+
+    assert tiffin.prune_admin_events() == 1
+    assert event_ids() == [newest]
+    assert tiffin.latest_admin_event_id() == newest
+
+
+def test_the_webhook_worker_prunes_every_interval(app, add_order):
+    add_order()
+    add_order()
+    age_events(hours=2)
+    state = {"pruned_at": float("-inf")}
+
+    tiffin.webhook_job(state)
+    assert len(event_ids()) == 1
+
+    add_order()
+    age_events(hours=2)
+    tiffin.webhook_job(state)
+    assert len(event_ids()) == 2
@@ -0,0 +1,97 @@
+"""asgi.py: the async payment endpoints, with everything else going to Flask."""
+import asyncio
+import hashlib
+import hmac
+import json
+import sys
+import time
+
+import httpx
+import pytest
+
+import app as tiffin
+from conftest import BASE_CONFIG, WEBHOOK_SECRET
+
+pytest.importorskip("aiosqlite")
+
+
+@pytest.fixture
+def asgi(tmp_path, monkeypatch, stripe_server):
+    for name, value in dict(BASE_CONFIG, LOCALAPPDATA=str(tmp_path),
+                            STRIPE_API_BASE=stripe_server.url, STRIPE_SECRET_KEY="sk_test_fake",
+                            STRIPE_MAX_RETRIES="0").items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.delitem(sys.modules, "asgi", raising=False)
+    import asgi
+
+    with asgi.application.app_context():
+        tiffin.db.create_all()
+        tiffin.ensure_default_plans()
+    yield asgi
+    with asgi.application.app_context():
+        tiffin.db.engine.dispose()
+    asyncio.run(asgi.engine.dispose())
+
+
+def requests(asgi, *calls):
+    """Run (method, path, kwargs) requests against the ASGI app; returns the responses."""
+    async def run():
+        transport = httpx.ASGITransport(app=asgi.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = [await client.request(method, path, **kwargs)
+                         for method, path, kwargs in calls]
+        await asgi.payments.aclose()
+        return responses
+    return asyncio.run(run())
+
+
+CHECKOUT = {"plan_id": "veg_week", "amount": 99900, "currency": "inr",
+            "customer": {"name": "Asha", "phone": "9876543210"}}
+
+
+def order_status(asgi, payment_intent_id):
+    with asgi.application.app_context():
+        return tiffin.Order.query.filter_by(stripe_payment_intent_id=payment_intent_id).one().status
+
+
+def test_checkout_and_confirm(asgi, stripe_server):
+    [created] = requests(asgi, ("POST", "/api/create_payment_intent", {"json": CHECKOUT}))
+    assert created.status_code == 200, created.json()
+    payment_intent_id = created.json()["paymentIntentId"]
+    stripe_server.app.confirm_payment_intent(payment_intent_id)
+
+    [confirmed] = requests(asgi, ("POST", "/api/confirm_payment",
+                                  {"json": {"payment_intent_id": payment_intent_id}}))
+
+    assert confirmed.json() == {"success": True, "status": "paid"}
+    assert order_status(asgi, payment_intent_id) == "paid"
+
+
+def test_bad_checkouts_are_rejected(asgi):
+    [response] = requests(asgi, ("POST", "/api/create_payment_intent",
+                                 {"json": dict(CHECKOUT, amount=1)}))
+
+    assert response.status_code == 409
+
+
+def test_webhooks_are_recorded(asgi):
+    payload = json.dumps({"id": "evt_1", "object": "event", "type": "payment_intent.succeeded",
+                          "created": int(time.time()),
+                          "data": {"object": {"id": "pi_1", "object": "payment_intent"}}})
+    timestamp = int(time.time())
+    signature = hmac.new(WEBHOOK_SECRET.encode(), f"{timestamp}.{payload}".encode(),
+                         hashlib.sha256).hexdigest()
+
+    responses = requests(asgi, *[("POST", "/api/webhook", {
+        "content": payload, "headers": {"Stripe-Signature": f"t={timestamp},v1={signature}"}})
+        for _ in range(2)])
+
+    assert [r.json()["status"] for r in responses] == ["accepted", "duplicate"]
+
+
+def test_other_routes_go_to_flask(asgi):
+    plans, missing = requests(asgi, ("GET", "/plans", {}), ("GET", "/nowhere", {}))
+
+    assert plans.status_code == 200
+    assert 'data-plan-id="veg_week"' in plans.text
+    assert missing.status_code == 404
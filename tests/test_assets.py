@@ -0,0 +1,68 @@
+"""Fingerprinted asset build (assets.py) and serving it (static_assets.py)."""
+import gzip
+import io
+
+import pytest
+from flask import render_template_string
+
+import assets
+
+Image = pytest.importorskip("PIL.Image")
+
+CSS = b"/* site */\nbody {\n    background: url('../images/bg.png');\n}\n"
+
+
+def png():
+    buffer = io.BytesIO()
+    Image.new("RGB", (600, 300), "orange").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def build_dir(tmp_path):
+    source = tmp_path / "static"
+    for name, data in {"css/style.css": CSS, "images/bg.png": png(),
+                       "js/script.js": b"console.log('tiffin');\n" * 20,
+                       "js/copy.js": b"console.log('tiffin');\n" * 20}.items():
+        (source / name).parent.mkdir(parents=True, exist_ok=True)
+        (source / name).write_bytes(data)
+    out = tmp_path / "static_build"
+    assets.build(str(source), str(out), log=lambda message: None)
+    return out
+
+
+@pytest.fixture
+def app_config(build_dir):
+    return {"ASSET_BUILD_DIR": str(build_dir)}
+
+
+def test_build_fingerprints_and_dedupes(build_dir):
+    files = assets.load_manifest(str(build_dir))["files"]
+
+    assert files["js/copy.js"] == files["js/script.js"]
+    css = (build_dir / files["css/style.css"]["path"]).read_text()
+    assert "/*" not in css
+    assert f"../{files['images/bg.png']['path']}" in css
+    assert "gzip" in files["js/script.js"]["encodings"]
+    assert [v["width"] for v in files["images/bg.png"]["variants"]] == [480, 600]
+
+
+def test_templates_link_the_hashed_files(app, build_dir):
+    with app.test_request_context():
+        html = render_template_string("{{ url_for('static', filename='css/style.css') }} "
+                                      "{{ asset_srcset('images/bg.png') }}")
+
+    files = assets.load_manifest(str(build_dir))["files"]
+    assert html.startswith(f"/assets/{files['css/style.css']['path']} ")
+    assert "480w" in html and "600w" in html
+
+
+def test_hashed_assets_are_immutable_and_precompressed(app, client, build_dir):
+    path = assets.load_manifest(str(build_dir))["files"]["js/script.js"]["path"]
+
+    response = client.get(f"/assets/{path}", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "immutable" in response.headers["Cache-Control"]
+    assert gzip.decompress(response.data).startswith(b"console.log")
+    assert client.get("/assets/js/script.000000000000.js").status_code == 404
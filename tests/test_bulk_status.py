@@ -0,0 +1,88 @@
+"""Bulk status APIs behind /admin/api/{orders,complaints}/status."""
+import pytest
+
+import app as tiffin
+
+
+def statuses():
+    return dict(tiffin.db.session.query(tiffin.Order.id, tiffin.Order.status))
+
+
+def post(admin_client, payload, kind="orders"):
+    response = admin_client.post(f"/admin/api/{kind}/status", json=payload)
+    return response.status_code, response.get_json()
+
+
+def test_requires_admin(client):
+    response = client.post("/admin/api/orders/status", json={"status": "fulfilled", "ids": [1]})
+    assert response.status_code == 302
+    assert response.location.endswith("/admin/login")
+
+
+def test_ids_report_each_row(app, admin_client, add_order):
+    paid = add_order(status="paid")
+    created = add_order(status="created")
+
+    status, body = post(admin_client,
+                        {"status": "fulfilled", "ids": [paid.id, created.id, 999, paid.id]})
+
+    assert status == 200
+    assert body["updated"] == 1
+    assert body["results"] == [
+        {"id": paid.id, "result": "updated"},
+        {"id": created.id, "result": "invalid_transition", "current": "created"},
+        {"id": 999, "result": "not_found"},
+    ]
+    assert statuses() == {paid.id: "fulfilled", created.id: "created"}
+
+
+def test_filter_updates_matching_rows(app, admin_client, add_order):
+    ids = [add_order(status="paid", plan_id=plan_id).id
+           for plan_id in ("veg_week", "veg_week", "nonveg_week")]
+    add_order(status="created")
+
+    status, body = post(admin_client, {"status": "fulfilled", "filter": {"plan_id": "veg_week"}})
+
+    assert status == 200
+    assert sorted(body["ids"]) == ids[:2]
+    assert statuses()[ids[2]] == "paid"
+
+
+def test_complaint_transitions(app, admin_client):
+    new = tiffin.Complaint(name="A", phone="9876543210", status="New")
+    resolved = tiffin.Complaint(name="B", phone="9123456780", status="Resolved")
+    tiffin.db.session.add_all([new, resolved])
+    tiffin.db.session.commit()
+
+    status, body = post(admin_client, {"status": "In Progress", "ids": [new.id, resolved.id]},
+                        "complaints")
+
+    assert status == 200
+    assert [r["result"] for r in body["results"]] == ["updated", "invalid_transition"]
+
+
+@pytest.mark.parametrize("payload", [
+    {"status": "paid", "ids": [1]},
+    {"status": "fulfilled"},
+    {"status": "fulfilled", "ids": [1], "filter": {}},
+    {"status": "fulfilled", "ids": ["1"]},
+    {"status": "fulfilled", "ids": [True]},
+    {"status": "fulfilled", "ids": list(range(1001))},
+    {"status": "fulfilled", "filter": {"customer": "x"}},
+    {"status": "fulfilled", "filter": {"status": "shipped"}},
+])
+def test_invalid_requests(app, admin_client, payload):
+    status, body = post(admin_client, payload)
+
+    assert status == 400
+    assert body["error"]
+
+
+def test_dashboard_lists_every_status(app, admin_client, add_order):
+    add_order(status="partially_refunded")
+
+    page = admin_client.get("/admin?order_status=partially_refunded").get_data(as_text=True)
+
+    for status in tiffin.ORDER_STATUSES + tiffin.COMPLAINT_STATUSES:
+        assert f'<option value="{status}"' in page
+    assert '<option value="partially_refunded" selected' in page
@@ -0,0 +1,37 @@
+"""Plan catalog: only active plans are shown and sold."""
+import app as tiffin
+
+
+def deactivate(*plan_ids):
+    for plan_id in plan_ids:
+        tiffin.db.session.get(tiffin.Plan, plan_id).active = False
+    tiffin.db.session.commit()
+
+
+def test_inactive_plans_are_left_off_the_page(app, client):
+    deactivate("veg_week")
+
+    response = client.get("/plans")
+
+    assert response.status_code == 200
+    page = response.get_data(as_text=True)
+    assert 'id="menuVegWeekModal"' not in page
+    assert 'id="menuMixedWeekModal"' in page
+    assert tiffin.checkout_price("veg_week", None) is None
+
+
+def test_no_active_plans_is_an_empty_catalog(app, client):
+    deactivate(*(plan["id"] for plan in tiffin.DEFAULT_PLANS))
+
+    assert tiffin.plan_catalog.plans() == []
+    assert client.get("/plans").status_code == 200
+    assert tiffin.checkout_price("mixed_week", None) is None
+
+
+def test_price_changes_reach_checkout(app):
+    assert tiffin.checkout_price("veg_week", None) == 99900
+
+    tiffin.db.session.get(tiffin.Plan, "veg_week").price = 109900
+    tiffin.db.session.commit()
+
+    assert tiffin.checkout_price("veg_week", None) == 109900
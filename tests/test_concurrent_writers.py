@@ -0,0 +1,34 @@
+"""Parallel writer processes against each database backend (bench/concurrent_writers.py).
+
+Set TEST_DATABASE_URL (e.g. postgresql://postgres@localhost/tiffin_test) to
+include a PostgreSQL run; the database's tables are dropped and recreated.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+BACKENDS = [
+    pytest.param(None, id="sqlite"),
+    pytest.param(os.environ.get("TEST_DATABASE_URL"), id="postgresql",
+                 marks=pytest.mark.skipif(not os.environ.get("TEST_DATABASE_URL"),
+                                          reason="TEST_DATABASE_URL is not set")),
+]
+
+
+@pytest.mark.parametrize("database_url", BACKENDS)
+def test_parallel_writers_never_fail(database_url):
+    args = [sys.executable, os.path.join(ROOT, "bench", "concurrent_writers.py"),
+            "--writers", "4", "--writes", "25"]
+    if database_url:
+        args += ["--database-url", database_url]
+
+    result = subprocess.run(args, cwd=ROOT, capture_output=True, text=True, timeout=300)
+
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "committed:    100" in result.stdout
+    if database_url is None:
+        assert "journal_mode=wal" in result.stdout
@@ -0,0 +1,97 @@
+"""Customer upserts keyed on normalized phone, then email."""
+import threading
+
+import app as tiffin
+
+
+def upsert(name, phone, email):
+    result = tiffin.upsert_customer(name, phone, email)
+    tiffin.db.session.commit()
+    return result
+
+
+def customers():
+    return [(c.name, c.phone_key, c.email_key)
+            for c in tiffin.Customer.query.order_by(tiffin.Customer.id)]
+
+
+def test_same_phone_in_any_format_is_one_customer(app):
+    first, _ = upsert("Asha", "+91 98765 43210", "asha@example.com")
+    tiffin.customer_cache.clear()
+
+    assert upsert("Asha K", "098765-43210", None)[0] == first
+    assert upsert("Asha K", "9876543210", "ASHA@example.com")[0] == first
+    assert customers() == [("Asha K", "9876543210", "asha@example.com")]
+
+
+def test_repeat_customers_are_answered_from_the_cache(app):
+    first = upsert("Asha", "9876543210", None)
+    tiffin.db.session.execute(tiffin.db.delete(tiffin.Customer))
+    tiffin.db.session.commit()
+
+    assert upsert("Asha", "9876543210", None) == first
+
+
+def test_existing_contact_details_are_kept(app):
+    customer_id, _ = upsert("Asha", "9876543210", "asha@example.com")
+    tiffin.customer_cache.clear()
+
+    upsert(None, "9876543210", "other@example.com")
+
+    customer = tiffin.db.session.get(tiffin.Customer, customer_id)
+    assert (customer.name, customer.email) == ("Asha", "asha@example.com")
+
+
+def test_email_only_customers_are_keyed_on_email(app):
+    first, _ = upsert("Ravi", None, "ravi@example.com")
+    tiffin.customer_cache.clear()
+
+    assert upsert("Ravi", None, " Ravi@Example.com ")[0] == first
+
+
+def test_email_taken_by_another_phone_creates_a_phone_only_customer(app):
+    first, _ = upsert("Asha", "9876543210", "shared@example.com")
+
+    second, _ = upsert("Ravi", "9123456780", "shared@example.com")
+
+    assert second != first
+    assert customers() == [("Asha", "9876543210", "shared@example.com"),
+                           ("Ravi", "9123456780", None)]
+
+
+def test_first_stripe_customer_wins(app):
+    customer_id, _ = upsert("Asha", "9876543210", None)
+
+    assert tiffin.set_stripe_customer_id(customer_id, "cus_first") == "cus_first"
+    assert tiffin.set_stripe_customer_id(customer_id, "cus_second") == "cus_first"
+    tiffin.db.session.commit()
+    assert upsert("Asha", "9876543210", None) == (customer_id, "cus_first")
+
+
+def test_concurrent_checkouts_from_one_phone_create_one_customer(app):
+    results = []
+
+    def checkout():
+        with app.app_context():
+            results.append(upsert("Asha", "9876543210", "asha@example.com")[0])
+
+    threads = [threading.Thread(target=checkout) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 4
+    assert len(set(results)) == 1
+    assert tiffin.Customer.query.count() == 1
+
+
+def test_rolled_back_customers_are_not_cached(app):
+    customer_id, _ = tiffin.upsert_customer("Asha", "9876543210", None)
+    tiffin.set_stripe_customer_id(customer_id, "cus_1")
+    tiffin.db.session.rollback()
+
+    assert len(tiffin.customer_cache) == 0
+    customer_id, stripe_customer_id = upsert("Asha", "9876543210", None)
+    assert stripe_customer_id is None
+    assert tiffin.customer_cache.get(("phone", "9876543210")) == (customer_id, None)
@@ -0,0 +1,83 @@
+"""Kitchen manifest (kitchen.py): per-day meal counts from interval groups."""
+import random
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+import app as tiffin
+import kitchen
+
+PLANS = {"veg_week": ("veg", 7), "nonveg_month": ("nonveg", 30)}
+
+
+def expanded(groups, start, days):
+    """The slow way: every order on every day it is delivered."""
+    counts = Counter()
+    for order_day, plan_id, area, count in groups:
+        meal_type, duration = kitchen.plan_span(plan_id, PLANS)
+        for offset in range(duration):
+            day = order_day + timedelta(days=kitchen.LEAD_DAYS + offset)
+            if 0 <= (day - start).days < days:
+                counts[(day, meal_type, area or kitchen.UNASSIGNED)] += count
+    return counts
+
+
+def test_aggregate_matches_expanding_every_order():
+    rng = random.Random(7)
+    start, days = date(2024, 3, 10), 20
+    plan_ids = list(PLANS) + ["custom_mixed_14_1700000000"]
+    groups = [(start + timedelta(days=rng.randint(-40, 25)), rng.choice(plan_ids),
+               rng.choice(["Kochi", "Aluva", None]), rng.randint(1, 5)) for _ in range(200)]
+
+    window = kitchen.aggregate(groups, PLANS, start, days)
+
+    got = Counter({(start + timedelta(days=i), meal_type, area): n
+                   for (meal_type, area), row in window.counts.items()
+                   for i, n in enumerate(row) if n})
+    assert got == expanded(groups, start, days)
+
+
+def manifest(admin_client, day):
+    response = admin_client.get(f"/admin/api/manifest?date={day.isoformat()}")
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_paid_orders_are_delivered_from_the_next_day(admin_client, add_order):
+    add_order(status="paid", area=kitchen.normalize_area("  kochi "))
+    add_order(status="created", area="Kochi")
+    today = datetime.utcnow().date()
+
+    assert manifest(admin_client, today)["total"] == 0
+    assert manifest(admin_client, today + timedelta(days=1))["by_area"] == {"Kochi": 1}
+    assert manifest(admin_client, today + timedelta(days=7))["by_meal_type"] == {"veg": 1}
+    assert manifest(admin_client, today + timedelta(days=8))["total"] == 0
+
+
+def test_committed_changes_adjust_the_cached_window(admin_client, add_order):
+    order = add_order(status="paid")
+    tomorrow = datetime.utcnow().date() + timedelta(days=1)
+    assert manifest(admin_client, tomorrow)["total"] == 1
+
+    order.status = "refunded"
+    tiffin.db.session.commit()
+    add_order(status="paid", plan_id="custom_nonveg_30_1700000000", amount=50000)
+
+    assert manifest(admin_client, tomorrow)["by_meal_type"] == {"nonveg": 1}
+    assert tiffin.kitchen_manifest.builds == 1
+
+
+def test_bad_dates_are_rejected(admin_client):
+    assert admin_client.get("/admin/api/manifest?date=tomorrow").status_code == 400
+
+
+def test_manifest_command_writes_csv(app, add_order, tmp_path):
+    add_order(status="paid", area="Aluva")
+    tomorrow = datetime.utcnow().date() + timedelta(days=1)
+    output = tmp_path / "manifest.csv"
+
+    result = app.test_cli_runner().invoke(args=["manifest", "--date", tomorrow.isoformat(),
+                                                "--days", "2", "-o", str(output)])
+
+    assert "2 deliveries" in result.output
+    assert output.read_text().splitlines()[1:] == [f"{tomorrow},veg,Aluva,1",
+                                                   f"{tomorrow + timedelta(days=1)},veg,Aluva,1"]
@@ -0,0 +1,30 @@
+"""/metrics access."""
+import pytest
+
+
+@pytest.fixture
+def app_config():
+    return {"METRICS_TOKEN": "scrape-me"}
+
+
+def test_metrics_are_private_by_default(app, client):
+    app.config["METRICS_TOKEN"] = None
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 401
+
+
+def test_metrics_need_the_right_token(client):
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+
+def test_metrics_with_the_token(client):
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-me"})
+
+    assert response.status_code == 200
+    assert "http_requests_total" in response.get_data(as_text=True)
+
+
+def test_metrics_for_admins(admin_client):
+    assert admin_client.get("/metrics").status_code == 200
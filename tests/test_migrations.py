@@ -0,0 +1,101 @@
+"""`flask db-upgrade` on a database from before the migration runner."""
+import sqlite3
+
+import pytest
+
+import app as tiffin
+import migrations
+from conftest import BASE_CONFIG
+
+# Schema of instance/app.db as the original app created it
+LEGACY_SCHEMA = """
+CREATE TABLE customers (id INTEGER PRIMARY KEY, name VARCHAR(180), email VARCHAR(180),
+                        phone VARCHAR(50), created_at DATETIME);
+CREATE TABLE orders (id INTEGER PRIMARY KEY, plan_id VARCHAR(80) NOT NULL,
+                     description VARCHAR(255), amount INTEGER NOT NULL,
+                     currency VARCHAR(10) NOT NULL, razorpay_order_id VARCHAR(120) UNIQUE,
+                     razorpay_payment_id VARCHAR(120) UNIQUE, razorpay_signature VARCHAR(255),
+                     status VARCHAR(40) NOT NULL, created_at DATETIME, updated_at DATETIME,
+                     customer_id INTEGER REFERENCES customers (id));
+CREATE TABLE complaints (id INTEGER PRIMARY KEY, name VARCHAR(180) NOT NULL,
+                         phone VARCHAR(50) NOT NULL, place VARCHAR(180), category VARCHAR(50),
+                         complaint_type VARCHAR(50), description TEXT,
+                         status VARCHAR(40) NOT NULL, created_at DATETIME, updated_at DATETIME,
+                         customer_id INTEGER REFERENCES customers (id));
+INSERT INTO customers VALUES (1, 'Asha', 'Asha@Example.com', '+91 98765 43210', '2024-01-01'),
+                             (2, 'Asha again', 'asha@example.com', '098765 43210', '2024-01-02'),
+                             (3, 'Ravi', NULL, '9123456780', '2024-01-03');
+INSERT INTO orders (id, plan_id, amount, currency, status, created_at, customer_id)
+VALUES (1, 'veg_week', 99900, 'INR', 'paid', '2024-01-01 10:00:00', 1);
+INSERT INTO complaints (id, name, phone, category, status, created_at)
+VALUES (1, 'Ravi', '9123456780', 'food', 'New', '2024-01-03 09:00:00');
+"""
+
+
+def tables(path):
+    with sqlite3.connect(path) as conn:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+@pytest.fixture
+def legacy_app(tmp_path):
+    instance = tmp_path / "mini_project_instance"
+    instance.mkdir()
+    with sqlite3.connect(instance / "app.db") as conn:
+        conn.executescript(LEGACY_SCHEMA)
+    application = tiffin.create_app(dict(BASE_CONFIG, LOCALAPPDATA=str(tmp_path)))
+    yield application
+    with application.app_context():
+        tiffin.db.engine.dispose()
+
+
+def upgrade(application, *args):
+    result = application.test_cli_runner().invoke(args=["db-upgrade", *args])
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+def test_upgrade_backs_up_the_legacy_schema_first(legacy_app, tmp_path):
+    output = upgrade(legacy_app, "--backup-dir", str(tmp_path / "backups"))
+
+    [backup] = (tmp_path / "backups").iterdir()
+    assert tables(backup) == {"customers", "orders", "complaints"}
+    assert f"Applied {len(migrations.MIGRATIONS)} migration(s)" in output
+    with legacy_app.app_context():
+        applied = migrations.applied_versions(tiffin.db.engine)
+    assert applied == {m.version for m in migrations.MIGRATIONS}
+
+
+def test_upgraded_database_serves_the_app(legacy_app):
+    upgrade(legacy_app, "--no-backup")
+
+    with legacy_app.app_context():
+        assert tiffin.db.session.get(tiffin.Order, 1).stripe_payment_intent_id is None
+        assert {p.id for p in tiffin.Plan.query} == {p["id"] for p in tiffin.DEFAULT_PLANS}
+        assert tiffin.OrderDailyStat.query.one().amount_total == 99900
+        assert all(uses_index for _, _, uses_index in
+                   migrations.explain_hot_queries(tiffin.db.engine))
+    assert legacy_app.test_client().get("/plans").status_code == 200
+
+
+def test_identity_keys_go_to_the_oldest_customer(legacy_app, monkeypatch):
+    monkeypatch.setattr(migrations, "IDENTITY_BACKFILL_BATCH", 2)
+
+    upgrade(legacy_app, "--no-backup")
+
+    with legacy_app.app_context():
+        keys = tiffin.db.session.execute(tiffin.db.select(
+            tiffin.Customer.id, tiffin.Customer.phone_key, tiffin.Customer.email_key
+        ).order_by(tiffin.Customer.id)).all()
+    assert [tuple(row) for row in keys] == [(1, "9876543210", "asha@example.com"),
+                                            (2, None, None),
+                                            (3, "9123456780", None)]
+
+
+def test_second_upgrade_changes_nothing(legacy_app, tmp_path):
+    upgrade(legacy_app, "--no-backup")
+
+    output = upgrade(legacy_app, "--backup-dir", str(tmp_path / "backups"))
+
+    assert "up to date" in output
+    assert not (tmp_path / "backups").exists()
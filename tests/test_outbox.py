@@ -0,0 +1,140 @@
+"""Admin email outbox: claiming, digests and retries."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as tiffin
+
+
+class ListMailer:
+    """Collects the emails it is asked to send, or fails every send."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.sent = []
+
+    def send(self, msg):
+        if self.fail:
+            raise OSError("connection refused")
+        self.sent.append(msg)
+
+
+def queue(*subjects):
+    for subject in subjects:
+        assert tiffin.send_admin_email(subject, f"{subject} body")
+    tiffin.db.session.commit()
+
+
+def messages():
+    return tiffin.OutboxMessage.query.order_by(tiffin.OutboxMessage.id).all()
+
+
+def test_claims_are_exclusive_and_bounded(app):
+    queue("one", "two", "three")
+
+    first = tiffin.claim_outbox_messages(2)
+    second = tiffin.claim_outbox_messages(2)
+
+    assert [m.subject for m in first] == ["one", "two"]
+    assert [m.subject for m in second] == ["three"]
+    assert {m.status for m in messages()} == {"sending"}
+    assert tiffin.claim_outbox_messages(2) == []
+
+
+def test_expired_lease_is_claimed_again(app):
+    queue("one")
+    [message] = tiffin.claim_outbox_messages(10)
+    message.lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+    tiffin.db.session.commit()
+
+    assert [m.id for m in tiffin.claim_outbox_messages(10)] == [message.id]
+
+
+def test_sent_messages_are_marked_sent(app):
+    queue("one", "two")
+    mailer = ListMailer()
+
+    assert tiffin.drain_outbox(mailer) == 2
+    assert [msg["Subject"] for msg in mailer.sent] == ["one", "two"]
+    assert {(m.status, m.attempts) for m in messages()} == {("sent", 1)}
+
+
+class TestDigest:
+    @pytest.fixture
+    def app_config(self):
+        return {"OUTBOX_DIGEST_SECONDS": 60}
+
+    def test_nothing_is_claimed_before_the_oldest_is_due(self, app):
+        queue("one", "two")
+        assert tiffin.claim_outbox_messages(10) == []
+
+    def test_recipient_messages_go_out_together_once_the_oldest_is_due(self, app):
+        queue("one", "two", "three")
+        oldest = messages()[0]
+        oldest.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        tiffin.db.session.commit()
+        mailer = ListMailer()
+
+        assert tiffin.drain_outbox(mailer) == 3
+        [email] = mailer.sent
+        assert email["Subject"] == "3 new notifications"
+        body = email.get_content()
+        assert all(f"{subject} body" in body for subject in ("one", "two", "three"))
+        assert {m.status for m in messages()} == {"sent"}
+
+    def test_other_recipients_and_retries_keep_their_schedule(self, app):
+        queue("due", "new")
+        due, new = messages()
+        due.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+        retry = tiffin.OutboxMessage(recipient=due.recipient, subject="retry", body="retry",
+                                     attempts=1, created_at=datetime.utcnow(),
+                                     next_attempt_at=datetime.utcnow() + timedelta(minutes=5))
+        other = tiffin.OutboxMessage(recipient="someone@example.com", subject="other",
+                                     body="other", created_at=datetime.utcnow(),
+                                     next_attempt_at=datetime.utcnow() + timedelta(minutes=5))
+        tiffin.db.session.add_all([retry, other])
+        tiffin.db.session.commit()
+
+        claimed = tiffin.claim_outbox_messages(10)
+
+        assert sorted(m.subject for m in claimed) == ["due", "new"]
+
+
+class TestRetry:
+    @pytest.fixture
+    def app_config(self):
+        return {"OUTBOX_MAX_ATTEMPTS": 2, "OUTBOX_BACKOFF_SECONDS": 0}
+
+    def test_failed_sends_back_off_then_dead_letter(self, app):
+        queue("one")
+        mailer = ListMailer(fail=True)
+
+        assert tiffin.drain_outbox(mailer) == 1
+        [message] = messages()
+        assert message.status == "pending"
+        assert message.attempts == 1
+        assert message.claim_token is None
+        assert "connection refused" in message.last_error
+
+        assert tiffin.drain_outbox(mailer) == 1
+        tiffin.db.session.refresh(message)
+        assert (message.status, message.attempts) == ("dead", 2)
+        assert tiffin.drain_outbox(mailer) == 0
+
+    def test_a_message_is_sent_after_a_failure(self, app):
+        queue("one")
+        tiffin.drain_outbox(ListMailer(fail=True))
+        mailer = ListMailer()
+
+        assert tiffin.drain_outbox(mailer) == 1
+        assert [msg["Subject"] for msg in mailer.sent] == ["one"]
+        [message] = messages()
+        assert (message.status, message.attempts) == ("sent", 2)
+
+
+def test_backoff_grows_and_is_capped(app):
+    app.config.update(OUTBOX_BACKOFF_SECONDS=10, OUTBOX_BACKOFF_MAX_SECONDS=60)
+
+    assert 8 <= tiffin.outbox_retry_delay(1) <= 12
+    assert 16 <= tiffin.outbox_retry_delay(2) <= 24
+    assert 48 <= tiffin.outbox_retry_delay(10) <= 72
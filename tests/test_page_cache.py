@@ -0,0 +1,46 @@
+"""Cached public pages: ETag/304, gzip and versioned keys."""
+import gzip
+
+import app as tiffin
+
+
+def test_pages_are_rendered_once(app, client):
+    first = client.get("/about")
+    second = client.get("/about")
+
+    assert first.data == second.data
+    assert (tiffin.page_cache.misses, tiffin.page_cache.hits) == (1, 1)
+
+
+def test_gzip_for_clients_that_accept_it(app, client):
+    plain = client.get("/")
+    compressed = client.get("/", headers={"Accept-Encoding": "gzip, deflate"})
+
+    assert "Content-Encoding" not in plain.headers
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(compressed.data) == plain.data
+    assert compressed.headers["ETag"] != plain.headers["ETag"]
+    assert "Accept-Encoding" in compressed.headers["Vary"]
+
+
+def test_matching_etag_gets_304(app, client):
+    etag = client.get("/features", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+
+    cached = client.get("/features", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    other_encoding = client.get("/features", headers={"If-None-Match": etag})
+
+    assert (cached.status_code, cached.data) == (304, b"")
+    assert other_encoding.status_code == 200
+    assert tiffin.page_cache.not_modified == 1
+
+
+def test_plan_changes_give_plans_a_new_version(app, client):
+    etag = client.get("/plans").headers["ETag"]
+
+    tiffin.db.session.get(tiffin.Plan, "veg_week").price = 123400
+    tiffin.db.session.commit()
+    response = client.get("/plans", headers={"If-None-Match": etag})
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert "₹1,234" in response.get_data(as_text=True)
@@ -0,0 +1,141 @@
+"""Checkout and payment confirmation against fake_stripe.py."""
+import pytest
+
+import app as tiffin
+
+VEG_WEEK = next(plan["price"] for plan in tiffin.DEFAULT_PLANS if plan["id"] == "veg_week")
+
+
+@pytest.fixture
+def app_config(stripe_server):
+    return {"STRIPE_API_BASE": stripe_server.url, "STRIPE_SECRET_KEY": "sk_test_fake",
+            "STRIPE_MAX_RETRIES": 0}
+
+
+def checkout_payload(**fields):
+    return dict({"plan_id": "veg_week", "amount": VEG_WEEK, "currency": "inr",
+                 "customer": {"name": "Asha", "phone": "9876543210",
+                              "email": "asha@example.com"}}, **fields)
+
+
+def checkout(client, **fields):
+    response = client.post("/api/create_payment_intent", json=checkout_payload(**fields))
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()["paymentIntentId"]
+
+
+def confirm(client, payment_intent_id):
+    response = client.post("/api/confirm_payment", json={"payment_intent_id": payment_intent_id})
+    return response.status_code, response.get_json()
+
+
+def order_for(payment_intent_id):
+    return tiffin.Order.query.filter_by(stripe_payment_intent_id=payment_intent_id).one()
+
+
+@pytest.mark.parametrize("amount", [VEG_WEEK, str(VEG_WEEK), float(VEG_WEEK)])
+def test_checkout_accepts_whole_paise(app, amount):
+    checkout_data, error = tiffin.parse_checkout(checkout_payload(amount=amount))
+
+    assert error is None
+    assert checkout_data["amount"] == VEG_WEEK
+
+
+@pytest.mark.parametrize("amount, status", [
+    (VEG_WEEK + 0.5, 400),
+    ("lots", 400),
+    ([VEG_WEEK], 400),
+    (True, 400),
+    (None, 400),
+    (VEG_WEEK + 100, 409),
+])
+def test_checkout_rejects_bad_amounts(app, amount, status):
+    _, error = tiffin.parse_checkout(checkout_payload(amount=amount))
+
+    assert error[1] == status
+
+
+def test_checkout_records_an_order(app, client):
+    payment_intent_id = checkout(client)
+
+    order = order_for(payment_intent_id)
+    assert (order.status, order.amount, order.plan_id) == ("created", VEG_WEEK, "veg_week")
+
+
+def test_retried_checkout_gets_the_same_payment_intent(app, client, stripe_server):
+    first = checkout(client)
+
+    assert checkout(client) == first
+    assert tiffin.Order.query.count() == 1
+    assert len(stripe_server.app.payment_intents) == 1
+
+
+def test_a_different_checkout_gets_a_new_order(app, client, stripe_server):
+    first = checkout(client)
+    paid = order_for(first)
+    paid.status = "paid"
+    tiffin.db.session.commit()
+
+    second = checkout(client)
+    third = checkout(client, description="Veg week, no onion")
+
+    assert len({first, second, third}) == 3
+    assert tiffin.Order.query.count() == 3
+
+
+def test_confirm_asks_stripe_once_then_answers_from_the_order(app, client, stripe_server):
+    payment_intent_id = checkout(client)
+    stripe_server.app.confirm_payment_intent(payment_intent_id)
+    before = stripe_server.app.request_count
+
+    assert confirm(client, payment_intent_id) == (200, {"success": True, "status": "paid"})
+    assert stripe_server.app.request_count == before + 1
+    assert confirm(client, payment_intent_id) == (200, {"success": True, "status": "paid"})
+    assert stripe_server.app.request_count == before + 1
+    assert order_for(payment_intent_id).status == "paid"
+    assert tiffin.OutboxMessage.query.count() == 1
+
+
+def test_confirm_after_the_webhook_does_not_call_stripe(app, client, stripe_server, send_webhook):
+    payment_intent_id = checkout(client)
+    send_webhook("evt_1", "payment_intent.succeeded",
+                 {"id": payment_intent_id, "object": "payment_intent", "latest_charge": "ch_1"})
+    tiffin.process_stripe_events()
+    before = stripe_server.app.request_count
+
+    assert confirm(client, payment_intent_id) == (200, {"success": True, "status": "paid"})
+    assert stripe_server.app.request_count == before
+
+
+@pytest.mark.parametrize("status, expected", [
+    ("fulfilled", (200, {"success": True, "status": "fulfilled"})),
+    ("refunded", (200, {"success": True, "status": "refunded"})),
+    ("canceled", (400, {"success": False, "status": "canceled"})),
+])
+def test_settled_orders_are_answered_locally(app, client, stripe_server, add_order,
+                                             status, expected):
+    add_order(status=status, stripe_payment_intent_id="pi_local")
+    before = stripe_server.app.request_count
+
+    assert confirm(client, "pi_local") == expected
+    assert stripe_server.app.request_count == before
+
+
+def test_unknown_intents_are_not_found(app, client, stripe_server):
+    before = stripe_server.app.request_count
+
+    status, body = confirm(client, "pi_unknown")
+
+    assert status == 404
+    assert body["success"] is False
+    assert stripe_server.app.request_count == before
+
+
+def test_unpaid_intents_are_checked_with_stripe(app, client, stripe_server):
+    payment_intent_id = checkout(client)
+
+    status, body = confirm(client, payment_intent_id)
+
+    assert status == 400
+    assert body["success"] is False
+    assert order_for(payment_intent_id).status == body["status"]
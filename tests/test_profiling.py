@@ -0,0 +1,56 @@
+"""On-demand request profiles (request_profiling.py, profiling.py)."""
+import pytest
+
+import app as tiffin
+import request_profiling
+
+
+@pytest.fixture
+def app_config():
+    return {"PROFILE_KEEP": 2}
+
+
+def stored(profile_id):
+    return tiffin.service("profiles").get(profile_id)
+
+
+def test_admins_profile_with_a_query_flag(admin_client):
+    response = admin_client.get("/plans?__profile=1&utm=mail")
+
+    profile = stored(response.headers["X-Profile-Id"])
+    assert (profile["method"], profile["path"], profile["reason"]) == ("GET", "/plans?utm=mail",
+                                                                        "admin")
+    assert profile["duration_ms"] > 0
+
+
+def test_tokens_let_other_clients_profile(app, client):
+    with app.test_request_context():
+        token = request_profiling.new_profile_token()
+
+    by_header = client.get("/about", headers={request_profiling.PROFILE_HEADER: token})
+    by_query = client.get(f"/about?__profile={token}")
+    forged = client.get("/about?__profile=forged")
+
+    assert stored(by_header.headers["X-Profile-Id"])["reason"] == "token"
+    profile = stored(by_query.headers["X-Profile-Id"])
+    assert profile["path"] == "/about"
+    assert token not in str(profile)
+    assert "X-Profile-Id" not in forged.headers
+
+
+def test_only_the_newest_profiles_are_kept(admin_client):
+    ids = [admin_client.get("/about?__profile=1").headers["X-Profile-Id"] for _ in range(3)]
+
+    assert [p["id"] for p in tiffin.service("profiles").list()] == ids[:0:-1]
+    assert stored(ids[0]) is None
+
+
+def test_profile_downloads(admin_client):
+    profile_id = admin_client.get("/plans?__profile=1").headers["X-Profile-Id"]
+
+    speedscope = admin_client.get(f"/admin/profiles/{profile_id}/speedscope")
+    collapsed = admin_client.get(f"/admin/profiles/{profile_id}/collapsed")
+
+    assert "speedscope" in speedscope.get_json()["$schema"]
+    assert collapsed.mimetype == "text/plain"
+    assert admin_client.get("/admin/profiles/20240101T000000000-deadbeef/json").status_code == 404
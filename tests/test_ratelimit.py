@@ -0,0 +1,136 @@
+"""Token buckets (ratelimit.py) and the 429 answers built on them."""
+import pytest
+
+import ratelimit
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path, clock):
+    if request.param == "memory":
+        return ratelimit.MemoryBackend(clock=clock)
+    return ratelimit.SQLiteBackend(str(tmp_path / "ratelimit.db"), clock=clock)
+
+
+def test_burst_then_wait(backend):
+    rule = ratelimit.Rule("test", 2, 10)
+
+    assert [backend.hit(rule, "a") for _ in range(3)] == [0, 0, 5]
+
+
+def test_tokens_refill_over_time(backend, clock):
+    rule = ratelimit.Rule("test", 2, 10)
+    for _ in range(3):
+        backend.hit(rule, "a")
+
+    clock.now += 5
+    assert backend.hit(rule, "a") == 0
+    assert backend.hit(rule, "a") == 5
+
+    clock.now += 60
+    assert [backend.hit(rule, "a") for _ in range(3)] == [0, 0, 5]
+
+
+def test_buckets_are_per_rule_and_key(backend):
+    first, second = ratelimit.Rule("first", 1, 60), ratelimit.Rule("second", 1, 60)
+
+    assert backend.hit(first, "a") == 0
+    assert backend.hit(first, "a") == 60
+    assert backend.hit(first, "b") == 0
+    assert backend.hit(second, "a") == 0
+
+
+def test_reset_empties_every_bucket(backend):
+    rule = ratelimit.Rule("test", 1, 60)
+    backend.hit(rule, "a")
+
+    backend.reset()
+
+    assert backend.hit(rule, "a") == 0
+
+
+def test_sqlite_buckets_are_shared_between_processes(tmp_path, clock):
+    path = str(tmp_path / "ratelimit.db")
+    rule = ratelimit.Rule("test", 2, 10)
+    first = ratelimit.SQLiteBackend(path, clock=clock)
+    second = ratelimit.SQLiteBackend(path, clock=clock)
+
+    assert [first.hit(rule, "a"), second.hit(rule, "a"), first.hit(rule, "a")] == [0, 0, 5]
+
+
+def test_memory_backend_forgets_idle_buckets_when_full(clock):
+    limiter = ratelimit.MemoryBackend(max_keys=2, clock=clock)
+    rule = ratelimit.Rule("test", 1, 10)
+    limiter.hit(rule, "a")
+    limiter.hit(rule, "b")
+
+    clock.now += 10
+    limiter.hit(rule, "c")
+
+    assert len(limiter._buckets) == 1
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ("10/60", (10, 60)),
+    ("5", (5, 1)),
+    ("off", None),
+    ("", None),
+])
+def test_rule_parse(spec, expected):
+    rule = ratelimit.Rule.parse("test", spec)
+    assert (rule and (rule.capacity, rule.period)) == expected
+
+
+@pytest.mark.parametrize("spec", ["0/60", "5/0", "x/60"])
+def test_rule_parse_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        ratelimit.Rule.parse("test", spec)
+
+
+@pytest.mark.parametrize("forwarded_for, proxies, expected", [
+    ("1.1.1.1, 10.0.0.1", 0, "10.0.0.2"),
+    ("1.1.1.1, 10.0.0.1", 1, "10.0.0.1"),
+    ("1.1.1.1, 10.0.0.1", 2, "1.1.1.1"),
+    ("10.0.0.1", 2, "10.0.0.2"),
+])
+def test_client_address(forwarded_for, proxies, expected):
+    assert ratelimit.client_address("10.0.0.2", forwarded_for, proxies) == expected
+
+
+class TestEndpoints:
+    @pytest.fixture
+    def app_config(self):
+        return {"RATE_LIMIT_BACKEND": "memory", "RATE_LIMIT_COMPLAINT_PHONE": "2/600",
+                "RATE_LIMIT_COMPLAINT_IP": "5/60"}
+
+    @staticmethod
+    def complain(client, phone):
+        return client.post("/api/submit_complaint", json={
+            "Name": "A", "Phone": phone, "Place": "Kakkanad", "Category": "food",
+            "Complaint": "Late", "Description": "Lunch was late"})
+
+    def test_phone_limit_applies_to_every_format(self, client):
+        assert self.complain(client, "+91 98765 43210").status_code == 200
+        assert self.complain(client, "098765 43210").status_code == 200
+
+        response = self.complain(client, "9876543210")
+
+        assert response.status_code == 429
+        assert int(response.headers["Retry-After"]) == response.get_json()["retry_after"] > 0
+
+    def test_ip_limit_covers_every_phone(self, client):
+        codes = [self.complain(client, f"90000000{n:02d}").status_code for n in range(6)]
+
+        assert codes == [200] * 5 + [429]
@@ -0,0 +1,97 @@
+"""Reconciliation against fake_stripe.py's PaymentIntent list."""
+import time
+
+import pytest
+
+import app as tiffin
+
+
+@pytest.fixture
+def app_config(stripe_server):
+    # Two intents per page, so every run spans several list calls
+    return {"STRIPE_API_BASE": stripe_server.url, "STRIPE_SECRET_KEY": "sk_test_fake",
+            "STRIPE_MAX_RETRIES": 0, "RECONCILE_PAGE_SIZE": 2}
+
+
+@pytest.fixture
+def intent(stripe_server, add_order):
+    """Create a PaymentIntent (and unless order_status is None, its order); returns its id."""
+    fake = stripe_server.app
+
+    def create(order_status="created", age=60, paid=False, refund=None, **fields):
+        _, created = fake.create_payment_intent({"amount": "99900", "currency": "inr"})
+        created.update(created=int(time.time()) - age, **fields)
+        if paid or refund is not None:
+            fake.confirm_payment_intent(created["id"])
+        if refund is not None:
+            fake.create_refund({"payment_intent": created["id"], **refund})
+        if order_status is not None:
+            add_order(status=order_status, stripe_payment_intent_id=created["id"])
+        return created["id"]
+    return create
+
+
+def order_state(payment_intent_id):
+    order = tiffin.Order.query.filter_by(stripe_payment_intent_id=payment_intent_id).one()
+    return order.status, order.stripe_charge_id
+
+
+def run_to_completion():
+    pages = 0
+    while tiffin.reconcile_job():
+        pages += 1
+    return pages + 1
+
+
+def test_run_corrects_orders_that_missed_their_webhook(app, intent):
+    paid = intent(paid=True)
+    refunded = intent(order_status="paid", refund={})
+    partial = intent(order_status="paid", refund={"amount": "100"})
+    canceled = intent(status="canceled")
+    failed = intent(last_payment_error={"code": "card_declined"})
+    unchanged = intent(order_status="fulfilled", paid=True)
+    intent(order_status=None, paid=True)
+
+    assert run_to_completion() == 4
+
+    assert order_state(paid)[0] == "paid" and order_state(paid)[1].startswith("ch_")
+    assert order_state(refunded)[0] == "refunded"
+    assert order_state(partial)[0] == "partially_refunded"
+    assert order_state(canceled)[0] == "canceled"
+    assert order_state(failed)[0] == "failed"
+    assert order_state(unchanged)[0] == "fulfilled"
+    last_run = tiffin.load_checkpoint(tiffin.RECONCILE_CHECKPOINT)["last_run"]
+    assert (last_run["intents"], last_run["corrected"], last_run["no_order"]) == (7, 5, 1)
+
+
+def test_interrupted_runs_resume_from_the_checkpoint(app, intent, stripe_server):
+    ids = [intent(paid=True, age=60 + n) for n in range(5)]
+
+    assert tiffin.reconcile_job() == 2
+    checkpoint = tiffin.load_checkpoint(tiffin.RECONCILE_CHECKPOINT)
+    assert checkpoint["until"] and checkpoint["starting_after"] == ids[1]
+
+    run_to_completion()
+    assert all(order_state(pi)[0] == "paid" for pi in ids)
+    assert tiffin.load_checkpoint(tiffin.RECONCILE_CHECKPOINT)["last_run"]["intents"] == 5
+
+
+def test_open_intents_hold_the_next_run_back(app, intent, stripe_server):
+    # Abandoned a day and a half ago: no longer holds anything back
+    intent(age=36 * 3600)
+    still_open = intent(age=600)
+
+    run_to_completion()
+
+    checkpoint = tiffin.load_checkpoint(tiffin.RECONCILE_CHECKPOINT)
+    assert checkpoint["since"] == stripe_server.app.payment_intents[still_open]["created"]
+
+
+def test_dry_run_reports_without_changing_anything(app, intent):
+    paid = intent(paid=True)
+
+    result = app.test_cli_runner().invoke(args=["reconcile", "--dry-run"])
+
+    assert f"({paid}): created → paid" in result.output
+    assert order_state(paid) == ("created", None)
+    assert tiffin.load_checkpoint(tiffin.RECONCILE_CHECKPOINT) is None
@@ -0,0 +1,87 @@
+"""Daily rollups: the incremental deltas must agree with ``rollups.rebuild``."""
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as tiffin
+import rollups
+
+
+def snapshot():
+    """Non-empty rollup buckets of both tables."""
+    orders = tiffin.db.session.query(
+        tiffin.OrderDailyStat.day, tiffin.OrderDailyStat.plan_id, tiffin.OrderDailyStat.status,
+        tiffin.OrderDailyStat.order_count, tiffin.OrderDailyStat.amount_total)
+    complaints = tiffin.db.session.query(
+        tiffin.ComplaintDailyStat.day, tiffin.ComplaintDailyStat.category,
+        tiffin.ComplaintDailyStat.status, tiffin.ComplaintDailyStat.complaint_count)
+    return (sorted(tuple(row) for row in orders if row.order_count),
+            sorted(tuple(row) for row in complaints if row.complaint_count))
+
+
+def rebuilt():
+    tiffin.db.session.commit()
+    with tiffin.db.engine.begin() as conn:
+        rollups.rebuild(conn)
+    return snapshot()
+
+
+@pytest.mark.parametrize("plan_id, expected", [
+    ("custom_veg_7_1760000000000", "custom_veg_7"),
+    ("custom_nonveg_30_1760000000000", "custom_nonveg_30"),
+    ("custom_veg_7", "custom_veg_7"),
+    ("CUSTOM_VEG_7_1", "CUSTOM_VEG_7_1"),
+    ("custom_unknown_7_1", "custom_unknown_7_1"),
+    ("veg_week", "veg_week"),
+])
+def test_rollup_plan_id(plan_id, expected):
+    assert rollups.rollup_plan_id(plan_id) == expected
+
+
+def test_custom_plans_share_one_bucket(app, add_order):
+    for ts in (1, 2, 3):
+        add_order(status="paid", plan_id=f"custom_veg_7_{ts}", amount=1000)
+
+    [row] = tiffin.OrderDailyStat.query.all()
+    assert (row.plan_id, row.order_count, row.amount_total) == ("custom_veg_7", 3, 3000)
+    assert rebuilt() == snapshot()
+
+
+def test_incremental_totals_equal_rebuild(app, add_order, admin_client, send_webhook):
+    yesterday = datetime.utcnow() - timedelta(days=1)
+    plans = ["veg_week", "custom_veg_7_1760000000001", "custom_veg_7_1760000000002",
+             "custom_nonveg_30_1760000000003", "custom_veg_7"]
+    orders = [add_order(plan_id=plan_id, amount=1000 * (n + 1), created_at=created_at,
+                        stripe_payment_intent_id=f"pi_{n}_{i}")
+              for n, plan_id in enumerate(plans)
+              for i, created_at in enumerate((yesterday, datetime.utcnow()))]
+    for n in range(1, 4):
+        tiffin.db.session.add(tiffin.Complaint(name="A", phone="9876543210",
+                                               category=["food", None, "delivery"][n - 1],
+                                               description="cold"))
+    tiffin.db.session.commit()
+
+    # ORM status changes
+    orders[0].status = "paid"
+    orders[1].status = "failed"
+    tiffin.Complaint.query.first().status = "Resolved"
+    tiffin.db.session.commit()
+    # Webhook batch
+    for order in orders[2:6]:
+        pi = order.stripe_payment_intent_id
+        send_webhook(f"evt_{pi}", "payment_intent.succeeded",
+                     {"id": pi, "object": "payment_intent", "latest_charge": f"ch_{pi}"})
+    tiffin.process_stripe_events()
+    # Bulk API
+    response = admin_client.post("/admin/api/orders/status",
+                                 json={"status": "fulfilled", "ids": [o.id for o in orders[:4]]})
+    assert response.get_json()["updated"] == 3
+    admin_client.post("/admin/api/complaints/status",
+                      json={"status": "In Progress", "filter": {"status": "New"}})
+    # Delete
+    tiffin.db.session.delete(orders[-1])
+    tiffin.db.session.commit()
+
+    incremental = snapshot()
+    assert incremental == rebuilt()
+    assert not any(row[1].startswith("custom_veg_7_") for row in incremental[0])
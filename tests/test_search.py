@@ -0,0 +1,68 @@
+"""Complaint search (/admin/api/complaints/search) on the SQLite FTS5 index."""
+import pytest
+
+import app as tiffin
+
+
+def complaint(description, status="New", **fields):
+    row = tiffin.Complaint(name=fields.pop("name", "Ravi"), phone="9123456780",
+                           description=description, status=status, **fields)
+    tiffin.db.session.add(row)
+    tiffin.db.session.commit()
+    return row.id
+
+
+def find(admin_client, query):
+    response = admin_client.get(f"/admin/api/complaints/search?{query}")
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+@pytest.fixture
+def complaints(app):
+    return [complaint("Rice was cold and late"),
+            complaint("Delivery boy was late again", status="Resolved"),
+            complaint("Curry too spicy", place="Kochi")]
+
+
+def test_every_term_must_match_as_a_prefix(admin_client, complaints):
+    body = find(admin_client, "q=lat ric")
+
+    assert [row["id"] for row in body["results"]] == [complaints[0]]
+    assert "<mark>" in body["results"][0]["snippet"]
+
+
+def test_status_filter_and_paging(admin_client, complaints):
+    assert [r["id"] for r in find(admin_client, "q=late&status=Resolved")["results"]] \
+        == [complaints[1]]
+
+    first = find(admin_client, "q=late&per_page=1")
+    second = find(admin_client, "q=late&per_page=1&page=2")
+    assert first["has_more"] and not second["has_more"]
+    assert {first["results"][0]["id"], second["results"][0]["id"]} == set(complaints[:2])
+
+
+def test_the_index_follows_edits_and_deletes(admin_client, complaints):
+    row = tiffin.db.session.get(tiffin.Complaint, complaints[2])
+    row.description = "Fish curry was stale"
+    tiffin.db.session.commit()
+    tiffin.db.session.delete(tiffin.db.session.get(tiffin.Complaint, complaints[0]))
+    tiffin.db.session.commit()
+
+    assert find(admin_client, "q=spicy")["results"] == []
+    assert [r["id"] for r in find(admin_client, "q=stale")["results"]] == [complaints[2]]
+    assert [r["id"] for r in find(admin_client, "q=late")["results"]] == [complaints[1]]
+
+
+def test_snippets_are_escaped(admin_client, app):
+    complaint("<script>late</script> delivery")
+
+    snippet = find(admin_client, "q=late")["results"][0]["snippet"]
+
+    assert "<script>" not in snippet
+    assert "&lt;script&gt;" in snippet
+
+
+def test_queries_without_words_are_rejected(admin_client, app):
+    assert admin_client.get("/admin/api/complaints/search?q=%22%2A").status_code == 400
+    assert admin_client.get("/admin/api/complaints/search?q=x&page=two").status_code == 400
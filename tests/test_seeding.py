@@ -0,0 +1,82 @@
+"""Synthetic data (seeding.py, flask seeddb)."""
+from collections import defaultdict
+from datetime import datetime
+
+import app as tiffin
+import rollups
+import search
+import seeding
+from catalog import DEFAULT_PLANS
+
+
+def generate(seed, now=datetime(2024, 6, 1, 12)):
+    generator = seeding.Generator(seed, days=60, now=now)
+    return (list(generator.customers(50)), list(generator.orders(200)),
+            list(generator.complaints(20)))
+
+
+def rollup_rows():
+    return {name: sorted(tiffin.db.session.execute(tiffin.db.text(f"SELECT * FROM {name}")).all())
+            for name in ("order_daily_stats", "complaint_daily_stats")}
+
+
+def seeddb(app, *args):
+    result = app.test_cli_runner().invoke(args=["seeddb", *args])
+    assert result.exit_code == 0, result.output
+    tiffin.db.session.remove()
+
+
+def test_same_seed_same_rows():
+    assert generate(3) == generate(3)
+    assert generate(3) != generate(4)
+
+
+def test_orders_follow_their_customers_and_prices():
+    customers, orders, _ = generate(5)
+    signed_up = {row[0]: row[-1] for row in customers}
+    prices = {plan["id"]: plan["price"] for plan in DEFAULT_PLANS}
+    custom_prices = defaultdict(set)
+    for meal_type, days, price, description in seeding.custom_options():
+        custom_prices[(f"custom_{meal_type}_{days}", description)].add(price)
+
+    for row in (dict(zip(seeding.ORDER_COLUMNS, values)) for values in orders):
+        if row["customer_id"] is not None:
+            assert row["created_at"] >= signed_up[row["customer_id"]]
+        if row["plan_id"].startswith("custom_"):
+            plan = row["plan_id"].rsplit("_", 1)[0]
+            assert row["amount"] in custom_prices[(plan, row["description"])]
+        else:
+            assert row["amount"] == prices[row["plan_id"]]
+
+
+def test_seeddb_loads_indexed_searchable_rows(app):
+    seeddb(app, "--customers", "200", "--orders", "1e3", "--complaints", "100", "--batch", "64")
+
+    assert [model.query.count() for model in (tiffin.Customer, tiffin.Order, tiffin.Complaint)] \
+        == [200, 1000, 100]
+    indexes = {row[0] for row in tiffin.db.session.execute(tiffin.db.text(
+        "SELECT name FROM sqlite_master WHERE type = 'index'"))}
+    assert {index.name for table in ("customers", "orders", "complaints")
+            for index in tiffin.db.metadata.tables[table].indexes} <= indexes
+    complaint = tiffin.Complaint.query.first()
+    word = search.query_terms(complaint.description)[0]
+    assert complaint.id in {row["id"] for row in search.search(
+        tiffin.db.session.connection(), word, limit=100)}
+
+
+def test_rollups_match_a_rebuild(app):
+    seeddb(app, "--customers", "100", "--orders", "500", "--complaints", "50")
+    seeded = rollup_rows()
+
+    with tiffin.db.engine.begin() as conn:
+        rollups.rebuild(conn)
+
+    assert rollup_rows() == seeded
+
+
+def test_seeding_again_adds_rows(app):
+    seeddb(app, "--customers", "50", "--orders", "100", "--complaints", "0")
+    seeddb(app, "--customers", "50", "--orders", "100", "--complaints", "0", "--seed", "2")
+
+    assert tiffin.Customer.query.count() == 100
+    assert tiffin.Order.query.count() == 200
@@ -0,0 +1,53 @@
+"""create_app(): settings, database configuration and lazy feature modules."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+import app as tiffin
+import db_engine
+import settings
+from conftest import ROOT
+
+
+def test_bad_settings_are_reported_together(tmp_path):
+    with pytest.raises(settings.ConfigError) as error:
+        tiffin.create_app({"LOCALAPPDATA": str(tmp_path), "DB_POOL_SIZE": "lots",
+                           "SQLITE_BUSY_TIMEOUT_MS": "-1", "OUTBOX_WORKERS": "x"})
+
+    message = str(error.value)
+    for name in ("DB_POOL_SIZE", "SQLITE_BUSY_TIMEOUT_MS", "OUTBOX_WORKERS"):
+        assert name in message
+
+
+def test_database_url_and_sqlite_settings(tmp_path):
+    path = tmp_path / "other.db"
+    application = tiffin.create_app({"LOCALAPPDATA": str(tmp_path),
+                                     "DATABASE_URL": f"sqlite:///{path}",
+                                     "SQLITE_BUSY_TIMEOUT_MS": "1234"})
+    with application.app_context():
+        with tiffin.db.engine.connect() as conn:
+            busy = conn.exec_driver_sql("PRAGMA busy_timeout").scalar()
+            journal = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+        tiffin.db.engine.dispose()
+
+    assert application.config["SQLALCHEMY_DATABASE_URI"] == f"sqlite:///{path}"
+    assert (busy, journal) == (1234, "wal")
+
+
+def test_postgres_pool_settings():
+    config = settings.load({"DB_POOL_SIZE": "3", "DB_POOL_RECYCLE": "-1"})
+
+    options = db_engine.engine_options("postgresql://db/tiffin", config)
+
+    assert (options["pool_size"], options["max_overflow"], options["pool_recycle"]) == (3, 20, -1)
+
+
+def test_features_load_with_create_app_not_with_app():
+    code = ("import sys, app; print(sorted(m for m in ('commands', 'admin_api', 'seeding',"
+            " 'migrations', 'search', 'profiling', 'assets') if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True,
+                            text=True, check=True, env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"))
+
+    assert result.stdout.strip() == "[]"
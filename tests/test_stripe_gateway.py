@@ -0,0 +1,23 @@
+"""StripeGateway plumbing."""
+import threading
+
+from stripe_gateway import StripeGateway
+
+
+def test_threads_share_one_client_per_timeout():
+    gateway = StripeGateway("sk_test_fake", api_base="http://127.0.0.1:9")
+    start = threading.Barrier(8)
+    clients = []
+
+    def get_client():
+        start.wait()
+        clients.append(gateway._client("create_payment_intent"))
+
+    threads = [threading.Thread(target=get_client) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(gateway._clients) == 1
+    assert len({id(client) for client in clients}) == 1
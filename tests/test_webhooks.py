@@ -0,0 +1,130 @@
+"""Stripe webhooks: verification, deduplication and order transitions."""
+import pytest
+
+import app as tiffin
+
+
+def intent(pi, **fields):
+    return dict({"id": pi, "object": "payment_intent"}, **fields)
+
+
+def charge(pi, charge_id, **fields):
+    return dict({"id": charge_id, "object": "charge", "payment_intent": pi}, **fields)
+
+
+def order_state(pi):
+    order = tiffin.Order.query.filter_by(stripe_payment_intent_id=pi).one()
+    return order.status, order.stripe_charge_id
+
+
+def event_results():
+    return dict(tiffin.db.session.query(tiffin.StripeEvent.id, tiffin.StripeEvent.result))
+
+
+def test_unsigned_events_are_rejected(client):
+    response = client.post("/api/webhook", data=b"{}", headers={"Stripe-Signature": "t=1,v1=bad"})
+
+    assert response.status_code == 400
+    assert tiffin.StripeEvent.query.count() == 0
+
+
+def test_redeliveries_are_recorded_once(app, send_webhook, add_order):
+    add_order(stripe_payment_intent_id="pi_1")
+    event = ("evt_1", "payment_intent.succeeded", intent("pi_1", latest_charge="ch_1"))
+
+    assert send_webhook(*event).get_json() == {"status": "accepted"}
+    assert send_webhook(*event).get_json() == {"status": "duplicate"}
+    assert tiffin.process_stripe_events() == 1
+    assert order_state("pi_1") == ("paid", "ch_1")
+    assert tiffin.process_stripe_events() == 0
+
+
+def test_events_apply_in_event_time_order(app, send_webhook, add_order):
+    add_order(stripe_payment_intent_id="pi_1")
+    send_webhook("evt_2", "payment_intent.succeeded", intent("pi_1", latest_charge="ch_1"), 200)
+    # Older failure delivered late: the order is already paid when it is applied
+    send_webhook("evt_1", "payment_intent.payment_failed", intent("pi_1"), 100)
+    send_webhook("evt_3", "payment_intent.payment_failed", intent("pi_1"), 300)
+
+    tiffin.process_stripe_events()
+
+    assert order_state("pi_1") == ("paid", "ch_1")
+    assert event_results() == {"evt_1": "applied", "evt_2": "applied", "evt_3": "ignored"}
+
+
+@pytest.mark.parametrize("event_type, obj, status", [
+    ("payment_intent.payment_failed", intent("pi_1"), "failed"),
+    ("payment_intent.canceled", intent("pi_1"), "canceled"),
+    ("payment_intent.processing", intent("pi_1"), "processing"),
+])
+def test_unpaid_orders_follow_payment_events(app, send_webhook, add_order, event_type, obj, status):
+    add_order(stripe_payment_intent_id="pi_1")
+    send_webhook("evt_1", event_type, obj)
+
+    tiffin.process_stripe_events()
+
+    assert order_state("pi_1")[0] == status
+
+
+@pytest.mark.parametrize("obj, status", [
+    (charge("pi_1", "ch_1", refunded=True, amount=99900, amount_refunded=99900), "refunded"),
+    (charge("pi_1", "ch_1", refunded=False, amount=99900, amount_refunded=100),
+     "partially_refunded"),
+])
+def test_refunds(app, send_webhook, add_order, obj, status):
+    add_order(status="paid", stripe_payment_intent_id="pi_1", stripe_charge_id="ch_1")
+    send_webhook("evt_1", "charge.refunded", obj)
+
+    tiffin.process_stripe_events()
+
+    assert order_state("pi_1")[0] == status
+
+
+def test_refunds_without_amounts_leave_the_order_alone(app, send_webhook, add_order, caplog):
+    add_order(status="paid", stripe_payment_intent_id="pi_1", stripe_charge_id="ch_1")
+    send_webhook("evt_1", "charge.refunded", charge("pi_1", "ch_1", refunded=False))
+
+    tiffin.process_stripe_events()
+
+    assert order_state("pi_1")[0] == "paid"
+    assert event_results() == {"evt_1": "ignored"}
+    assert "has no amounts" in caplog.text
+
+
+def test_disputes(app, send_webhook, add_order):
+    add_order(status="paid", stripe_payment_intent_id="pi_won", stripe_charge_id="ch_won")
+    add_order(status="paid", stripe_payment_intent_id="pi_lost", stripe_charge_id="ch_lost")
+    for pi in ("pi_won", "pi_lost"):
+        send_webhook(f"evt_open_{pi}", "charge.dispute.created",
+                     {"id": f"dp_{pi}", "object": "dispute", "charge": f"ch_{pi[3:]}",
+                      "payment_intent": pi}, 100)
+    send_webhook("evt_won", "charge.dispute.closed",
+                 {"id": "dp_pi_won", "object": "dispute", "charge": "ch_won",
+                  "payment_intent": "pi_won", "status": "won"}, 200)
+    send_webhook("evt_lost", "charge.dispute.closed",
+                 {"id": "dp_pi_lost", "object": "dispute", "charge": "ch_lost",
+                  "payment_intent": "pi_lost", "status": "lost"}, 200)
+
+    tiffin.process_stripe_events()
+
+    assert order_state("pi_won")[0] == "paid"
+    assert order_state("pi_lost")[0] == "dispute_lost"
+
+
+def test_unknown_orders_and_event_types_are_marked(app, send_webhook):
+    send_webhook("evt_1", "payment_intent.succeeded", intent("pi_missing"))
+    send_webhook("evt_2", "customer.created", {"id": "cus_1", "object": "customer"})
+
+    assert tiffin.process_stripe_events() == 2
+    assert event_results() == {"evt_1": "no_order", "evt_2": "unhandled"}
+
+
+def test_paid_event_queues_one_admin_email(app, send_webhook, add_order):
+    add_order(stripe_payment_intent_id="pi_1")
+    send_webhook("evt_1", "payment_intent.succeeded", intent("pi_1"), 100)
+    send_webhook("evt_2", "payment_intent.succeeded", intent("pi_1"), 101)
+
+    tiffin.process_stripe_events()
+
+    [message] = tiffin.OutboxMessage.query.all()
+    assert "New subscription paid" in message.subject
@@ -0,0 +1,59 @@
+"""Background polling workers.
+
+A PollingWorker runs a job function in a loop inside the Flask application
+context. The job returns how many items it handled; when it returns 0 the
+worker sleeps for `interval` seconds before polling again, otherwise it runs
+again immediately to drain the backlog.
+"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class PollingWorker(threading.Thread):
+    def __init__(self, app, name, job, interval=1.0, setup=None, teardown=None):
+        super().__init__(name=name, daemon=True)
+        self.app = app
+        self.job = job
+        self.interval = interval
+        self.setup = setup
+        self.teardown = teardown
+        self._stop_event = threading.Event()
+
+    def run(self):
+        # setup may read app settings, so it runs in the app context too
+        with self.app.app_context():
+            state = self.setup() if self.setup else None
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    with self.app.app_context():
+                        handled = self.job(state) if self.setup else self.job()
+                except Exception:
+                    logger.exception("%s job failed", self.name)
+                    handled = 0
+                if not handled:
+                    self._stop_event.wait(self.interval)
+        finally:
+            if self.teardown:
+                self.teardown(state)
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class WorkerPool:
+    def __init__(self, workers):
+        self.workers = list(workers)
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+        return self
+
+    def stop(self, timeout=5):
+        for worker in self.workers:
+            worker.stop()
+        for worker in self.workers:
+            worker.join(timeout)